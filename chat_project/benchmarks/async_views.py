@@ -0,0 +1,128 @@
+"""
+Синхронные и асинхронные представления (CHAT_ASYNC_VIEWS) под ASGI.
+
+Запускается один воркер uvicorn (gunicorn -c gunicorn.conf.py,
+WEB_CONCURRENCY=1) сначала с синхронными, затем с асинхронными
+представлениями; для каждого сценария и значения --concurrency клиенты в
+течение --duration секунд отправляют запросы по keep-alive соединениям.
+Результат - req/s, p50 и p99 одного процесса при росте числа одновременных
+клиентов.
+
+Сценарии:
+- detail - GET /api/chats/{id}/ (ответ из кэша после первого запроса);
+- detail-db - то же со следующей страницей сообщений (кэш не используется);
+- list - GET /api/chats/;
+- send - POST /api/chats/{id}/messages/.
+
+Запуск из каталога chat_project (нужен доступный PostgreSQL):
+
+    python -m benchmarks.async_views --concurrency 1 16 64 --duration 10
+
+Клиенты работают в потоках этого же процесса и делят с сервером процессор,
+поэтому абсолютные значения ниже, чем при генераторе нагрузки на
+отдельной машине; сравнивать стоит режимы между собой.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from .server_load import run_load, wait_for_server
+from .utils import percentile, print_table, setup_django, test_database
+
+SCENARIOS = ('detail', 'detail-db', 'list', 'send')
+
+
+def scenario_requests(chat, cursor):
+    """Запросы сценариев: имя -> (метод, путь, тело, ожидаемый статус)."""
+    return {
+        'detail': ('GET', f'/api/chats/{chat.id}/', None, 200),
+        'detail-db': ('GET', f'/api/chats/{chat.id}/?before={cursor}', None, 200),
+        'list': ('GET', '/api/chats/', None, 200),
+        'send': ('POST', f'/api/chats/{chat.id}/messages/', b'{"text": "benchmark"}', 201),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help="Сценарии")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64], help="Одновременных клиентов")
+    parser.add_argument('--duration', type=float, default=10, help="Длительность замера (секунды)")
+    parser.add_argument('--messages', type=int, default=100, help="Сообщений в тестовом чате")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from chat_app.models import Chat, Message
+    from chat_app.pagination import paginate_messages
+
+    host = '127.0.0.1'
+
+    with test_database():
+        chat = Chat.objects.create(title="Бенчмарк представлений")
+        Message.objects.bulk_create(
+            Message(chat=chat, text=f"Сообщение {i}") for i in range(args.messages)
+        )
+        Chat.objects.filter(id=chat.id).refresh_message_stats()
+        Chat.objects.bulk_create(Chat(title=f"Чат {i}") for i in range(100))
+        # Курсор второй страницы: такие ответы не кэшируются
+        page, cursor, prev_cursor = paginate_messages(chat.messages.all(), 20)
+        requests = scenario_requests(chat, cursor)
+
+        env = dict(
+            os.environ,
+            POSTGRES_DB=connection.settings_dict['NAME'],
+            DEBUG='False',
+            ALLOWED_HOSTS=host,
+            GUNICORN_BIND=f'{host}:{args.port}',
+            GUNICORN_WORKER_CLASS='uvicorn',
+            GUNICORN_ACCESS_LOG='',
+            GUNICORN_LOG_LEVEL='warning',
+            WEB_CONCURRENCY='1',
+        )
+        connection.close()
+
+        rows = []
+        for async_views in (False, True):
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                env=dict(env, CHAT_ASYNC_VIEWS=str(async_views)),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for_server(host, args.port, requests['detail'][1])
+                for name in args.scenarios:
+                    method, path, body, expected_status = requests[name]
+                    # Прогрев: соединения с БД и кэш воркера
+                    run_load(host, args.port, path, max(args.concurrency), 1, method, body, expected_status)
+
+                    for concurrency in args.concurrency:
+                        count, errors, latencies = run_load(
+                            host, args.port, path, concurrency, args.duration, method, body, expected_status
+                        )
+                        latencies.sort()
+                        rows.append((
+                            name,
+                            'async' if async_views else 'sync',
+                            concurrency,
+                            count,
+                            errors,
+                            f"{count / args.duration:.0f}",
+                            f"{percentile(latencies, 0.5) * 1000:.1f}",
+                            f"{percentile(latencies, 0.99) * 1000:.1f}",
+                        ))
+            finally:
+                server.terminate()
+                server.wait()
+                connection.close()
+
+    rows.sort(key=lambda row: (SCENARIOS.index(row[0]), row[2], row[1] == 'async'))
+    print(f"workers: 1 (uvicorn), duration: {args.duration} s, cpu: {os.cpu_count()}")
+    print_table(('scenario', 'views', 'clients', 'requests', 'errors', 'req/s', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
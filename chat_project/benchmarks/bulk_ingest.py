@@ -0,0 +1,66 @@
+"""
+Бенчмарк: массовая загрузка сообщений против отправки по одному.
+
+Запуск из каталога chat_project (нужен доступный PostgreSQL):
+
+    python -m benchmarks.bulk_ingest --messages 2000 --batch 500
+"""
+import argparse
+import json
+import time
+
+from .utils import print_table, setup_django, test_database
+
+
+def run_single(client, chat_id, count):
+    """Отправляет count сообщений через POST /chats/{id}/messages/."""
+    from django.urls import reverse
+
+    url = reverse('message-create', args=[chat_id])
+    for i in range(count):
+        response = client.post(url, {'text': f"Сообщение {i}"}, content_type='application/json')
+        assert response.status_code == 201, response.content
+
+
+def run_bulk(client, chat_id, count, batch):
+    """Отправляет count сообщений через POST /chats/{id}/messages/bulk/ пачками по batch."""
+    from django.urls import reverse
+
+    url = reverse('message-bulk-create', args=[chat_id])
+    for start in range(0, count, batch):
+        body = [{'text': f"Сообщение {i}"} for i in range(start, min(start + batch, count))]
+        response = client.post(url, json.dumps(body), content_type='application/json')
+        assert response.status_code == 201, response.content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000, help="Количество сообщений в каждом прогоне")
+    parser.add_argument('--batch', type=int, default=500, help="Сообщений в одном запросе bulk")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import Client
+    from chat_app.models import Chat
+
+    with test_database():
+        client = Client()
+        rows = []
+
+        for name, run in (
+            ('single', lambda chat_id: run_single(client, chat_id, args.messages)),
+            (f'bulk x{args.batch}', lambda chat_id: run_bulk(client, chat_id, args.messages, args.batch)),
+        ):
+            chat = Chat.objects.create(title=name)
+            start = time.perf_counter()
+            run(chat.id)
+            elapsed = time.perf_counter() - start
+            assert chat.messages.count() == args.messages
+            rows.append((name, args.messages, f"{elapsed:.3f}", f"{args.messages / elapsed:.0f}"))
+
+        print_table(('mode', 'messages', 'seconds', 'messages/s'), rows)
+
+
+if __name__ == '__main__':
+    main()
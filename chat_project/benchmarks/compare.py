@@ -0,0 +1,95 @@
+"""
+Сравнение результатов benchmarks.endpoints, сохраненных через --save.
+
+Для каждого сценария выводятся значения до и после и изменение в
+процентах. Регрессией считается рост p95 или падение req/s больше порога
+(--threshold, проценты), а также рост числа SQL-запросов на запрос; при
+регрессиях команда завершается с кодом 1.
+
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+import argparse
+import json
+
+from .utils import print_table
+
+DEFAULT_THRESHOLD = 10.0
+
+
+def save(path, report):
+    """Сохраняет отчет benchmarks.endpoints в JSON."""
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+def load(path):
+    """Читает сохраненный отчет."""
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def _change(before, after):
+    if not before:
+        return 0.0
+    return (after - before) / before * 100
+
+
+def regressions(before, after, threshold):
+    """Причины регрессии сценария (пустой список, если регрессии нет)."""
+    reasons = []
+    if _change(before['p95_ms'], after['p95_ms']) > threshold:
+        reasons.append('p95')
+    if _change(before['rps'], after['rps']) < -threshold:
+        reasons.append('req/s')
+    # Число запросов не шумит, поэтому любой рост - регрессия
+    if round(after['queries'], 1) > round(before['queries'], 1):
+        reasons.append('queries')
+    if after['errors'] > before['errors']:
+        reasons.append('errors')
+    return reasons
+
+
+def print_comparison(before, after, threshold=DEFAULT_THRESHOLD):
+    """Печатает сравнение двух отчетов и возвращает число регрессий."""
+    print(f"before: {before.get('commit')} ({before.get('date')}), after: {after.get('commit')} ({after.get('date')})")
+
+    rows = []
+    count = 0
+    for key, new in after['results'].items():
+        old = before['results'].get(key)
+        if old is None:
+            rows.append((key, '-', f"{new['p95_ms']:.2f}", '', '-', f"{new['rps']:.0f}", '', '-',
+                         f"{new['queries']:.1f}", 'new'))
+            continue
+
+        reasons = regressions(old, new, threshold)
+        count += bool(reasons)
+        rows.append((
+            key,
+            f"{old['p95_ms']:.2f}", f"{new['p95_ms']:.2f}", f"{_change(old['p95_ms'], new['p95_ms']):+.1f}%",
+            f"{old['rps']:.0f}", f"{new['rps']:.0f}", f"{_change(old['rps'], new['rps']):+.1f}%",
+            f"{old['queries']:.1f}", f"{new['queries']:.1f}",
+            'REGRESSION: ' + ', '.join(reasons) if reasons else '',
+        ))
+
+    print_table(
+        ('scenario', 'p95 before', 'p95 after', 'p95', 'req/s before', 'req/s after', 'req/s',
+         'queries before', 'queries after', ''),
+        rows,
+    )
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before', help="Результаты до изменения (JSON)")
+    parser.add_argument('after', help="Результаты после изменения (JSON)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Порог регрессии (проценты)")
+    args = parser.parse_args()
+
+    if print_comparison(load(args.before), load(args.after), args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""
+Бенчмарк всех операций API: создание чата, отправка сообщения, получение
+чата с разными limit (с кэшем ответов и без него) и удаление чата.
+
+Перед замерами создаются чаты размером --sizes сообщений (от 10 до
+10 млн; сообщения вставляются одним INSERT ... SELECT на стороне БД).
+Запросы идут через тестовый клиент Django из --concurrency потоков, для
+каждого сценария выводятся p50/p95/p99 задержки, запросы в секунду, а также
+количество и время SQL-запросов на запрос (по Server-Timing из
+MetricsMiddleware).
+
+Результаты сохраняются в JSON (--save) и сравниваются с сохраненными ранее
+(--compare), например, между коммитами:
+
+    python -m benchmarks.endpoints --sizes 10 10000 1000000 --save before.json
+    git checkout feature
+    python -m benchmarks.endpoints --sizes 10 10000 1000000 --compare before.json
+
+С --keepdb тестовая БД и созданные чаты сохраняются между запусками, что
+экономит время на чатах в миллионы сообщений.
+
+Запуск из каталога chat_project (нужен доступный PostgreSQL):
+
+    python -m benchmarks.endpoints --sizes 10 1000 100000 --limit 20 100
+"""
+import argparse
+import datetime
+import os
+import platform
+import re
+import subprocess
+import threading
+import time
+
+from . import compare
+from .utils import percentile, print_table, setup_django, test_database
+
+SCENARIOS = ('create-chat', 'send-message', 'detail', 'detail-nocache', 'delete')
+
+# Вставка сообщений при создании чатов: строк в одном INSERT
+SEED_CHUNK = 1_000_000
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def seed_chat(title, size):
+    """Чат с size сообщениями; при --keepdb уже созданный чат переиспользуется."""
+    from django.db import connection
+    from chat_app.models import Chat
+
+    chat = Chat.objects.filter(title=title, message_count=size).first()
+    if chat is not None:
+        return chat
+
+    chat = Chat.objects.create(title=title)
+    with connection.cursor() as cursor:
+        for start in range(0, size, SEED_CHUNK):
+            stop = min(start + SEED_CHUNK, size)
+            cursor.execute(
+                """
+                INSERT INTO message (chat_id, text, created_at)
+                SELECT %s, 'Сообщение ' || g || ': ' || repeat('текст сообщения ', 4),
+                       now() - (%s - g) * interval '1 millisecond'
+                FROM generate_series(%s, %s) AS g
+                """,
+                [chat.id, size, start + 1, stop],
+            )
+            if size > SEED_CHUNK:
+                print(f"{title}: {stop} из {size} сообщений")
+        cursor.execute("ANALYZE message")
+
+    Chat.objects.filter(id=chat.id).refresh_message_stats()
+    chat.refresh_from_db()
+    return chat
+
+
+class Result:
+    """Замеры одного сценария."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+        self.latencies = []
+        self.queries = []
+        self.db_times = []
+        self.errors = 0
+        self.elapsed = 0.0
+
+    @property
+    def key(self):
+        return f"{self.name} {self.params}".strip()
+
+    def add(self, latency, response):
+        match = _SERVER_TIMING_DB.search(response.get('Server-Timing', ''))
+        if match:
+            self.db_times.append(float(match.group(1)))
+            self.queries.append(int(match.group(2)))
+        self.latencies.append(latency)
+
+    def summary(self):
+        """Итоги сценария (сохраняются в JSON)."""
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'rps': count / self.elapsed if self.elapsed else 0.0,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'queries': sum(self.queries) / len(self.queries) if self.queries else 0.0,
+            'db_ms': sum(self.db_times) / len(self.db_times) if self.db_times else 0.0,
+        }
+
+
+def run_scenario(result, request, expected_status, iterations, concurrency):
+    """
+    Выполняет request(client, i) iterations раз из concurrency потоков.
+    Ответы со статусом, отличным от expected_status, считаются ошибками.
+    """
+    from django.db import connections
+    from django.test import Client
+
+    counter = iter(range(iterations))
+    lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+
+                start = time.perf_counter()
+                response = request(client, i)
+                latency = time.perf_counter() - start
+
+                with lock:
+                    if response.status_code != expected_status:
+                        result.errors += 1
+                    else:
+                        result.add(latency, response)
+        finally:
+            # Иначе тестовую БД не удалить: к ней останутся подключения
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def git_commit():
+    """Текущий коммит (None вне git-репозитория)."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help="Сценарии")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000], help="Размеры чатов (сообщений)")
+    parser.add_argument('--limit', type=int, nargs='+', default=[20, 100], help="Значения limit для получения чата")
+    parser.add_argument('--iterations', type=int, default=300, help="Запросов в каждом сценарии")
+    parser.add_argument('--concurrency', type=int, default=1, help="Одновременных клиентов")
+    parser.add_argument('--delete-size', type=int, default=100, help="Сообщений в каждом удаляемом чате")
+    parser.add_argument('--keepdb', action='store_true', help="Не удалять тестовую БД и созданные чаты")
+    parser.add_argument('--save', metavar='FILE', help="Сохранить результаты в JSON")
+    parser.add_argument('--compare', metavar='FILE', help="Сравнить с сохраненными результатами")
+    parser.add_argument(
+        '--threshold', type=float, default=compare.DEFAULT_THRESHOLD,
+        help="Порог регрессии для --compare (проценты)",
+    )
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test import override_settings
+    from django.urls import reverse
+    from chat_app.models import Chat, Message
+
+    # Количество SQL-запросов берется из заголовка Server-Timing
+    overrides = override_settings(METRICS_ENABLED=True, METRICS_SERVER_TIMING=True)
+    nocache = override_settings(
+        CACHES={**settings.CACHES, 'benchmark-dummy': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        CHAT_CACHE_ALIAS='benchmark-dummy',
+    )
+    results = []
+
+    def measure(name, params, request, expected_status):
+        result = run_scenario(Result(name, params), request, expected_status, args.iterations, args.concurrency)
+        results.append(result)
+
+    with test_database(keepdb=args.keepdb), overrides:
+        chats = {size: seed_chat(f"Бенчмарк {size}", size) for size in args.sizes}
+        seeded_ids = [chat.id for chat in chats.values()]
+        last_seeded = Message.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        connection.close()
+
+        if 'create-chat' in args.scenarios:
+            url = reverse('chat-list')
+            measure(
+                'create-chat', '',
+                lambda client, i: client.post(url, {'title': f"Чат {i}"}, content_type='application/json'),
+                201,
+            )
+
+        if 'send-message' in args.scenarios:
+            for size, chat in chats.items():
+                url = reverse('message-create', args=[chat.id])
+                measure(
+                    'send-message', f"size={size}",
+                    lambda client, i, url=url: client.post(
+                        url, {'text': f"Сообщение {i}"}, content_type='application/json'
+                    ),
+                    201,
+                )
+
+        for name in ('detail', 'detail-nocache'):
+            if name not in args.scenarios:
+                continue
+            for size, chat in chats.items():
+                for limit in args.limit:
+                    url = reverse('chat-detail', args=[chat.id]) + f'?limit={limit}'
+                    request = lambda client, i, url=url: client.get(url)
+                    if name == 'detail-nocache':
+                        with nocache:
+                            measure(name, f"size={size} limit={limit}", request, 200)
+                    else:
+                        measure(name, f"size={size} limit={limit}", request, 200)
+
+        if 'delete' in args.scenarios:
+            doomed = Chat.objects.bulk_create(
+                Chat(title=f"Удаляемый {i}") for i in range(args.iterations)
+            )
+            Message.objects.bulk_create(
+                Message(chat=chat, text=f"Сообщение {j}")
+                for chat in doomed for j in range(args.delete_size)
+            )
+            urls = [reverse('chat-detail', args=[chat.id]) for chat in doomed]
+            connection.close()
+            measure(
+                'delete', f"size={args.delete_size}",
+                lambda client, i: client.delete(urls[i]),
+                204,
+            )
+
+        if args.keepdb:
+            # Следующий запуск должен начинаться с тех же данных
+            Chat.objects.exclude(id__in=seeded_ids).delete()
+            Message.objects.filter(chat_id__in=seeded_ids, id__gt=last_seeded).delete()
+
+    report = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpu': os.cpu_count(),
+        'iterations': args.iterations,
+        'concurrency': args.concurrency,
+        'results': {result.key: result.summary() for result in results},
+    }
+
+    print(f"commit: {report['commit']}, concurrency: {args.concurrency}, cpu: {report['cpu']}")
+    print_table(
+        ('scenario', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'db ms'),
+        [
+            (
+                key, row['requests'], row['errors'], f"{row['rps']:.0f}",
+                f"{row['p50_ms']:.2f}", f"{row['p95_ms']:.2f}", f"{row['p99_ms']:.2f}",
+                f"{row['queries']:.1f}", f"{row['db_ms']:.2f}",
+            )
+            for key, row in report['results'].items()
+        ],
+    )
+
+    if args.save:
+        compare.save(args.save, report)
+        print(f"Результаты сохранены в {args.save}")
+
+    if args.compare:
+        print()
+        regressions = compare.print_comparison(compare.load(args.compare), report, args.threshold)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Бенчмарк: быстрый путь чтения GET /chats/{id}/ против DRF-сериализаторов.
+
+Для каждого --limit замеряется:
+- build - чтение страницы и построение тела ответа (без HTTP);
+- request - полный GET /chats/{id}/ через тестовый клиент Django, мимо кэша
+  (запрос с курсором before, который указывает в будущее).
+
+Перед замерами проверяется, что тела ответов обоих путей совпадают побайтно.
+
+Запуск из каталога chat_project (нужен доступный PostgreSQL):
+
+    python -m benchmarks.serialization --limit 20 100 --iterations 500
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from .utils import print_table, setup_django, test_database
+
+
+def build_drf(chat_id, limit):
+    """Тело ответа через ChatSerializer / MessageSerializer и JSONRenderer."""
+    from chat_app.models import Chat
+    from chat_app.pagination import paginate_messages
+    from chat_app.renderers import JSONRenderer
+    from chat_app.serializers import ChatSerializer, MessageSerializer
+
+    chat = Chat.objects.alive().get(id=chat_id)
+    messages, next_cursor, prev_cursor = paginate_messages(chat.messages.all(), limit)
+    data = ChatSerializer(chat).data
+    data['messages'] = MessageSerializer(messages, many=True).data
+    data['next'] = next_cursor
+    data['prev'] = prev_cursor
+    return JSONRenderer().render(data)
+
+
+def build_fast(chat_id, limit):
+    """Тело ответа через values_list и orjson."""
+    from chat_app import fastjson
+    from chat_app.pagination import paginate_messages
+
+    chat = fastjson.chat_row(chat_id)
+    messages, next_cursor, prev_cursor = paginate_messages(fastjson.message_rows(chat_id), limit)
+    return fastjson.dumps(fastjson.chat_detail(chat, messages, next_cursor, prev_cursor))
+
+
+def measure(func, iterations):
+    """Среднее время одного вызова func в миллисекундах."""
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, nargs='+', default=[20, 100], help="Размеры страницы")
+    parser.add_argument('--iterations', type=int, default=500, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from django.utils import timezone
+    from chat_app.models import Chat, Message
+    from chat_app.pagination import encode_cursor
+
+    with test_database():
+        client = Client()
+        chat = Chat.objects.create(title="Бенчмарк сериализации")
+        Message.objects.bulk_create(
+            Message(chat=chat, text=f"Сообщение {i}: " + "текст сообщения " * 8)
+            for i in range(max(args.limit))
+        )
+
+        # Курсор в будущее: последние сообщения без кэша ответов
+        before = encode_cursor(timezone.now() + timedelta(days=1), 0)
+        rows = []
+
+        for limit in args.limit:
+            url = reverse('chat-detail', args=[chat.id]) + f'?limit={limit}&before={before}'
+
+            drf_body = build_drf(chat.id, limit)
+            fast_body = build_fast(chat.id, limit)
+            assert drf_body == fast_body, "Тела ответов различаются"
+
+            with override_settings(CHAT_FAST_JSON=False):
+                drf_response = client.get(url).content
+            assert drf_response == client.get(url).content, "Ответы различаются"
+
+            def request_drf():
+                with override_settings(CHAT_FAST_JSON=False):
+                    client.get(url)
+
+            def request_fast():
+                with override_settings(CHAT_FAST_JSON=True):
+                    client.get(url)
+
+            for stage, drf, fast in (
+                ('build', lambda: build_drf(chat.id, limit), lambda: build_fast(chat.id, limit)),
+                ('request', request_drf, request_fast),
+            ):
+                drf_ms = measure(drf, args.iterations)
+                fast_ms = measure(fast, args.iterations)
+                rows.append((limit, stage, f"{drf_ms:.3f}", f"{fast_ms:.3f}", f"{drf_ms / fast_ms:.2f}x"))
+
+        print_table(('limit', 'stage', 'drf ms', 'fast ms', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Нагрузочный тест: пропускная способность gunicorn в зависимости от числа воркеров.
+
+Для каждого значения --workers запускается gunicorn -c gunicorn.conf.py
+на отдельной тестовой БД, после прогрева --concurrency клиентов в течение
+--duration секунд отправляют запросы по keep-alive соединениям.
+
+Запуск из каталога chat_project (нужен доступный PostgreSQL):
+
+    python -m benchmarks.server_load --workers 1 2 4 --worker-class uvicorn
+
+Клиенты работают в потоках этого же процесса и делят с сервером процессор.
+Чтобы увидеть рост с числом воркеров, ядер должно быть больше, чем воркеров;
+для точных замеров запускайте генератор нагрузки (например, wrk) на
+отдельной машине против сервера из gunicorn.conf.py.
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from .utils import percentile, print_table, setup_django, test_database
+
+
+def wait_for_server(host, port, path, timeout=30):
+    """Ждет, пока сервер начнет отвечать на запросы."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request('GET', path)
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Сервер {host}:{port} не запустился за {timeout} с")
+
+
+def run_load(host, port, path, concurrency, duration, method='GET', body=None, expected_status=200):
+    """
+    Отправляет запросы method path (с JSON-телом body) из concurrency потоков
+    в течение duration секунд; ответы со статусом, отличным от
+    expected_status, - ошибки. Возвращает (количество ответов, ошибки,
+    список задержек в секундах).
+    """
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        local = []
+        failed = 0
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != expected_status:
+                    failed += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+                continue
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return len(latencies), errors[0], latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Значения WEB_CONCURRENCY")
+    parser.add_argument('--worker-class', default='uvicorn', help="GUNICORN_WORKER_CLASS: uvicorn, gthread или sync")
+    parser.add_argument('--threads', type=int, default=None, help="GUNICORN_THREADS (для gthread)")
+    parser.add_argument('--concurrency', type=int, default=16, help="Одновременных клиентов")
+    parser.add_argument('--duration', type=float, default=10, help="Длительность замера (секунды)")
+    parser.add_argument('--messages', type=int, default=100, help="Сообщений в тестовом чате")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from chat_app.models import Chat, Message
+
+    host = '127.0.0.1'
+
+    with test_database():
+        chat = Chat.objects.create(title="Нагрузочный тест")
+        Message.objects.bulk_create(
+            Message(chat=chat, text=f"Сообщение {i}") for i in range(args.messages)
+        )
+        path = f'/api/chats/{chat.id}/'
+
+        env = dict(
+            os.environ,
+            POSTGRES_DB=connection.settings_dict['NAME'],
+            DEBUG='False',
+            ALLOWED_HOSTS=host,
+            GUNICORN_BIND=f'{host}:{args.port}',
+            GUNICORN_WORKER_CLASS=args.worker_class,
+            GUNICORN_ACCESS_LOG='',
+            GUNICORN_LOG_LEVEL='warning',
+        )
+        if args.threads is not None:
+            env['GUNICORN_THREADS'] = str(args.threads)
+
+        # Соединение бенчмарка не должно мешать воркерам
+        connection.close()
+
+        rows = []
+        for workers in args.workers:
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                env=dict(env, WEB_CONCURRENCY=str(workers)),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for_server(host, args.port, path)
+                # Прогрев: соединения с БД и кэш в каждом воркере
+                run_load(host, args.port, path, args.concurrency, 1)
+
+                count, errors, latencies = run_load(host, args.port, path, args.concurrency, args.duration)
+            finally:
+                server.terminate()
+                server.wait()
+                connection.close()
+
+            latencies.sort()
+            rows.append((
+                workers,
+                count,
+                errors,
+                f"{count / args.duration:.0f}",
+                f"{percentile(latencies, 0.5) * 1000:.1f}",
+                f"{percentile(latencies, 0.99) * 1000:.1f}",
+            ))
+
+    print(f"worker class: {args.worker_class}, concurrency: {args.concurrency}, cpu: {os.cpu_count()}")
+    print_table(('workers', 'requests', 'errors', 'req/s', 'p50 ms', 'p99 ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
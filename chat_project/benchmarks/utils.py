@@ -0,0 +1,50 @@
+"""Общие утилиты для бенчмарков."""
+import logging
+import os
+from contextlib import contextmanager
+
+
+def setup_django():
+    """Инициализирует Django для запуска бенчмарка вне manage.py."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chat_project.settings')
+
+    import django
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    # Как и тестовый раннер: DEBUG=False и разрешенный хост testserver
+    setup_test_environment(debug=False)
+    # Логи каждого запроса не должны попадать в замеры и вывод
+    logging.disable(logging.INFO)
+
+
+@contextmanager
+def test_database(keepdb=False):
+    """Создает отдельную БД test_<NAME> на время бенчмарка и удаляет ее после."""
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def percentile(values, fraction):
+    """Перцентиль по отсортированному списку."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def print_table(headers, rows):
+    """Печатает результаты в виде простой текстовой таблицы."""
+    widths = [
+        max(len(str(value)) for value in column)
+        for column in zip(headers, *rows)
+    ]
+    line = '  '.join(f"{{:>{width}}}" for width in widths)
+    print(line.format(*headers))
+    for row in rows:
+        print(line.format(*row))
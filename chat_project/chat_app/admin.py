@@ -4,21 +4,35 @@ from .models import Chat, Message
 
 @admin.register(Chat)
 class ChatAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'created_at')
+    list_display = ('id', 'title', 'created_at', 'message_count', 'last_message_at')
     list_filter = ('created_at',)
     search_fields = ('title',)
     ordering = ('-created_at',)
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'message_count', 'last_message_at', 'last_message_preview', 'version')
 
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'chat', 'created_at', 'text_preview')
     list_filter = ('created_at', 'chat')
-    search_fields = ('text', 'chat__title')
+    search_fields = ('chat__title',)
     ordering = ('-created_at',)
     readonly_fields = ('created_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Поиск по тексту - полнотекстовый (индекс message_text_search_idx),
+        по названию чата - как обычно.
+        """
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+
+        by_title, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        by_text = queryset.filter(
+            id__in=Message.objects.search(search_term).values('id')
+        )
+        return by_text | by_title, may_have_duplicates
+
     def text_preview(self, obj):
         """Превью текста сообщения."""
         return obj.text[:50] + '...' if len(obj.text) > 50 else obj.text
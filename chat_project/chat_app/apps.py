@@ -1,7 +1,31 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ChatAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat_app'
-    verbose_name = "Приложение чатов"
\ No newline at end of file
+    verbose_name = "Приложение чатов"
+
+    def ready(self):
+        from django.conf import settings
+        from .log import install_queue_logging
+        from .metrics import install_db_instrumentation
+        from . import partitioning, querybudget
+
+        if settings.LOG_QUEUE:
+            install_queue_logging(
+                settings.LOG_QUEUE_LOGGERS,
+                settings.LOG_QUEUE_SIZE,
+                settings.LOG_QUEUE_OVERFLOW,
+            )
+
+        if settings.METRICS_ENABLED:
+            install_db_instrumentation()
+
+        # Режим проверки читается при каждом вызове, поэтому учет подключается
+        # всегда: вне бюджета wrapper только вызывает следующий обработчик
+        querybudget.install_db_instrumentation()
+
+        # Секции сообщений на следующие месяцы создаются при каждом migrate
+        post_migrate.connect(partitioning.ensure_partitions_after_migrate, sender=self)
@@ -0,0 +1,110 @@
+"""
+Кэш ответов GET /chats/{id}/: данные чата и окно последних сообщений.
+
+Ключи версионируются по чату. Любая запись в чат заменяет версию чата
+новым уникальным значением (сразу и еще раз после фиксации транзакции),
+поэтому все закэшированные окна этого чата перестают читаться. Версия
+никогда не переиспользуется, так что вытеснение ключа версии из кэша тоже
+не может вернуть старые данные.
+
+Счетчики попаданий и промахов ведутся в пределах процесса.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+_stats_lock = threading.Lock()
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'validator_hits': 0,
+    'validator_misses': 0,
+    'invalidations': 0,
+}
+
+
+def _cache():
+    return caches[settings.CHAT_CACHE_ALIAS]
+
+
+def _version_key(chat_id):
+    return f"chat:{chat_id}:version"
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _versioned_key(chat_id, suffix):
+    """Ключ записи чата с учетом текущей версии чата."""
+    cache = _cache()
+    version_key = _version_key(chat_id)
+
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, _new_version(), timeout=None)
+        version = cache.get(version_key)
+
+    return f"chat:{chat_id}:{version}:{suffix}"
+
+
+def detail_key(chat_id, limit, encoded=False):
+    """
+    Ключ закэшированного ответа для чата и limit (читает текущую версию чата).
+
+    encoded=True - ключ готового тела JSON-ответа быстрого пути чтения,
+    False - данных ответа DRF-сериализаторов.
+    """
+    return _versioned_key(chat_id, f"detail{'-json' if encoded else ''}:{limit}")
+
+
+def validator_key(chat_id):
+    """Ключ закэшированного состояния чата для ETag."""
+    return _versioned_key(chat_id, "validator")
+
+
+def get_cached(key, stat_prefix=''):
+    """
+    Возвращает закэшированные данные или None.
+
+    stat_prefix выбирает пару счетчиков: '' - ответы, 'validator_' - валидаторы.
+    """
+    value = _cache().get(key)
+    _count(stat_prefix + ('misses' if value is None else 'hits'))
+    return value
+
+
+def set_cached(key, value):
+    """Сохраняет данные ответа в кэш."""
+    _cache().set(key, value, settings.CHAT_CACHE_TIMEOUT)
+
+
+def _bump_version(chat_id):
+    _cache().set(_version_key(chat_id), _new_version(), timeout=None)
+    _count('invalidations')
+
+
+def invalidate_chat(chat_id):
+    """
+    Делает недоступными все закэшированные ответы чата.
+
+    Версия меняется сразу и еще раз после фиксации транзакции: иначе
+    читатель, успевший между записью и фиксацией, закэшировал бы старые
+    данные под новой версией.
+    """
+    _bump_version(chat_id)
+    transaction.on_commit(lambda: _bump_version(chat_id))
+
+
+def get_stats():
+    """Счетчики попаданий, промахов и инвалидаций кэша в этом процессе."""
+    with _stats_lock:
+        return dict(_stats)
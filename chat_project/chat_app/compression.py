@@ -0,0 +1,258 @@
+"""
+Сжатие ответов: zstd, brotli и gzip по заголовку Accept-Encoding.
+
+Кодировка выбирается по q-значениям клиента, при равных - по порядку
+COMPRESSION_ENCODINGS. Ответы меньше COMPRESSION_MIN_SIZE байт и типы
+содержимого не из COMPRESSION_CONTENT_TYPES не сжимаются.
+
+Потоковые ответы (выгрузка, Server-Sent Events) сжимаются по мере отдачи,
+без буферизации тела. Для text/event-stream поток сжатия сбрасывается после
+каждого фрагмента, чтобы событие доходило до клиента сразу; остальные
+потоки сбрасываются только в конце, что дает лучшую степень сжатия.
+"""
+import zlib
+
+import brotli
+import zstandard
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+
+
+class GzipCodec:
+    """gzip (zlib, формат gzip)."""
+
+    def __init__(self, level):
+        self.level = level
+
+    def compressobj(self):
+        return _ZlibStream(zlib.compressobj(self.level, zlib.DEFLATED, 31))
+
+    def compress(self, data):
+        stream = self.compressobj()
+        return stream.compress(data) + stream.finish()
+
+
+class _ZlibStream:
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCodec:
+    """brotli (режим для текста)."""
+
+    def __init__(self, level):
+        self.level = level
+
+    def compressobj(self):
+        return _BrotliStream(brotli.Compressor(mode=brotli.MODE_TEXT, quality=self.level))
+
+    def compress(self, data):
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=self.level)
+
+
+class _BrotliStream:
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCodec:
+    """zstd."""
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compressobj(self):
+        return _ZstdStream(self._compressor.compressobj())
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+
+class _ZstdStream:
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+# Токен Accept-Encoding -> (класс, настройка уровня сжатия)
+CODECS = {
+    'zstd': (ZstdCodec, 'COMPRESSION_ZSTD_LEVEL'),
+    'br': (BrotliCodec, 'COMPRESSION_BROTLI_LEVEL'),
+    'gzip': (GzipCodec, 'COMPRESSION_GZIP_LEVEL'),
+}
+
+
+def negotiate(accept_encoding, encodings):
+    """
+    Кодировка из encodings (в порядке предпочтения сервера) для заголовка
+    Accept-Encoding или None, если клиент не принимает ни одну.
+    """
+    weights = {}
+    for part in accept_encoding.split(','):
+        token, _, params = part.partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _compress_stream(content, stream, flush):
+    try:
+        for chunk in content:
+            data = stream.compress(chunk)
+            if flush:
+                data += stream.flush()
+            if data:
+                yield data
+        yield stream.finish()
+    finally:
+        if hasattr(content, 'close'):
+            content.close()
+
+
+async def _acompress_stream(content, stream, flush):
+    try:
+        async for chunk in content:
+            data = stream.compress(chunk)
+            if flush:
+                data += stream.flush()
+            if data:
+                yield data
+        yield stream.finish()
+    finally:
+        # Закрытие потока (отключение клиента) доходит до исходного
+        # итератора, чтобы он освободил подписку
+        if hasattr(content, 'aclose'):
+            await content.aclose()
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы кодировкой, согласованной по Accept-Encoding.
+    Работает и с синхронными, и с асинхронными представлениями.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.COMPRESSION_ENABLED:
+            raise MiddlewareNotUsed
+
+        unknown = [name for name in settings.COMPRESSION_ENCODINGS if name not in CODECS]
+        if unknown:
+            raise ImproperlyConfigured(
+                f"COMPRESSION_ENCODINGS: неизвестные кодировки {unknown}, допустимые: {', '.join(CODECS)}"
+            )
+
+        self.codecs = {}
+        for name in settings.COMPRESSION_ENCODINGS:
+            codec_class, level_setting = CODECS[name]
+            self.codecs[name] = codec_class(getattr(settings, level_setting))
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def _compressible(self, response):
+        if response.has_header('Content-Encoding'):
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+
+        content_type = response.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        return content_type.startswith(tuple(settings.COMPRESSION_CONTENT_TYPES))
+
+    def process_response(self, request, response):
+        if not self._compressible(response):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.codecs)
+        if encoding is None:
+            return response
+        codec = self.codecs[encoding]
+
+        if response.streaming:
+            flush = response.get('Content-Type', '').startswith('text/event-stream')
+            if response.is_async:
+                response.streaming_content = _acompress_stream(
+                    response.streaming_content, codec.compressobj(), flush
+                )
+            else:
+                response.streaming_content = _compress_stream(
+                    response.streaming_content, codec.compressobj(), flush
+                )
+            del response['Content-Length']
+        else:
+            with metrics.timed('compress'):
+                compressed = codec.compress(response.content)
+            # Несжимаемое содержимое отдается как есть
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Сжатое тело отличается побайтно, поэтому сильный ETag становится слабым
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,86 @@
+"""
+Состояние соединений с БД: постоянные соединения или пул psycopg.
+
+Пул включается переменной DB_POOL (см. settings.py) и создается Django
+отдельно в каждом процессе, поэтому статистика относится к текущему воркеру.
+"""
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# SQLSTATE ошибок, которые обрабатываются отдельно
+FOREIGN_KEY_VIOLATION = '23503'
+# В том числе вставка в секционированную таблицу без подходящей секции
+CHECK_VIOLATION = '23514'
+
+
+def sqlstate(error):
+    """SQLSTATE ошибки БД Django (из исходного исключения psycopg) или None."""
+    return getattr(error.__cause__, 'sqlstate', None)
+
+
+def pool_stats(alias=DEFAULT_DB_ALIAS):
+    """
+    Статистика пула соединений процесса или None, если пул не включен.
+
+    in_use - выданные запросам соединения, idle - свободные соединения в пуле,
+    waiting - запросы, ожидающие соединение сейчас, wait_ms_avg - среднее
+    время ожидания соединения.
+    """
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+    size = stats.get('pool_size', 0)
+    idle = stats.get('pool_available', 0)
+    requests = stats.get('requests_num', 0)
+    wait_ms = stats.get('requests_wait_ms', 0)
+
+    return {
+        'min_size': stats.get('pool_min', 0),
+        'max_size': stats.get('pool_max', 0),
+        'size': size,
+        'in_use': size - idle,
+        'idle': idle,
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': requests,
+        'wait_ms_total': wait_ms,
+        'wait_ms_avg': round(wait_ms / requests, 3) if requests else 0,
+        'timeouts': stats.get('requests_errors', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+    }
+
+
+def release_connection(alias=DEFAULT_DB_ALIAS):
+    """
+    Возвращает соединение текущего потока в пул (без пула - закрывает).
+
+    Вызывается перед долгим ожиданием, чтобы открытые потоки событий и
+    long polling не держали соединения с БД. Внутри транзакции ничего не
+    делает. Следующий запрос к БД получит соединение заново.
+    """
+    connection = connections[alias]
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def database_status(alias=DEFAULT_DB_ALIAS):
+    """
+    Проверяет доступность БД запросом SELECT 1 и возвращает кортеж
+    (доступна ли БД, описание настроек соединений и статистика пула).
+    """
+    connection = connections[alias]
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        available = True
+    except DatabaseError:
+        available = False
+
+    return available, {
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+        'conn_health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+        'pool': pool_stats(alias),
+    }
@@ -0,0 +1,98 @@
+"""
+Удаление чатов с большим количеством сообщений.
+
+Сообщения удаляются пачками по CHAT_DELETE_BATCH_SIZE строк, каждая пачка -
+один запрос DELETE ... WHERE id IN (SELECT ... LIMIT n) в своей короткой
+транзакции. Память и длительность блокировок не зависят от размера чата.
+Пока сообщения удаляются, чат помечен is_deleting и недоступен через API.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import cache
+from .models import Chat, Message
+from .querybudget import unbudgeted
+
+logger = logging.getLogger(__name__)
+
+
+def mark_chat_deleting(chat_id):
+    """
+    Помечает чат как удаляемый. Возвращает False, если чата нет
+    (или он уже удаляется).
+    """
+    marked = Chat.objects.alive().filter(id=chat_id).update(is_deleting=True)
+    if marked:
+        cache.invalidate_chat(chat_id)
+    return bool(marked)
+
+
+def delete_chat(chat_id):
+    """
+    Удаляет сообщения помеченного чата пачками, затем сам чат.
+    Возвращает количество удаленных сообщений.
+    """
+    batch_size = settings.CHAT_DELETE_BATCH_SIZE
+    started = time.monotonic()
+    total = 0
+
+    # Количество пачек зависит от размера чата, поэтому они не входят в
+    # бюджет запросов представления
+    with unbudgeted():
+        while True:
+            deleted = Message.objects.delete_batch_for_chat(chat_id, batch_size)
+            total += deleted
+            if deleted < batch_size:
+                break
+
+    # Сообщения, вставленные конкурентно до пометки чата, удаляются
+    # вместе с чатом в одной транзакции
+    with transaction.atomic():
+        total += Message.objects.delete_batch_for_chat(chat_id, batch_size)
+        Chat.objects.filter(id=chat_id, is_deleting=True).delete()
+
+    cache.invalidate_chat(chat_id)
+
+    logger.info(
+        "Удален чат %s: %s сообщений за %.2f с",
+        chat_id, total, time.monotonic() - started
+    )
+    return total
+
+
+def _delete_in_background(chat_id):
+    try:
+        delete_chat(chat_id)
+    except Exception as e:
+        logger.error("Ошибка при фоновом удалении чата %s: %s", chat_id, e)
+    finally:
+        # Поток открывает собственное соединение с БД
+        connection.close()
+
+
+def delete_chat_in_background(chat_id):
+    """Запускает удаление помеченного чата в фоновом потоке."""
+    thread = threading.Thread(
+        target=_delete_in_background,
+        args=(chat_id,),
+        name=f'delete-chat-{chat_id}',
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def delete_pending_chats():
+    """
+    Доудаляет чаты, оставшиеся помеченными is_deleting (например, после
+    перезапуска процесса во время фонового удаления). Возвращает количество
+    удаленных чатов.
+    """
+    chat_ids = list(Chat.objects.filter(is_deleting=True).values_list('id', flat=True))
+    for chat_id in chat_ids:
+        delete_chat(chat_id)
+    return len(chat_ids)
@@ -0,0 +1,107 @@
+"""
+Выгрузка всей истории чата потоком NDJSON или CSV.
+
+Сообщения читаются серверным курсором (iterator / aiterator с chunk_size)
+в порядке id и кодируются пачками по CHAT_EXPORT_CHUNK_SIZE строк, поэтому
+память не зависит от размера чата. Для инкрементальной выгрузки передается
+since - id последнего уже выгруженного сообщения.
+
+Под ASGI поток должен быть асинхронным итератором (синхронный Django
+целиком прочитал бы в память), под WSGI - синхронным; представление
+выбирает вариант по типу запроса.
+"""
+import csv
+import io
+
+from . import fastjson
+from .models import Message
+
+# Формат -> (Content-Type, расширение файла)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+CSV_HEADER = fastjson.MESSAGE_FIELDS
+
+
+def messages_for_export(chat_id, since=None):
+    """Строки сообщений чата в порядке id (только новее since, если передан)."""
+    messages = Message.objects.filter(chat_id=chat_id)
+    if since is not None:
+        messages = messages.since(since)
+    else:
+        messages = messages.order_by('id')
+    return messages.values_list(*fastjson.MESSAGE_FIELDS, named=True)
+
+
+def _isoformat(value, tz):
+    # Тот же вид, что у дат в JSON-ответах API
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def encode_ndjson(rows, tz):
+    """Пачка строк сообщений в NDJSON: один объект MessageSerializer на строку."""
+    return b''.join(fastjson.dumps(fastjson.message_data(row, tz)) + b'\n' for row in rows)
+
+
+def encode_csv(rows, tz):
+    """Пачка строк сообщений в CSV (без заголовка)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        (row.id, row.chat, row.text, _isoformat(row.created_at, tz))
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+def _header(fmt):
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(CSV_HEADER)
+        return buffer.getvalue().encode()
+    return None
+
+
+_ENCODERS = {
+    'ndjson': encode_ndjson,
+    'csv': encode_csv,
+}
+
+
+def iter_export(messages, fmt, tz, chunk_size):
+    """Синхронный поток выгрузки (WSGI)."""
+    encode = _ENCODERS[fmt]
+    header = _header(fmt)
+    if header:
+        yield header
+
+    batch = []
+    for row in messages.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield encode(batch, tz)
+            batch = []
+    if batch:
+        yield encode(batch, tz)
+
+
+async def aiter_export(messages, fmt, tz, chunk_size):
+    """Асинхронный поток выгрузки (ASGI)."""
+    encode = _ENCODERS[fmt]
+    header = _header(fmt)
+    if header:
+        yield header
+
+    batch = []
+    async for row in messages.aiterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield encode(batch, tz)
+            batch = []
+    if batch:
+        yield encode(batch, tz)
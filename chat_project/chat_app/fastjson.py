@@ -0,0 +1,102 @@
+"""
+Быстрый путь чтения GET /chats/{id}/ без DRF-сериализаторов.
+
+Чат и сообщения читаются через values_list (без создания экземпляров
+моделей), словари ответа собираются вручную и кодируются orjson сразу в
+байты. Результат побайтно совпадает с ответом ChatSerializer /
+MessageSerializer + JSONRenderer:
+
+- порядок ключей совпадает с полями сериализаторов;
+- даты переводятся в текущий часовой пояс и выводятся в ISO 8601 с Z для
+  UTC, как DateTimeField DRF с настройками по умолчанию;
+- U+2028 и U+2029 экранируются, как это делает JSONRenderer.
+
+При изменении полей сериализаторов или DATETIME_FORMAT в REST_FRAMEWORK
+этот модуль нужно менять вместе с ними.
+"""
+import orjson
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import Chat, Message
+
+CHAT_FIELDS = ('id', 'title', 'created_at')
+MESSAGE_FIELDS = ('id', 'chat', 'text', 'created_at')
+
+_LINE_SEPARATOR = '\u2028'.encode()
+_PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+def chat_row(chat_id):
+    """Строка чата (именованный кортеж полей ChatSerializer); Chat.DoesNotExist, если чата нет."""
+    return Chat.objects.alive().values_list(*CHAT_FIELDS, named=True).get(id=chat_id)
+
+
+async def achat_row(chat_id):
+    """Асинхронный chat_row."""
+    return await Chat.objects.alive().values_list(*CHAT_FIELDS, named=True).aget(id=chat_id)
+
+
+def message_rows(chat_id):
+    """QuerySet строк сообщений чата (именованные кортежи полей MessageSerializer)."""
+    return Message.objects.filter(chat_id=chat_id).values_list(*MESSAGE_FIELDS, named=True)
+
+
+def message_data(message, tz):
+    """Данные сообщения в формате MessageSerializer из строки message_rows."""
+    return {
+        'id': message.id,
+        'chat': message.chat,
+        'text': message.text,
+        'created_at': message.created_at.astimezone(tz),
+    }
+
+
+def chat_detail(chat, messages, next_cursor, prev_cursor):
+    """Данные ответа GET /chats/{id}/ из строк чата и сообщений."""
+    tz = timezone.get_current_timezone()
+    return {
+        'id': chat.id,
+        'title': chat.title,
+        'created_at': chat.created_at.astimezone(tz),
+        'messages': [message_data(message, tz) for message in messages],
+        'next': next_cursor,
+        'prev': prev_cursor,
+    }
+
+
+def dumps(data):
+    """Кодирует данные в JSON так же, как JSONRenderer DRF."""
+    content = orjson.dumps(data, option=orjson.OPT_UTC_Z)
+    if _LINE_SEPARATOR in content or _PARAGRAPH_SEPARATOR in content:
+        content = (
+            content
+            .replace(_LINE_SEPARATOR, b'\\u2028')
+            .replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+        )
+    return content
+
+
+class EncodedResponse(Response):
+    """
+    Response DRF с уже закодированным телом JSON: рендерер не вызывается.
+    data разбирается из тела только при обращении (тесты, отладка).
+    """
+
+    def __init__(self, content, status=None):
+        super().__init__(status=status)
+        self._content_bytes = content
+
+    @property
+    def data(self):
+        return orjson.loads(self._content_bytes)
+
+    @data.setter
+    def data(self, value):
+        pass
+
+    @property
+    def rendered_content(self):
+        # Заголовок, который выставил бы JSONRenderer (media_type без charset)
+        self['Content-Type'] = 'application/json'
+        return self._content_bytes
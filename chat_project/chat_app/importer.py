@@ -0,0 +1,346 @@
+"""
+Потоковая загрузка чатов и сообщений из NDJSON или CSV (команда import_chats).
+
+Каждая запись - чат или сообщение:
+
+    {"type": "chat", "id": "c1", "title": "Название", "created_at": "2024-01-20T10:30:00Z"}
+    {"type": "message", "chat": "c1", "text": "Привет!", "created_at": "2024-01-20T10:31:00Z"}
+
+id чата - ключ в файле, на который ссылаются сообщения (в БД чат получает
+новый id). created_at необязателен. CSV содержит те же поля в колонках
+type,id,chat,title,text,created_at (лишние колонки пустые).
+
+Записи проверяются теми же правилами, что и Chat.clean / Message.clean,
+некорректные пропускаются с сообщением об ошибке. Файл читается потоком и
+загружается пачками: каждая пачка - одна транзакция с COPY чатов и
+сообщений, обновлением статистики чатов и контрольной точки
+(ImportCheckpoint), поэтому прерванная загрузка продолжается с первой
+незагруженной записи без повторов и пропусков.
+"""
+import csv
+import logging
+import os
+import time
+
+import orjson
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache, partitioning
+from .models import (
+    Chat,
+    ImportCheckpoint,
+    ImportedChat,
+    Message,
+    clean_chat_title,
+    clean_message_text,
+)
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'csv')
+
+KEY_MAX_LENGTH = ImportedChat._meta.get_field('key').max_length
+
+
+class InvalidRecord(ValueError):
+    """Запись файла не прошла проверку."""
+
+
+def detect_format(path):
+    """Формат файла по расширению: .csv - csv, иначе ndjson."""
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_ndjson(file, offset=0):
+    """
+    Записи NDJSON из бинарного файла, начиная со смещения offset.
+
+    Выдает пары (смещение после записи, запись или InvalidRecord); пустые
+    строки выдаются как None.
+    """
+    file.seek(offset)
+    for line in file:
+        offset += len(line)
+        if not line.strip():
+            yield offset, None
+            continue
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            record = InvalidRecord(f"Некорректный JSON: {e}")
+        else:
+            if not isinstance(record, dict):
+                record = InvalidRecord("Запись должна быть JSON-объектом")
+        yield offset, record
+
+
+def read_csv(file, offset=0):
+    """
+    Записи CSV из бинарного файла с заголовком, начиная со смещения offset
+    (0 - сразу после заголовка). Выдает то же, что read_ndjson.
+    """
+    position = 0
+
+    def lines():
+        # Счетчик байтов прочитанных строк: csv.reader берет строки по одной,
+        # поэтому после каждой записи он равен смещению ее конца
+        nonlocal position
+        for line in file:
+            position += len(line)
+            yield line.decode('utf-8-sig' if position == len(line) else 'utf-8')
+
+    file.seek(0)
+    reader = csv.reader(lines())
+    header = next(reader, None)
+    if header is None:
+        return
+
+    header = [name.strip() for name in header]
+    if 'type' not in header:
+        raise InvalidRecord("В заголовке CSV нет колонки type")
+
+    if offset:
+        file.seek(offset)
+        position = offset
+        reader = csv.reader(lines())
+
+    for row in reader:
+        if not any(value.strip() for value in row):
+            yield position, None
+            continue
+        if len(row) != len(header):
+            yield position, InvalidRecord(f"Ожидается колонок: {len(header)}, получено: {len(row)}")
+            continue
+        yield position, {
+            name: value for name, value in zip(header, row)
+            if value != '' or name in ('title', 'text')
+        }
+
+
+def _key(value, field):
+    if isinstance(value, bool) or not isinstance(value, (str, int)) or value == '':
+        raise InvalidRecord(f"Поле {field} должно быть непустой строкой или числом")
+    key = str(value)
+    if len(key) > KEY_MAX_LENGTH:
+        raise InvalidRecord(f"Поле {field} длиннее {KEY_MAX_LENGTH} символов")
+    return key
+
+
+def _string(value, field):
+    if value is not None and not isinstance(value, str):
+        raise InvalidRecord(f"Поле {field} должно быть строкой")
+    return value
+
+
+def _created_at(value, default):
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise InvalidRecord("Поле created_at должно быть строкой с датой ISO 8601")
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise InvalidRecord(f"Некорректная дата created_at: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _validated(rule, value):
+    try:
+        return rule(value)
+    except ValidationError as e:
+        raise InvalidRecord(' '.join(e.messages))
+
+
+class Importer:
+    """
+    Загружает записи в БД пачками по batch_size записей.
+
+    progress(checkpoint) вызывается после каждой пачки, error(номер записи,
+    текст ошибки) - для каждой пропущенной записи.
+    """
+
+    def __init__(self, checkpoint, batch_size, progress=None, error=None):
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.progress = progress
+        self.error = error
+
+        # Ключ чата в файле -> id в БД (загруженные ранее и в текущей пачке)
+        self.chat_ids = dict(checkpoint.chat_keys.values_list('key', 'chat_id'))
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self.chats = []
+        self.messages = []
+        self.records = 0
+        self.errors = 0
+
+    def run(self, records):
+        """Загружает записи из read_ndjson / read_csv до конца файла."""
+        offset = self.checkpoint.offset
+        for offset, record in records:
+            self.records += 1
+            if record is not None:
+                try:
+                    self._add(record)
+                except InvalidRecord as e:
+                    self.errors += 1
+                    if self.error:
+                        self.error(self.checkpoint.line + self.records, str(e))
+
+            if self.records >= self.batch_size:
+                self._flush(offset)
+
+        self._flush(offset, completed=True)
+
+    def _add(self, record):
+        if isinstance(record, InvalidRecord):
+            raise record
+
+        record_type = record.get('type')
+        if record_type == 'chat':
+            key = _key(record.get('id'), 'id')
+            if key in self.chat_ids:
+                raise InvalidRecord(f"Чат {key} уже загружен")
+            title = _validated(clean_chat_title, _string(record.get('title'), 'title'))
+            created_at = _created_at(record.get('created_at'), timezone.now())
+            # id чата назначается при сохранении пачки
+            self.chat_ids[key] = None
+            self.chats.append((key, title, created_at))
+
+        elif record_type == 'message':
+            key = _key(record.get('chat'), 'chat')
+            if key not in self.chat_ids:
+                raise InvalidRecord(f"Чат {key} не найден в файле")
+            text = _validated(clean_message_text, _string(record.get('text'), 'text'))
+            created_at = _created_at(record.get('created_at'), timezone.now())
+            self.messages.append((key, text, created_at))
+
+        else:
+            raise InvalidRecord("Поле type должно быть chat или message")
+
+    def _flush(self, offset, completed=False):
+        checkpoint = self.checkpoint
+
+        with transaction.atomic():
+            if self.chats:
+                self._copy_chats()
+            if self.messages:
+                self._copy_messages()
+
+            checkpoint.offset = offset
+            checkpoint.line += self.records
+            checkpoint.chats += len(self.chats)
+            checkpoint.messages += len(self.messages)
+            checkpoint.errors += self.errors
+            checkpoint.completed = completed
+            checkpoint.save()
+
+            if completed:
+                # Соответствие ключей нужно только для продолжения загрузки
+                checkpoint.chat_keys.all().delete()
+
+        self._reset_batch()
+        if self.progress:
+            self.progress(checkpoint)
+
+    def _copy_chats(self):
+        qn = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [Chat._meta.db_table, len(self.chats)],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+            # Значения по умолчанию полей модели задаются Django, а не БД,
+            # поэтому COPY перечисляет все колонки чата
+            with cursor.cursor.copy(
+                f"COPY {qn(Chat._meta.db_table)} "
+                f"(id, title, created_at, is_deleting, message_count, last_message_at, last_message_preview, version) "
+                f"FROM STDIN"
+            ) as copy:
+                for chat_id, (key, title, created_at) in zip(ids, self.chats):
+                    copy.write_row((chat_id, title, created_at, False, 0, None, '', 0))
+
+            with cursor.cursor.copy(
+                f"COPY {qn(ImportedChat._meta.db_table)} (checkpoint_id, key, chat_id) FROM STDIN"
+            ) as copy:
+                for chat_id, (key, title, created_at) in zip(ids, self.chats):
+                    copy.write_row((self.checkpoint.pk, key, chat_id))
+
+        for chat_id, (key, title, created_at) in zip(ids, self.chats):
+            self.chat_ids[key] = chat_id
+
+    def _copy_messages(self):
+        qn = connection.ops.quote_name
+        chat_ids = self.chat_ids
+        stats = {}
+
+        # При секционировании по месяцам у сообщения должна быть секция его месяца
+        partitioning.ensure_partitions(months={partitioning.month_start(created_at) for key, text, created_at in self.messages})
+
+        with connection.cursor() as cursor:
+            with cursor.cursor.copy(
+                f"COPY {qn(Message._meta.db_table)} (chat_id, text, created_at) FROM STDIN"
+            ) as copy:
+                for key, text, created_at in self.messages:
+                    chat_id = chat_ids[key]
+                    copy.write_row((chat_id, text, created_at))
+
+                    count, last_at, last_text = stats.get(chat_id, (0, None, None))
+                    if last_at is None or created_at >= last_at:
+                        last_at, last_text = created_at, text
+                    stats[chat_id] = (count + 1, last_at, last_text)
+
+        Chat.objects.add_message_stats(
+            (chat_id, count, last_at, text)
+            for chat_id, (count, last_at, text) in stats.items()
+        )
+        for chat_id in stats:
+            cache.invalidate_chat(chat_id)
+
+
+def import_file(path, fmt=None, name=None, batch_size=50000, restart=False, progress=None, error=None):
+    """
+    Загружает файл (с контрольной точки, если загрузка уже начиналась).
+
+    name - имя контрольной точки (по умолчанию абсолютный путь к файлу),
+    restart - начать заново, удалив контрольную точку. Завершенная загрузка
+    не повторяется. Возвращает ImportCheckpoint с итогами.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    name = name or os.path.abspath(path)
+    if restart:
+        ImportCheckpoint.objects.filter(name=name).delete()
+
+    checkpoint, created = ImportCheckpoint.objects.get_or_create(name=name)
+    if checkpoint.completed:
+        return checkpoint
+    if not created:
+        logger.info("Продолжение загрузки %s со строки %s", name, checkpoint.line)
+
+    started = time.monotonic()
+    reader = read_csv if fmt == 'csv' else read_ndjson
+
+    with open(path, 'rb') as file:
+        importer = Importer(checkpoint, batch_size, progress=progress, error=error)
+        importer.run(reader(file, checkpoint.offset))
+
+    logger.info(
+        "Загружен файл %s: чатов %s, сообщений %s, ошибок %s за %.1f с",
+        name, checkpoint.chats, checkpoint.messages, checkpoint.errors,
+        time.monotonic() - started
+    )
+    return checkpoint
@@ -0,0 +1,157 @@
+"""
+Неблокирующее логирование.
+
+Обработчики логгеров из настройки LOG_QUEUE_LOGGERS переносятся за
+ограниченную очередь: запрос только кладет запись в очередь, а запись в
+файл и консоль выполняет фоновый поток QueueListener. Подстановка аргументов
+в сообщение и форматирование тоже выполняются в фоновом потоке, поэтому
+сообщения логируются в стиле logger.info("... %s", value).
+
+При переполнении очереди (медленный диск) записи отбрасываются по политике
+LOG_QUEUE_OVERFLOW, а количество потерянных записей попадает в лог, как
+только в очереди освобождается место.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+# Атрибуты, которые есть у любой записи лога; остальные пришли через extra
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+# Установленные BoundedQueueHandler (у каждого свой listener)
+_queue_handlers = []
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Форматирует запись как одну строку JSON: время, уровень, логгер, модуль,
+    сообщение, поля из extra и, если есть, трассировку исключения.
+    """
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+        }
+
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                data[key] = value
+
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler с ограниченной очередью и политикой переполнения.
+
+    overflow='drop_new' отбрасывает новую запись, 'drop_oldest' вытесняет
+    самую старую запись из очереди. Счетчик потерянных записей - dropped.
+    """
+
+    OVERFLOW_POLICIES = ('drop_new', 'drop_oldest')
+
+    def __init__(self, queue, overflow='drop_new'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения очереди логов: {overflow}")
+        super().__init__(queue)
+        self.overflow = overflow
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record):
+        # Записи не покидают процесс, поэтому не форматируются заранее:
+        # getMessage() и форматтеры вызываются в потоке QueueListener
+        return record
+
+    def enqueue(self, record):
+        # Вызывается под self.lock (Handler.handle)
+        if self._unreported and self._put(self._dropped_record(record)):
+            self._unreported = 0
+
+        if self._put(record):
+            return
+
+        if self.overflow == 'drop_oldest':
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._put(record)
+
+        self.dropped += 1
+        self._unreported += 1
+
+    def _put(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            return False
+        return True
+
+    def _dropped_record(self, record):
+        return logging.makeLogRecord({
+            'name': record.name,
+            'levelno': logging.WARNING,
+            'levelname': 'WARNING',
+            'msg': "Очередь логов переполнена, потеряно записей: %d",
+            'args': (self._unreported,),
+        })
+
+
+def install_queue_logging(logger_names, maxsize, overflow='drop_new'):
+    """
+    Переносит обработчики указанных логгеров за BoundedQueueHandler.
+
+    Для каждого логгера запускается свой QueueListener с его прежними
+    обработчиками (уровни обработчиков соблюдаются). Очереди сбрасываются
+    при завершении процесса.
+    """
+    for name in logger_names:
+        logger = logging.getLogger(name)
+        handlers = [
+            handler for handler in logger.handlers
+            if not isinstance(handler, logging.handlers.QueueHandler)
+        ]
+        if not handlers:
+            continue
+
+        handler = BoundedQueueHandler(queue.Queue(maxsize), overflow)
+        listener = logging.handlers.QueueListener(
+            handler.queue,
+            *handlers,
+            respect_handler_level=True,
+        )
+        handler.listener = listener
+
+        for old_handler in handlers:
+            logger.removeHandler(old_handler)
+        logger.addHandler(handler)
+
+        listener.start()
+        _queue_handlers.append(handler)
+
+
+def dropped_records():
+    """Сколько записей лога потеряно из-за переполнения очередей в этом процессе."""
+    return sum(handler.dropped for handler in _queue_handlers)
+
+
+def _stop_listeners():
+    # stop() дожидается, пока listener запишет все записи из очереди
+    while _queue_handlers:
+        _queue_handlers.pop().listener.stop()
+
+
+atexit.register(_stop_listeners)
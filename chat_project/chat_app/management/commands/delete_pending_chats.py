@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from chat_app.deletion import delete_pending_chats
+
+
+class Command(BaseCommand):
+    help = "Доудаляет чаты, помеченные на удаление (is_deleting), пачками сообщений"
+
+    def handle(self, *args, **options):
+        deleted = delete_pending_chats()
+        self.stdout.write(self.style.SUCCESS(f"Удалено чатов: {deleted}"))
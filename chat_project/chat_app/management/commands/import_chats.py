@@ -0,0 +1,79 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat_app.importer import FORMATS, InvalidRecord, import_file
+from chat_app.models import ImportCheckpoint
+
+# Сколько ошибок в записях выводить подробно
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает чаты и сообщения из NDJSON или CSV пачками через COPY. "
+        "Прерванная загрузка продолжается с контрольной точки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл для загрузки")
+        parser.add_argument(
+            '--format', choices=FORMATS, dest='fmt',
+            help="Формат файла (по умолчанию по расширению: .csv - csv, иначе ndjson)",
+        )
+        parser.add_argument('--batch-size', type=int, default=50000, help="Записей в одной транзакции")
+        parser.add_argument('--name', help="Имя контрольной точки (по умолчанию путь к файлу)")
+        parser.add_argument('--restart', action='store_true', help="Начать загрузку заново")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+
+        name = options['name'] or os.path.abspath(options['path'])
+        loaded = 0
+        if not options['restart']:
+            checkpoint = ImportCheckpoint.objects.filter(name=name).first()
+            if checkpoint and checkpoint.completed:
+                raise CommandError(
+                    f"Файл уже загружен (чатов {checkpoint.chats}, сообщений {checkpoint.messages}). "
+                    f"Для повторной загрузки используйте --restart"
+                )
+            if checkpoint:
+                loaded = checkpoint.messages
+                self.stdout.write(f"Продолжение загрузки с записи {checkpoint.line + 1}")
+
+        started = time.monotonic()
+        reported = 0
+
+        def error(line, message):
+            nonlocal reported
+            reported += 1
+            if reported <= MAX_REPORTED_ERRORS:
+                self.stderr.write(f"Запись {line}: {message}")
+            elif reported == MAX_REPORTED_ERRORS + 1:
+                self.stderr.write("Остальные ошибки не выводятся")
+
+        def progress(checkpoint):
+            elapsed = time.monotonic() - started
+            rate = (checkpoint.messages - loaded) / elapsed if elapsed else 0
+            self.stdout.write(
+                f"Записей: {checkpoint.line}, чатов: {checkpoint.chats}, сообщений: {checkpoint.messages}, "
+                f"ошибок: {checkpoint.errors} ({rate:.0f} сообщений/с)"
+            )
+
+        try:
+            checkpoint = import_file(
+                options['path'], fmt=options['fmt'], name=name, batch_size=options['batch_size'],
+                restart=options['restart'], progress=progress, error=error,
+            )
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать файл: {e}")
+        except InvalidRecord as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Загружено чатов: {checkpoint.chats}, сообщений: {checkpoint.messages}, "
+            f"пропущено записей: {checkpoint.errors} за {time.monotonic() - started:.1f} с"
+        ))
+
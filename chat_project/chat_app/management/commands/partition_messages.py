@@ -0,0 +1,79 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat_app import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        "Секционирование таблицы сообщений: перевод на секции по месяцам или хэшу чата, "
+        "создание секций на будущие месяцы и отсоединение старых. "
+        "Без параметров создает недостающие секции (для запуска по расписанию)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', choices=partitioning.SCHEMES,
+            help="Секционировать обычную таблицу: month - по месяцам created_at, hash - по хэшу chat_id",
+        )
+        parser.add_argument(
+            '--hash-partitions', type=int, default=settings.MESSAGE_HASH_PARTITIONS,
+            help="Число секций схемы hash",
+        )
+        parser.add_argument('--unpartition', action='store_true', help="Вернуть обычную таблицу")
+        parser.add_argument(
+            '--months-ahead', type=int, default=settings.MESSAGE_PARTITION_MONTHS_AHEAD,
+            help="На сколько месяцев вперед создавать секции схемы month",
+        )
+        parser.add_argument(
+            '--detach-older-than', type=int, metavar='MONTHS',
+            help="Отсоединить секции месяцев старше MONTHS полных месяцев до текущего",
+        )
+        parser.add_argument('--drop', action='store_true', help="Удалять отсоединенные секции")
+
+    def handle(self, *args, **options):
+        if options['months_ahead'] < 0:
+            raise CommandError("--months-ahead не может быть отрицательным")
+        if options['hash_partitions'] < 2:
+            raise CommandError("--hash-partitions должен быть не меньше 2")
+        if options['drop'] and options['detach_older_than'] is None:
+            raise CommandError("--drop используется вместе с --detach-older-than")
+
+        try:
+            if options['unpartition']:
+                partitioning.unpartition()
+                self.stdout.write(self.style.SUCCESS("Таблица сообщений снова обычная"))
+                return
+
+            if options['convert']:
+                self.stdout.write(f"Секционирование таблицы сообщений по схеме {options['convert']}...")
+                partitioning.convert(options['convert'], options['hash_partitions'], options['months_ahead'])
+
+            scheme = partitioning.current_scheme()
+            if scheme is None:
+                raise CommandError(
+                    "Таблица сообщений не секционирована: используйте --convert month или --convert hash"
+                )
+
+            created = partitioning.ensure_partitions(options['months_ahead'])
+            if created:
+                self.stdout.write(f"Созданы секции: {', '.join(created)}")
+
+            if options['detach_older_than'] is not None:
+                if options['detach_older_than'] < 1:
+                    raise CommandError("--detach-older-than должен быть положительным")
+                current = partitioning.month_start(datetime.datetime.now(datetime.timezone.utc))
+                cutoff = partitioning.add_months(current, -options['detach_older_than'])
+                detached = partitioning.detach_partitions_before(cutoff, drop=options['drop'])
+                action = "Удалены" if options['drop'] else "Отсоединены"
+                self.stdout.write(f"{action} секции старше {cutoff:%Y-%m}: {', '.join(detached) or 'нет'}")
+
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Схема: {scheme}")
+        for name, bound, rows in partitioning.partitions():
+            self.stdout.write(f"  {name}: {bound} (~{rows} строк)")
+        self.stdout.write(self.style.SUCCESS("Готово"))
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from chat_app.retention import purge_messages
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет устаревшие сообщения по сроку хранения (MESSAGE_RETENTION_DAYS, "
+        "MESSAGE_RETENTION_MAX_MESSAGES и политики чатов) небольшими пачками. "
+        "С --loop работает постоянно, повторяя проход каждые --interval секунд"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chat', type=int, nargs='+', dest='chat_ids', help="Только эти чаты")
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.MESSAGE_PURGE_BATCH_SIZE,
+            help="Сообщений в одной пачке (транзакции)",
+        )
+        parser.add_argument(
+            '--pause', type=float, default=settings.MESSAGE_PURGE_PAUSE,
+            help="Пауза после каждой пачки (секунды)",
+        )
+        parser.add_argument('--loop', action='store_true', help="Повторять проходы до остановки процесса")
+        parser.add_argument('--interval', type=float, default=60, help="Пауза между проходами --loop (секунды)")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+        if options['pause'] < 0 or options['interval'] < 0:
+            raise CommandError("--pause и --interval не могут быть отрицательными")
+
+        def progress(stats):
+            self.stdout.write(f"Удалено сообщений: {stats.messages} в {stats.chats} чатах...")
+
+        while True:
+            stats = purge_messages(
+                chat_ids=options['chat_ids'], batch_size=options['batch_size'],
+                pause=options['pause'], progress=progress if options['verbosity'] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Удалено сообщений: {stats.messages} в {stats.chats} чатах за {stats.elapsed:.1f} с "
+                f"(пачек: {stats.batches}, отложено чатов: {stats.skipped})"
+            ))
+            if not options['loop']:
+                break
+
+            # Процесс работает долго: соединение с БД не должно устаревать
+            close_old_connections()
+            time.sleep(options['interval'])
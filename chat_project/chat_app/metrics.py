@@ -0,0 +1,320 @@
+"""
+Метрики запросов в формате Prometheus.
+
+MetricsMiddleware измеряет для каждого запроса время ответа, количество и
+суммарное время SQL-запросов, время сериализации и рендеринга, размер ответа
+и складывает их в гистограммы с метками view и method. Значения отдает
+GET /metrics в текстовом формате Prometheus.
+
+SQL-запросы считаются execute wrapper'ом, который подключается к каждому
+соединению с БД и пишет в состояние текущего запроса (contextvar), поэтому
+учитываются и запросы из sync_to_async в асинхронных представлениях. Вне
+запроса wrapper только вызывает следующий обработчик.
+
+Метрики хранятся в памяти процесса: при нескольких воркерах каждый отдает
+свои значения.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_current = contextvars.ContextVar('chat_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Измерения одного запроса."""
+
+    __slots__ = ('started', 'queries', 'db_time', 'phases')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = {}
+
+    def add_phase(self, name, duration):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+
+class Histogram:
+    """Гистограмма Prometheus с метками (кумулятивные бакеты, сумма, количество)."""
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            label_text = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}'
+            yield f"{self.name}_sum{{{label_text}}} {total}"
+            yield f"{self.name}_count{{{label_text}}} {count}"
+
+
+class Counter:
+    """Счетчик Prometheus с метками."""
+
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._series = {}
+
+    def inc(self, labels, value=1):
+        self._series[labels] = self._series.get(labels, 0) + value
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._series.items()):
+            yield f"{self.name}{{{_format_labels(self.label_names, labels)}}} {value}"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+_lock = threading.Lock()
+
+requests_total = Counter(
+    'chat_http_requests_total',
+    "Количество запросов",
+    ('view', 'method', 'status'),
+)
+request_duration = Histogram(
+    'chat_http_request_duration_seconds',
+    "Время ответа (для потоковых ответов - до начала потока)",
+    ('view', 'method'),
+    LATENCY_BUCKETS,
+)
+response_size = Histogram(
+    'chat_http_response_size_bytes',
+    "Размер тела ответа (без потоковых ответов)",
+    ('view', 'method'),
+    SIZE_BUCKETS,
+)
+db_queries = Histogram(
+    'chat_db_queries_per_request',
+    "Количество SQL-запросов за запрос",
+    ('view', 'method'),
+    QUERY_COUNT_BUCKETS,
+)
+db_duration = Histogram(
+    'chat_db_duration_seconds',
+    "Суммарное время SQL-запросов за запрос",
+    ('view', 'method'),
+    LATENCY_BUCKETS,
+)
+phase_duration = Histogram(
+    'chat_request_phase_duration_seconds',
+    "Время этапов запроса: serialize - сериализация, render - рендеринг ответа",
+    ('view', 'method', 'phase'),
+    LATENCY_BUCKETS,
+)
+
+_request_metrics = (requests_total, request_duration, response_size, db_queries, db_duration, phase_duration)
+
+
+@contextmanager
+def timed(phase):
+    """Добавляет время блока к этапу phase текущего запроса."""
+    state = _current.get()
+    if state is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.add_phase(phase, time.perf_counter() - started)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    state = _current.get()
+    if state is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries += 1
+        state.db_time += time.perf_counter() - started
+
+
+def _install_db_wrapper(sender, connection, **kwargs):
+    # Сигнал приходит при каждом подключении (и при выдаче из пула), а
+    # список wrapper'ов принадлежит объекту соединения Django
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def install_db_instrumentation():
+    """Подключает подсчет SQL-запросов ко всем новым соединениям с БД."""
+    connection_created.connect(_install_db_wrapper, dispatch_uid='chat_app.metrics')
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.view_name
+
+
+def _server_timing(state, total):
+    parts = [
+        f'db;dur={state.db_time * 1000:.2f};desc="{state.queries} queries"',
+    ]
+    for phase, duration in state.phases.items():
+        parts.append(f'{phase};dur={duration * 1000:.2f}')
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+def _finish(request, response, state):
+    total = time.perf_counter() - state.started
+    view = _view_name(request)
+    # Произвольные методы из запроса не должны создавать новые серии
+    method = request.method if request.method in _METHODS else 'other'
+    labels = (view, method)
+
+    size = None
+    if not response.streaming:
+        size = len(response.content)
+
+    with _lock:
+        requests_total.inc((view, method, str(response.status_code)))
+        request_duration.observe(labels, total)
+        db_queries.observe(labels, state.queries)
+        db_duration.observe(labels, state.db_time)
+        for phase, duration in state.phases.items():
+            phase_duration.observe((view, method, phase), duration)
+        if size is not None:
+            response_size.observe(labels, size)
+
+    if settings.METRICS_SERVER_TIMING:
+        response['Server-Timing'] = _server_timing(state, total)
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики каждого запроса. Работает и с синхронными, и с
+    асинхронными представлениями без переключения потоков.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = RequestMetrics()
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(request, response, state)
+        return response
+
+    async def __acall__(self, request):
+        state = RequestMetrics()
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(request, response, state)
+        return response
+
+
+def _gauge(name, documentation, value):
+    return [
+        f"# HELP {name} {documentation}",
+        f"# TYPE {name} gauge",
+        f"{name} {value}",
+    ]
+
+
+def _counter(name, documentation, value):
+    return [
+        f"# HELP {name} {documentation}",
+        f"# TYPE {name} counter",
+        f"{name} {value}",
+    ]
+
+
+def render_metrics():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    from . import cache, db, log
+
+    lines = []
+    with _lock:
+        for metric in _request_metrics:
+            lines.extend(metric.collect())
+
+    cache_stats = cache.get_stats()
+    lines += _counter('chat_cache_hits_total', "Попадания в кэш ответов чатов", cache_stats['hits'])
+    lines += _counter('chat_cache_misses_total', "Промахи кэша ответов чатов", cache_stats['misses'])
+    lines += _counter('chat_cache_validator_hits_total', "Попадания в кэш ETag", cache_stats['validator_hits'])
+    lines += _counter('chat_cache_validator_misses_total', "Промахи кэша ETag", cache_stats['validator_misses'])
+    lines += _counter('chat_cache_invalidations_total', "Инвалидации кэша чатов", cache_stats['invalidations'])
+
+    pool = db.pool_stats()
+    if pool is not None:
+        lines += _gauge('chat_db_pool_size', "Открытые соединения пула", pool['size'])
+        lines += _gauge('chat_db_pool_in_use', "Выданные соединения пула", pool['in_use'])
+        lines += _gauge('chat_db_pool_idle', "Свободные соединения пула", pool['idle'])
+        lines += _gauge('chat_db_pool_waiting', "Запросы, ожидающие соединение", pool['waiting'])
+        lines += _counter('chat_db_pool_wait_seconds_total', "Суммарное время ожидания соединения", pool['wait_ms_total'] / 1000)
+        lines += _counter('chat_db_pool_timeouts_total', "Запросы, не дождавшиеся соединения", pool['timeouts'])
+
+    lines += _counter('chat_log_dropped_records_total', "Записи лога, потерянные при переполнении очереди", log.dropped_records())
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-17 05:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', '-created_at', '-id'], name='message_chat_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0002_message_chat_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='is_deleting',
+            field=models.BooleanField(default=False, help_text='Чат помечен на удаление: он уже недоступен через API, сообщения удаляются пачками', verbose_name='Удаляется'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в таблицу сообщений
+    atomic = False
+
+    dependencies = [
+        ('chat_app', '0003_chat_is_deleting'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('text', config='russian'), name='message_text_search_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:18
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0004_message_text_search_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последнее сообщение'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Превью последнего сообщения'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество сообщений'),
+        ),
+        # Заполняем статистику существующих чатов
+        migrations.RunSQL(
+            sql=[
+                """
+                UPDATE chat SET message_count = stats.count, last_message_at = stats.last_at
+                FROM (
+                    SELECT chat_id, count(*) AS count, max(created_at) AS last_at
+                    FROM message GROUP BY chat_id
+                ) AS stats
+                WHERE chat.id = stats.chat_id
+                """,
+                """
+                UPDATE chat SET last_message_preview = latest.preview
+                FROM (
+                    SELECT DISTINCT ON (chat_id) chat_id, left(text, 100) AS preview
+                    FROM message ORDER BY chat_id, created_at DESC, id DESC
+                ) AS latest
+                WHERE chat.id = latest.chat_id
+                """,
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(models.OrderBy(models.F('created_at'), descending=True), models.OrderBy(models.F('id'), descending=True), condition=models.Q(('is_deleting', False)), name='chat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(models.OrderBy(django.db.models.functions.comparison.Coalesce('last_message_at', 'created_at'), descending=True), models.OrderBy(models.F('id'), descending=True), condition=models.Q(('is_deleting', False)), name='chat_activity_idx'),
+        ),
+    ]
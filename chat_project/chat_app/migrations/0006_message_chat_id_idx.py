@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в таблицу сообщений
+    atomic = False
+
+    dependencies = [
+        ('chat_app', '0005_chat_message_stats'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(fields=['chat', 'id'], name='message_chat_id_idx'),
+        ),
+    ]
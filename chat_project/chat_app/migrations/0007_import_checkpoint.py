@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0006_message_chat_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя загрузки')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Смещение в файле (байт)')),
+                ('line', models.BigIntegerField(default=0, verbose_name='Обработано строк')),
+                ('chats', models.BigIntegerField(default=0, verbose_name='Загружено чатов')),
+                ('messages', models.BigIntegerField(default=0, verbose_name='Загружено сообщений')),
+                ('errors', models.BigIntegerField(default=0, verbose_name='Пропущено строк')),
+                ('completed', models.BooleanField(default=False, verbose_name='Завершена')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Загрузка',
+                'verbose_name_plural': 'Загрузки',
+                'db_table': 'import_checkpoint',
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportedChat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat_app.chat')),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_keys', to='chat_app.importcheckpoint')),
+            ],
+            options={
+                'db_table': 'import_chat_key',
+                'constraints': [models.UniqueConstraint(fields=('checkpoint', 'key'), name='import_chat_key_unique')],
+            },
+        ),
+    ]
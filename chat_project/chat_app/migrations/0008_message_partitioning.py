@@ -0,0 +1,67 @@
+from django.db import migrations
+
+# Секционирование таблицы сообщений включается только командой
+# partition_messages --convert: применение миграции от окружения не зависит и
+# схему не меняет. Откат возвращает таблицу к виду 0007 - обычной таблице.
+# SQL зафиксирован здесь, а не берется из chat_app.partitioning, чтобы
+# изменения модуля не меняли уже примененную миграцию
+
+TABLE = 'message'
+OLD_TABLE = 'message_rebuild'
+
+
+def unpartition_messages(apps, schema_editor):
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE])
+        if cursor.fetchone() is None:
+            return
+
+        # Отложенные проверки внешних ключей не дают удалить таблицу
+        connection.check_constraints()
+
+        cursor.execute(f"LOCK TABLE {qn(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = to_regclass(%s) AND NOT indisprimary ORDER BY indexrelid",
+            [TABLE],
+        )
+        # Индексы секционированной таблицы описываются как ON ONLY
+        indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(OLD_TABLE)}")
+        cursor.execute(f"CREATE TABLE {qn(TABLE)} (LIKE {qn(OLD_TABLE)} INCLUDING DEFAULTS)")
+        cursor.execute(f"INSERT INTO {qn(TABLE)} SELECT * FROM {qn(OLD_TABLE)}")
+        cursor.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {qn(OLD_TABLE)}")
+        next_id = cursor.fetchone()[0]
+        # Вместе со старой таблицей удаляются ее секции, индексы и последовательность
+        cursor.execute(f"DROP TABLE {qn(OLD_TABLE)}")
+
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ALTER COLUMN id "
+            f"ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(next_id)})"
+        )
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(TABLE + '_pkey')} PRIMARY KEY ({qn('id')})")
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(name)} {definition}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0007_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, unpartition_messages),
+    ]
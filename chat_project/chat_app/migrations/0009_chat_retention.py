@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0008_message_partitioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - глобальная настройка MESSAGE_RETENTION_DAYS, 0 - без ограничения', null=True, verbose_name='Хранить сообщения (дней)'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='retention_max_messages',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - глобальная настройка MESSAGE_RETENTION_MAX_MESSAGES, 0 - без ограничения', null=True, verbose_name='Хранить не больше сообщений'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat_app', '0009_chat_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Версия сообщений'),
+        ),
+    ]
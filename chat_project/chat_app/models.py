@@ -1,5 +1,134 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, models
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Left
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import cache
+
+# Конфигурация полнотекстового поиска по сообщениям (стемминг русского языка).
+# Индекс message_text_search_idx построен по выражению message_search_vector(),
+# поэтому запрос использует индекс, только пока выражения совпадают
+SEARCH_CONFIG = 'russian'
+
+
+def message_search_vector():
+    """Выражение tsvector текста сообщения."""
+    return SearchVector('text', config=SEARCH_CONFIG)
+
+
+# Длина превью последнего сообщения в списке чатов
+PREVIEW_LENGTH = 100
+
+
+def chat_activity():
+    """
+    Время последней активности чата: последнее сообщение, а для чата без
+    сообщений - создание. Индекс chat_activity_idx построен по этому выражению.
+    """
+    return Coalesce('last_message_at', 'created_at')
+
+
+def clean_chat_title(title):
+    """Название чата без пробелов по краям; ValidationError, если оно некорректно."""
+    # Убираем пробелы по краям
+    if title:
+        title = title.strip()
+
+    # Проверяем, что title не пустой после тримминга
+    if not title:
+        raise ValidationError("Название чата не может быть пустым.")
+
+    # Проверяем длину
+    if len(title) < 1 or len(title) > 200:
+        raise ValidationError("Название чата должно содержать от 1 до 200 символов.")
+
+    return title
+
+
+def clean_message_text(text):
+    """Текст сообщения без пробелов по краям; ValidationError, если он некорректен."""
+    # Убираем пробелы по краям
+    if text:
+        text = text.strip()
+
+    # Проверяем, что text не пустой после тримминга
+    if not text:
+        raise ValidationError("Текст сообщения не может быть пустым.")
+
+    # Проверяем длину
+    if len(text) < 1 or len(text) > 5000:
+        raise ValidationError("Текст сообщения должен содержать от 1 до 5000 символов.")
+
+    return text
+
+
+class ChatQuerySet(models.QuerySet):
+    """QuerySet чатов."""
+
+    def alive(self):
+        """Чаты, которые не находятся в процессе удаления."""
+        return self.filter(is_deleting=False)
+
+    def add_message_stats(self, stats):
+        """
+        Учитывает новые сообщения в статистике чатов одним UPDATE.
+
+        stats - последовательность (chat_id, количество новых сообщений,
+        created_at и текст последнего из них). Превью меняется, только если
+        новое сообщение не старше последнего известного.
+        """
+        stats = list(stats)
+        if not stats:
+            return 0
+
+        connection = connections[self.db]
+        table = connection.ops.quote_name(Chat._meta.db_table)
+        chat_ids, counts, last_at, previews = zip(*stats)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET "
+                f"message_count = {table}.message_count + new.count, "
+                f"version = {table}.version + 1, "
+                f"last_message_preview = CASE WHEN {table}.last_message_at IS NULL "
+                f"OR {table}.last_message_at <= new.last_at "
+                f"THEN new.preview ELSE {table}.last_message_preview END, "
+                f"last_message_at = GREATEST({table}.last_message_at, new.last_at) "
+                f"FROM unnest(%s::bigint[], %s::integer[], %s::timestamptz[], %s::text[]) "
+                f"AS new(id, count, last_at, preview) "
+                f"WHERE {table}.id = new.id",
+                [
+                    list(chat_ids),
+                    list(counts),
+                    list(last_at),
+                    [preview[:PREVIEW_LENGTH] for preview in previews],
+                ],
+            )
+            return cursor.rowcount
+
+    def refresh_message_stats(self):
+        """
+        Пересчитывает message_count, last_message_at и last_message_preview
+        по таблице сообщений одним UPDATE. Нужен после массового удаления или
+        изменения сообщений (QuerySet.update/delete); добавление и save/delete
+        отдельного сообщения обновляют статистику инкрементально.
+        """
+        messages = Message.objects.filter(chat=OuterRef('pk')).order_by()
+        latest = messages.order_by('-created_at', '-id')
+        count = messages.values('chat').annotate(count=Count('id')).values('count')
+
+        return self.update(
+            message_count=Coalesce(Subquery(count), 0),
+            version=F('version') + 1,
+            last_message_at=Subquery(latest.values('created_at')[:1]),
+            last_message_preview=Coalesce(
+                Subquery(latest.values(preview=Left('text', PREVIEW_LENGTH))[:1]),
+                Value(''),
+            ),
+        )
 
 
 class Chat(models.Model):
@@ -13,34 +142,256 @@ class Chat(models.Model):
         auto_now_add=True,
         verbose_name="Дата создания"
     )
+    is_deleting = models.BooleanField(
+        default=False,
+        verbose_name="Удаляется",
+        help_text="Чат помечен на удаление: он уже недоступен через API, сообщения удаляются пачками"
+    )
+
+    # Денормализованная статистика сообщений для списка чатов
+    message_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество сообщений"
+    )
+    last_message_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Последнее сообщение"
+    )
+    last_message_preview = models.CharField(
+        max_length=PREVIEW_LENGTH,
+        blank=True,
+        default='',
+        verbose_name="Превью последнего сообщения"
+    )
+    # Версия содержимого для ETag ответа чата: увеличивается вместе со
+    # статистикой при любом добавлении, изменении и удалении сообщений
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Версия сообщений"
+    )
+
+    # Срок хранения сообщений чата (команда purge_messages)
+    retention_days = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Хранить сообщения (дней)",
+        help_text="Пусто - глобальная настройка MESSAGE_RETENTION_DAYS, 0 - без ограничения"
+    )
+    retention_max_messages = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Хранить не больше сообщений",
+        help_text="Пусто - глобальная настройка MESSAGE_RETENTION_MAX_MESSAGES, 0 - без ограничения"
+    )
+
+    objects = ChatQuerySet.as_manager()
 
     class Meta:
         db_table = 'chat'
         verbose_name = 'Чат'
         verbose_name_plural = 'Чаты'
         ordering = ['-created_at']
+        indexes = [
+            # Страницы списка чатов: по дате создания и по последней активности
+            models.Index(
+                F('created_at').desc(),
+                F('id').desc(),
+                name='chat_created_idx',
+                condition=Q(is_deleting=False),
+            ),
+            models.Index(
+                chat_activity().desc(),
+                F('id').desc(),
+                name='chat_activity_idx',
+                condition=Q(is_deleting=False),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} (ID: {self.id})"
 
     def clean(self):
         """Валидация модели."""
-        # Убираем пробелы по краям
-        if self.title:
-            self.title = self.title.strip()
-
-        # Проверяем, что title не пустой после тримминга
-        if not self.title:
-            raise ValidationError("Название чата не может быть пустым.")
-
-        # Проверяем длину
-        if len(self.title) < 1 or len(self.title) > 200:
-            raise ValidationError("Название чата должно содержать от 1 до 200 символов.")
+        self.title = clean_chat_title(self.title)
 
     def save(self, *args, **kwargs):
         """Переопределяем save для вызова clean()."""
         self.full_clean()
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if not adding:
+            cache.invalidate_chat(self.pk)
+
+    def delete(self, *args, **kwargs):
+        """Удаление чата сбрасывает его кэш."""
+        cache.invalidate_chat(self.pk)
+        return super().delete(*args, **kwargs)
+
+
+class MessageQuerySet(models.QuerySet):
+    """QuerySet сообщений."""
+
+    def since(self, message_id):
+        """Сообщения с id больше message_id в порядке создания."""
+        return self.filter(id__gt=message_id).order_by('id')
+
+    def search(self, query):
+        """
+        Сообщения, подходящие под поисковый запрос, с аннотацией rank
+        (релевантность, double precision).
+
+        Запрос разбирается как websearch_to_tsquery: слова, "фразы в
+        кавычках", or и -исключения; синтаксических ошибок не бывает.
+        """
+        vector = message_search_vector()
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return (
+            self
+            .alias(search=vector)
+            .filter(search=search_query)
+            # ts_rank возвращает real; double precision без потерь проходит
+            # через курсор пагинации
+            .annotate(rank=Cast(SearchRank(vector, search_query), models.FloatField()))
+        )
+
+    def delete_batch_for_chat(self, chat_id, batch_size):
+        """
+        Удаляет до batch_size сообщений чата одним запросом, не загружая их
+        в память. Возвращает количество удаленных строк.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(Message._meta.db_table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE id IN "
+                f"(SELECT id FROM {table} WHERE chat_id = %s LIMIT %s)",
+                [chat_id, batch_size],
+            )
+            return cursor.rowcount
+
+    def purge_batch_for_chat(self, chat_id, before, batch_size):
+        """
+        Удаляет до batch_size самых старых сообщений чата, которые в порядке
+        (created_at, id) раньше before, и уменьшает статистику чата - один
+        запрос WITH DELETE ... UPDATE. Сообщения выбираются по индексу
+        message_chat_created_idx, строка чата блокируется только на время
+        этого запроса. Если удалены все сообщения чата, превью очищается.
+        Возвращает количество удаленных строк.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        table = qn(Message._meta.db_table)
+        chat_table = qn(Chat._meta.db_table)
+        created_at, message_id = before
+
+        # Условие created_at <= ... отсекает будущие секции схемы month
+        # при планировании (см. partitioning)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH deleted AS ("
+                f"DELETE FROM {table} WHERE chat_id = %s AND created_at <= %s AND id IN ("
+                f"SELECT id FROM {table} WHERE chat_id = %s AND created_at <= %s "
+                f"AND (created_at, id) < (%s, %s) "
+                f"ORDER BY created_at, id LIMIT %s"
+                f") RETURNING 1"
+                f") "
+                f"UPDATE {chat_table} SET "
+                f"message_count = GREATEST(message_count - purged.count, 0), "
+                f"version = version + 1, "
+                f"last_message_at = CASE WHEN message_count <= purged.count "
+                f"THEN NULL ELSE last_message_at END, "
+                f"last_message_preview = CASE WHEN message_count <= purged.count "
+                f"THEN '' ELSE last_message_preview END "
+                f"FROM (SELECT count(*) AS count FROM deleted) AS purged "
+                f"WHERE {chat_table}.id = %s AND purged.count > 0 "
+                f"RETURNING purged.count",
+                [chat_id, created_at, chat_id, created_at, created_at, message_id, batch_size, chat_id],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _invalidate_chats(self):
+        """Сбрасывает кэш всех чатов, которых касается QuerySet, и возвращает их id."""
+        chat_ids = set(self.values_list('chat_id', flat=True).distinct())
+        for chat_id in chat_ids:
+            cache.invalidate_chat(chat_id)
+        return chat_ids
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+
+        by_chat = {}
+        for obj in objs:
+            by_chat.setdefault(obj.chat_id, []).append(obj)
+
+        stats = []
+        for chat_id, messages in by_chat.items():
+            last = max(messages, key=lambda message: (message.created_at, message.pk))
+            stats.append((chat_id, len(messages), last.created_at, last.text))
+        Chat.objects.db_manager(self.db).add_message_stats(stats)
+
+        for chat_id in by_chat:
+            cache.invalidate_chat(chat_id)
+        return objs
+
+    def update(self, **kwargs):
+        chat_ids = self._invalidate_chats()
+        updated = super().update(**kwargs)
+        Chat.objects.filter(id__in=chat_ids).refresh_message_stats()
+        return updated
+
+    def delete(self):
+        chat_ids = self._invalidate_chats()
+        deleted = super().delete()
+        Chat.objects.filter(id__in=chat_ids).refresh_message_stats()
+        return deleted
+
+    def create_for_chat(self, chat_id, text):
+        """
+        Создает сообщение одним запросом: UPDATE статистики чата и INSERT
+        сообщения в одном WITH ... RETURNING.
+
+        Существование чата проверяется в том же запросе, поэтому отдельный
+        SELECT чата и full_clean() не нужны: текст должен быть уже
+        провалидирован. Возвращает None, если чата не существует или он удаляется.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        created_at = timezone.now()
+
+        # UPDATE блокирует строку чата до конца транзакции, поэтому
+        # конкурентные отправки в один чат не теряют инкременты. Превью
+        # меняется, только если сообщение новее последнего известного
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH chat AS ("
+                f"UPDATE {qn(Chat._meta.db_table)} SET "
+                f"message_count = message_count + 1, "
+                f"version = version + 1, "
+                f"last_message_preview = CASE WHEN last_message_at IS NULL OR last_message_at <= %s "
+                f"THEN %s ELSE last_message_preview END, "
+                f"last_message_at = GREATEST(last_message_at, %s) "
+                f"WHERE id = %s AND NOT is_deleting RETURNING id"
+                f") "
+                f"INSERT INTO {qn(Message._meta.db_table)} (chat_id, text, created_at) "
+                f"SELECT id, %s, %s FROM chat "
+                f"RETURNING id",
+                [created_at, text[:PREVIEW_LENGTH], created_at, chat_id, text, created_at],
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        cache.invalidate_chat(chat_id)
+
+        return self.model.from_db(
+            self.db,
+            ['id', 'chat_id', 'text', 'created_at'],
+            (row[0], chat_id, text, created_at),
+        )
 
 
 class Message(models.Model):
@@ -60,30 +411,147 @@ class Message(models.Model):
         verbose_name="Дата создания"
     )
 
+    objects = MessageQuerySet.as_manager()
+
     class Meta:
         db_table = 'message'
         verbose_name = 'Сообщение'
         verbose_name_plural = 'Сообщения'
         ordering = ['created_at']
+        indexes = [
+            # Покрывает выборку "последних N сообщений чата" без сортировки
+            models.Index(
+                fields=['chat', '-created_at', '-id'],
+                name='message_chat_created_idx',
+            ),
+            # Сообщения чата новее id: since в long polling, SSE и выгрузке
+            models.Index(
+                fields=['chat', 'id'],
+                name='message_chat_id_idx',
+            ),
+            # Полнотекстовый поиск по тексту сообщений
+            GinIndex(
+                message_search_vector(),
+                name='message_text_search_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Сообщение {self.id} в чате {self.chat_id}"
 
     def clean(self):
         """Валидация модели."""
-        # Убираем пробелы по краям
-        if self.text:
-            self.text = self.text.strip()
-
-        # Проверяем, что text не пустой после тримминга
-        if not self.text:
-            raise ValidationError("Текст сообщения не может быть пустым.")
-
-        # Проверяем длину
-        if len(self.text) < 1 or len(self.text) > 5000:
-            raise ValidationError("Текст сообщения должен содержать от 1 до 5000 символов.")
+        self.text = clean_message_text(self.text)
 
     def save(self, *args, **kwargs):
-        """Переопределяем save для вызова clean()."""
+        """Переопределяем save для вызова clean() и обновления статистики чата."""
         self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+
+        chats = Chat.objects.db_manager(self._state.db)
+        if adding:
+            chats.add_message_stats([(self.chat_id, 1, self.created_at, self.text)])
+        else:
+            # Превью меняется, только если изменено последнее сообщение чата
+            chats.filter(id=self.chat_id).update(
+                version=F('version') + 1,
+                last_message_preview=Case(
+                    When(~Exists(self._newer_messages()), then=Value(self.text[:PREVIEW_LENGTH])),
+                    default=F('last_message_preview'),
+                ),
+            )
+        cache.invalidate_chat(self.chat_id)
+
+    def delete(self, *args, **kwargs):
+        """Удаление сообщения сбрасывает кэш и обновляет статистику его чата."""
+        cache.invalidate_chat(self.chat_id)
+        newer = self._newer_messages()
+        deleted = super().delete(*args, **kwargs)
+        if not deleted[0]:
+            return deleted
+
+        # last_message_* ищутся заново по индексу, только если удалено
+        # последнее сообщение чата; иначе достаточно уменьшить счетчик
+        is_latest = ~Exists(newer)
+        latest = Message.objects.filter(chat=OuterRef('pk')).order_by('-created_at', '-id')
+        Chat.objects.db_manager(self._state.db).filter(id=self.chat_id).update(
+            message_count=F('message_count') - 1,
+            version=F('version') + 1,
+            last_message_at=Case(
+                When(is_latest, then=Subquery(latest.values('created_at')[:1])),
+                default=F('last_message_at'),
+            ),
+            last_message_preview=Case(
+                When(is_latest, then=Coalesce(
+                    Subquery(latest.values(preview=Left('text', PREVIEW_LENGTH))[:1]),
+                    Value(''),
+                )),
+                default=F('last_message_preview'),
+            ),
+        )
+        return deleted
+
+    def _newer_messages(self):
+        """Сообщения чата позже этого в порядке (created_at, id)."""
+        return Message.objects.filter(
+            Q(created_at__gt=self.created_at) | Q(created_at=self.created_at, id__gt=self.pk),
+            chat_id=self.chat_id,
+        )
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Состояние загрузки файла командой import_chats.
+
+    Обновляется в одной транзакции с каждой загруженной пачкой, поэтому
+    после прерывания загрузка продолжается ровно с первой незагруженной
+    строки файла.
+    """
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name="Имя загрузки"
+    )
+    offset = models.BigIntegerField(
+        default=0,
+        verbose_name="Смещение в файле (байт)"
+    )
+    line = models.BigIntegerField(
+        default=0,
+        verbose_name="Обработано строк"
+    )
+    chats = models.BigIntegerField(default=0, verbose_name="Загружено чатов")
+    messages = models.BigIntegerField(default=0, verbose_name="Загружено сообщений")
+    errors = models.BigIntegerField(default=0, verbose_name="Пропущено строк")
+    completed = models.BooleanField(default=False, verbose_name="Завершена")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        db_table = 'import_checkpoint'
+        verbose_name = 'Загрузка'
+        verbose_name_plural = 'Загрузки'
+
+    def __str__(self):
+        return f"{self.name} (строк: {self.line})"
+
+
+class ImportedChat(models.Model):
+    """Соответствие ключа чата в загружаемом файле созданному чату."""
+    checkpoint = models.ForeignKey(
+        ImportCheckpoint,
+        on_delete=models.CASCADE,
+        related_name='chat_keys'
+    )
+    key = models.CharField(max_length=255)
+    chat = models.ForeignKey(
+        Chat,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+
+    class Meta:
+        db_table = 'import_chat_key'
+        constraints = [
+            models.UniqueConstraint(fields=['checkpoint', 'key'], name='import_chat_key_unique'),
+        ]
@@ -0,0 +1,203 @@
+"""Курсорная (keyset) пагинация истории сообщений, списка чатов и результатов поиска."""
+import base64
+import math
+from datetime import datetime
+
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    """Некорректный курсор пагинации."""
+
+
+def _encode(key, pk):
+    raw = f"{key}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    key, pk = raw.rsplit('|', 1)
+    return key, int(pk)
+
+
+def encode_cursor(created_at, pk):
+    """Кодирует позицию (created_at, id) в непрозрачную строку."""
+    return _encode(created_at.isoformat(), pk)
+
+
+def decode_cursor(cursor):
+    """Декодирует курсор обратно в пару (created_at, id)."""
+    try:
+        created_at, pk = _decode(cursor)
+        created_at = datetime.fromisoformat(created_at)
+    except ValueError:
+        raise InvalidCursor("Некорректный курсор.")
+
+    if created_at.tzinfo is None:
+        raise InvalidCursor("Некорректный курсор.")
+
+    return created_at, pk
+
+
+def _keyset_before(key, value, pk):
+    """Условие "(key, id) < (value, pk)": строки до позиции курсора."""
+    return Q(**{f'{key}__lt': value}) | Q(**{key: value, 'id__lt': pk})
+
+
+def _keyset_after(key, value, pk):
+    """Условие "(key, id) > (value, pk)": строки после позиции курсора."""
+    return Q(**{f'{key}__gt': value}) | Q(**{key: value, 'id__gt': pk})
+
+
+def _messages_window(messages, limit, before=None, after=None):
+    """
+    QuerySet окна сообщений (limit + 1 строк) и функция, которая строит из
+    его строк результат paginate_messages.
+    """
+    if before and after:
+        raise InvalidCursor("Нельзя передавать before и after одновременно.")
+
+    if after:
+        created_at, pk = decode_cursor(after)
+        # Отдельное условие по created_at повторяет условие курсора, но по
+        # нему Postgres ограничивает просмотр индекса и отсекает секции
+        # таблицы сообщений (partitioning)
+        window = (
+            messages
+            .filter(_keyset_after('created_at', created_at, pk), created_at__gte=created_at)
+            .order_by('created_at', 'id')[:limit + 1]
+        )
+
+        def finish(page):
+            has_newer = len(page) > limit
+            page = page[:limit][::-1]
+
+            next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if page else None
+            prev_cursor = encode_cursor(page[0].created_at, page[0].id) if has_newer else None
+            return page, next_cursor, prev_cursor
+
+        return window, finish
+
+    if before:
+        created_at, pk = decode_cursor(before)
+        messages = messages.filter(
+            _keyset_before('created_at', created_at, pk),
+            created_at__lte=created_at,
+        )
+
+    def finish(page):
+        has_older = len(page) > limit
+        page = page[:limit]
+
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if has_older else None
+        prev_cursor = encode_cursor(page[0].created_at, page[0].id) if before and page else None
+        return page, next_cursor, prev_cursor
+
+    return messages.order_by('-created_at', '-id')[:limit + 1], finish
+
+
+def paginate_messages(messages, limit, before=None, after=None):
+    """
+    Возвращает страницу сообщений (от новых к старым) и курсоры соседних страниц.
+
+    before - курсор, сообщения строго старше которого нужно вернуть
+    after - курсор, сообщения строго новее которого нужно вернуть
+
+    Каждая страница - одно обращение к индексу message_chat_created_idx
+    без OFFSET: граница по created_at - условие индекса, сравнение id при
+    равном created_at проверяется на граничных строках.
+
+    Возвращает кортеж (page, next_cursor, prev_cursor), где next ведет
+    к более старым сообщениям, а prev - к более новым.
+    """
+    window, finish = _messages_window(messages, limit, before, after)
+    return finish(list(window))
+
+
+async def apaginate_messages(messages, limit, before=None, after=None):
+    """Асинхронный paginate_messages: страница читается через асинхронный ORM."""
+    window, finish = _messages_window(messages, limit, before, after)
+    return finish([message async for message in window])
+
+
+def _chats_window(chats, limit, key, cursor):
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        # Граница по key ограничивает просмотр индекса: OR условия курсора
+        # Postgres проверяет уже на найденных строках
+        chats = chats.filter(_keyset_before(key, value, pk), **{f'{key}__lte': value})
+
+    def finish(page):
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        next_cursor = encode_cursor(getattr(page[-1], key), page[-1].id) if has_more else None
+        return page, next_cursor
+
+    return chats.order_by(F(key).desc(), '-id')[:limit + 1], finish
+
+
+def paginate_chats(chats, limit, key='created_at', cursor=None):
+    """
+    Страница чатов по убыванию key (поле или аннотация с датой), при равенстве -
+    по убыванию id.
+
+    Пара (key, id) совпадает с выражением индекса (chat_created_idx или
+    chat_activity_idx), поэтому страница - одно обращение к индексу без
+    OFFSET и сортировки.
+
+    Возвращает кортеж (page, next_cursor).
+    """
+    window, finish = _chats_window(chats, limit, key, cursor)
+    return finish(list(window))
+
+
+async def apaginate_chats(chats, limit, key='created_at', cursor=None):
+    """Асинхронный paginate_chats."""
+    window, finish = _chats_window(chats, limit, key, cursor)
+    return finish([chat async for chat in window])
+
+
+def encode_rank_cursor(rank, pk):
+    """Кодирует позицию (rank, id) результата поиска в непрозрачную строку."""
+    # repr() float однозначно восстанавливается float()
+    return _encode(repr(rank), pk)
+
+
+def decode_rank_cursor(cursor):
+    """Декодирует курсор поиска обратно в пару (rank, id)."""
+    try:
+        rank, pk = _decode(cursor)
+        rank = float(rank)
+    except ValueError:
+        raise InvalidCursor("Некорректный курсор.")
+
+    if not math.isfinite(rank):
+        raise InvalidCursor("Некорректный курсор.")
+
+    return rank, pk
+
+
+def paginate_by_rank(messages, limit, cursor=None):
+    """
+    Страница результатов поиска от более релевантных к менее релевантным.
+
+    messages должен содержать аннотацию rank (MessageQuerySet.search).
+    Порядок (rank, id) по убыванию однозначен, поэтому курсор - последняя
+    позиция страницы, а следующая страница - строки строго после нее,
+    без OFFSET.
+
+    Возвращает кортеж (page, next_cursor).
+    """
+    if cursor:
+        rank, pk = decode_rank_cursor(cursor)
+        messages = messages.filter(_keyset_before('rank', rank, pk))
+
+    page = list(messages.order_by('-rank', '-id')[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    next_cursor = encode_rank_cursor(page[-1].rank, page[-1].id) if has_more else None
+    return page, next_cursor
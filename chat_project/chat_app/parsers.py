@@ -0,0 +1,54 @@
+import json
+
+import msgpack
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Парсер NDJSON (application/x-ndjson): один JSON-документ на строку.
+
+    Тело читается из потока построчно, пустые строки пропускаются.
+    Результат - список разобранных документов. Если в parser_context
+    передан max_items, чтение прекращается на первом документе сверх него
+    (ParseError), не дочитывая тело.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        max_items = parser_context.get('max_items')
+
+        items = []
+        if stream is None:
+            return items
+
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if max_items is not None and len(items) >= max_items:
+                raise ParseError(f"Можно загрузить не более {max_items} сообщений за запрос")
+            try:
+                items.append(json.loads(line.decode(encoding)))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error (строка {line_number}) - {exc}")
+
+        return items
+
+
+class MessagePackParser(BaseParser):
+    """Парсер MessagePack (application/msgpack): один документ в теле запроса."""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return None
+
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
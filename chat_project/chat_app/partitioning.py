@@ -0,0 +1,335 @@
+"""
+Декларативное секционирование таблицы сообщений PostgreSQL (команда
+partition_messages; откат миграции 0008_message_partitioning возвращает
+обычную таблицу).
+
+Схемы:
+- month - RANGE по created_at, секция на календарный месяц UTC
+  (message_p2026_10). Секции создаются заранее (ensure_partitions), старые
+  отсоединяются или удаляются целиком (detach_partitions_before) вместо
+  DELETE с последующим VACUUM;
+- hash - HASH по chat_id на MESSAGE_HASH_PARTITIONS секций (message_h0,
+  message_h1, ...). Все запросы сообщений одного чата читают одну секцию.
+
+Запросы GET /chats/{id}/ остаются в пределах нужных секций:
+- hash - условие chat_id = ... отсекает все секции, кроме одной;
+- month - первая страница читается упорядоченным Append от новых секций к
+  старым и останавливается, набрав limit строк; страницы с курсором
+  дополнительно ограничены по created_at, и лишние секции отсекаются еще
+  при планировании (см. pagination._messages_window).
+
+Секции по умолчанию (DEFAULT) у схемы month нет: она не позволила бы
+упорядоченный Append. Поэтому секции должны существовать заранее:
+ensure_partitions вызывается после migrate, командой partition_messages
+(по расписанию) и загрузкой import_chats для месяцев загружаемых сообщений.
+Если секции текущего месяца все же нет (команда не запускалась, секция
+отсоединена), отправка сообщений через API создает ее сама
+(insert_with_partition).
+
+Первичный ключ секционированной таблицы включает ключ секционирования:
+(id, created_at) или (id, chat_id). id по-прежнему уникален - значения
+выдает одна identity-последовательность таблицы.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import cache, db
+from .models import Chat, Message
+from .querybudget import unbudgeted
+
+logger = logging.getLogger(__name__)
+
+SCHEMES = ('month', 'hash')
+
+TABLE = Message._meta.db_table
+
+# pg_partitioned_table.partstrat -> схема
+_STRATEGIES = {'r': 'month', 'h': 'hash'}
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def month_start(value):
+    """Первое число месяца значения (date или datetime, в UTC)."""
+    if isinstance(value, datetime.datetime):
+        value = value.astimezone(datetime.timezone.utc)
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """Первое число месяца через count месяцев (count может быть отрицательным)."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def month_partition_name(month):
+    return f"{TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def current_scheme():
+    """Схема секционирования таблицы сообщений: month, hash или None."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT partstrat FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [TABLE],
+        )
+        row = cursor.fetchone()
+    return _STRATEGIES.get(row[0]) if row else None
+
+
+def partitions():
+    """Секции таблицы: [(имя, граница, примерное число строк)] по имени."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint "
+            "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s) "
+            "ORDER BY child.relname",
+            [TABLE],
+        )
+        return [(name, bound, max(rows, 0)) for name, bound, rows in cursor.fetchall()]
+
+
+def _month_partitions():
+    """Секции схемы month: {первое число месяца: имя}."""
+    result = {}
+    for name, bound, rows in partitions():
+        prefix = f"{TABLE}_p"
+        if name.startswith(prefix):
+            # message_p2026_10 или message_p2026_10_1 (см. _new_partition_name)
+            year, month = name[len(prefix):].split('_')[:2]
+            result[datetime.date(int(year), int(month), 1)] = name
+    return result
+
+
+def _new_partition_name(cursor, month):
+    """
+    Имя новой секции месяца. Если имя занято отсоединенной раньше секцией
+    этого месяца, к нему добавляется номер: message_p2026_10_1.
+    """
+    base = month_partition_name(month)
+    name, number = base, 0
+    while True:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            return name
+        number += 1
+        name = f"{base}_{number}"
+
+
+def _create_month_partition(cursor, month):
+    start = datetime.datetime.combine(month, datetime.time(), datetime.timezone.utc)
+    end = datetime.datetime.combine(add_months(month, 1), datetime.time(), datetime.timezone.utc)
+    name = _new_partition_name(cursor, month)
+    cursor.execute(
+        f"CREATE TABLE {_qn(name)} PARTITION OF {_qn(TABLE)} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    return name
+
+
+def _rebuild(partition_by, primary_key, create_partitions):
+    """
+    Пересоздает таблицу сообщений с тем же содержимым, индексами и внешними
+    ключами: новая таблица (секционированная по partition_by или обычная),
+    копирование строк, удаление старой. Выполняется в одной транзакции под
+    ACCESS EXCLUSIVE блокировкой: чтение и запись сообщений ждут окончания.
+    """
+    old = f"{TABLE}_rebuild"
+
+    with transaction.atomic():
+        # Отложенные проверки внешних ключей не дают удалить таблицу
+        connection.check_constraints()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {_qn(TABLE)} IN ACCESS EXCLUSIVE MODE")
+            cursor.execute(
+                "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+                "WHERE indrelid = to_regclass(%s) AND NOT indisprimary ORDER BY indexrelid",
+                [TABLE],
+            )
+            # Индексы секционированной таблицы описываются как ON ONLY
+            indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+                [TABLE],
+            )
+            foreign_keys = cursor.fetchall()
+
+            cursor.execute(f"ALTER TABLE {_qn(TABLE)} RENAME TO {_qn(old)}")
+            cursor.execute(f"CREATE TABLE {_qn(TABLE)} (LIKE {_qn(old)} INCLUDING DEFAULTS) {partition_by}")
+            create_partitions(cursor, old)
+
+            cursor.execute(f"INSERT INTO {_qn(TABLE)} SELECT * FROM {_qn(old)}")
+            cursor.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {_qn(old)}")
+            next_id = cursor.fetchone()[0]
+            # Вместе со старой таблицей удаляются ее секции, индексы и последовательность
+            cursor.execute(f"DROP TABLE {_qn(old)}")
+
+            cursor.execute(
+                f"ALTER TABLE {_qn(TABLE)} ALTER COLUMN id "
+                f"ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(next_id)})"
+            )
+            cursor.execute(
+                f"ALTER TABLE {_qn(TABLE)} ADD CONSTRAINT {_qn(TABLE + '_pkey')} "
+                f"PRIMARY KEY ({', '.join(_qn(column) for column in primary_key)})"
+            )
+            for definition in indexes:
+                cursor.execute(definition)
+            for name, definition in foreign_keys:
+                cursor.execute(f"ALTER TABLE {_qn(TABLE)} ADD CONSTRAINT {_qn(name)} {definition}")
+            cursor.execute(f"ANALYZE {_qn(TABLE)}")
+
+
+def convert(scheme, hash_partitions=None, months_ahead=None):
+    """
+    Превращает обычную таблицу сообщений в секционированную по схеме
+    scheme. Для month создаются секции всех месяцев с сообщениями и
+    months_ahead следующих месяцев.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"Неизвестная схема секционирования: {scheme}")
+    if current_scheme() is not None:
+        raise ValueError("Таблица сообщений уже секционирована")
+
+    if scheme == 'hash':
+        hash_partitions = hash_partitions or settings.MESSAGE_HASH_PARTITIONS
+
+        def create_partitions(cursor, old):
+            for remainder in range(hash_partitions):
+                cursor.execute(
+                    f"CREATE TABLE {_qn(f'{TABLE}_h{remainder}')} PARTITION OF {_qn(TABLE)} "
+                    f"FOR VALUES WITH (MODULUS {int(hash_partitions)}, REMAINDER {remainder})"
+                )
+
+        _rebuild('PARTITION BY HASH (chat_id)', ('id', 'chat_id'), create_partitions)
+
+    else:
+        if months_ahead is None:
+            months_ahead = settings.MESSAGE_PARTITION_MONTHS_AHEAD
+
+        def create_partitions(cursor, old):
+            cursor.execute(f"SELECT min(created_at), max(created_at) FROM {_qn(old)}")
+            first, last = cursor.fetchone()
+            current = month_start(datetime.datetime.now(datetime.timezone.utc))
+            month = min(month_start(first), current) if first else current
+            last = add_months(max(month_start(last), current) if last else current, months_ahead)
+            while month <= last:
+                _create_month_partition(cursor, month)
+                month = add_months(month, 1)
+
+        _rebuild('PARTITION BY RANGE (created_at)', ('id', 'created_at'), create_partitions)
+
+    logger.info("Таблица сообщений секционирована по схеме %s", scheme)
+
+
+def unpartition():
+    """Возвращает секционированную таблицу сообщений в обычную."""
+    if current_scheme() is None:
+        raise ValueError("Таблица сообщений не секционирована")
+
+    _rebuild('', ('id',), lambda cursor, old: None)
+    logger.info("Секционирование таблицы сообщений отменено")
+
+
+def ensure_partitions(months_ahead=None, months=()):
+    """
+    Создает недостающие секции схемы month: текущий месяц, months_ahead
+    следующих и месяцы months (даты или datetime). Для других схем ничего
+    не делает. Возвращает имена созданных секций.
+    """
+    if current_scheme() != 'month':
+        return []
+    if months_ahead is None:
+        months_ahead = settings.MESSAGE_PARTITION_MONTHS_AHEAD
+
+    current = month_start(datetime.datetime.now(datetime.timezone.utc))
+    wanted = {add_months(current, count) for count in range(months_ahead + 1)}
+    wanted.update(month_start(month) for month in months)
+
+    existing = _month_partitions()
+    missing = sorted(wanted - existing.keys())
+    if not missing:
+        return []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        names = [_create_month_partition(cursor, month) for month in missing]
+
+    logger.info("Созданы секции сообщений: %s", ', '.join(names))
+    return names
+
+
+def insert_with_partition(insert):
+    """
+    Выполняет insert() - вставку сообщений с текущим временем - и
+    возвращает ее результат. Если у схемы month нет секции текущего месяца,
+    секция создается, и вставка повторяется один раз.
+
+    Повтор возможен только вне транзакции (представления API работают в
+    autocommit): внутри транзакции ошибка вставки прерывает ее, а точка
+    сохранения на каждую вставку - два лишних запроса.
+    """
+    if connection.in_atomic_block:
+        return insert()
+
+    try:
+        return insert()
+    except IntegrityError as e:
+        if db.sqlstate(e) != db.CHECK_VIOLATION:
+            raise
+
+    # Создание секций и повторная вставка - редкий случай, их нет в бюджете
+    # представления. Для других схем и прочих нарушений CHECK ошибка повторится
+    with unbudgeted():
+        if ensure_partitions(months={timezone.now()}):
+            logger.warning("Нет секции сообщений текущего месяца: секция создана при вставке")
+        return insert()
+
+
+def detach_partitions_before(month, drop=False):
+    """
+    Отсоединяет секции схемы month целиком старше месяца month (date).
+    Отсоединенная секция остается отдельной таблицей с тем же именем (для
+    архивации), с drop=True удаляется. Статистика сообщений затронутых
+    чатов пересчитывается. Возвращает имена секций.
+    """
+    if current_scheme() != 'month':
+        raise ValueError("Старые секции отсоединяются только у схемы month")
+
+    month = month_start(month)
+    old = [name for start, name in sorted(_month_partitions().items()) if start < month]
+    if not old:
+        return []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        chat_ids = set()
+        for name in old:
+            cursor.execute(f"SELECT DISTINCT chat_id FROM {_qn(name)}")
+            chat_ids.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f"ALTER TABLE {_qn(TABLE)} DETACH PARTITION {_qn(name)}")
+            if drop:
+                cursor.execute(f"DROP TABLE {_qn(name)}")
+
+        if chat_ids:
+            Chat.objects.filter(id__in=chat_ids).refresh_message_stats()
+            for chat_id in chat_ids:
+                cache.invalidate_chat(chat_id)
+
+    logger.info(
+        "%s секции сообщений: %s (чатов затронуто: %s)",
+        "Удалены" if drop else "Отсоединены", ', '.join(old), len(chat_ids)
+    )
+    return old
+
+
+def ensure_partitions_after_migrate(sender, using, **kwargs):
+    """Обработчик post_migrate: секции на MESSAGE_PARTITION_MONTHS_AHEAD месяцев вперед."""
+    if using == 'default':
+        ensure_partitions()
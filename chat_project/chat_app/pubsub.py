@@ -0,0 +1,306 @@
+"""
+Pub/sub для доставки новых сообщений подписчикам в реальном времени.
+
+Бэкенд задается настройкой CHAT_PUBSUB_BACKEND (путь к классу). В одном
+процессе по умолчанию используется InMemoryBackend - доставка внутри процесса,
+при нескольких процессах (WEB_CONCURRENCY > 1) - PostgresBackend поверх
+LISTEN/NOTIFY, который доставляет события подписчикам всех воркеров.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+import psycopg
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+from . import db
+from .models import Message
+from .serializers import MessageSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Подписка на события одного чата.
+
+    Создается внутри event loop подписчика. Публикация может идти из любого
+    потока: события передаются в очередь через call_soon_threadsafe.
+    """
+
+    def __init__(self, backend, chat_id, maxsize):
+        self.backend = backend
+        self.chat_id = chat_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        # Подписчик не успевал забирать события и часть из них потеряна
+        self.overflowed = False
+
+    def put(self, payload):
+        """Кладет событие в очередь (вызывается из event loop подписчика)."""
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """Ждет следующее событие. При истечении timeout бросает TimeoutError."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def resync(self):
+        """
+        Помечает подписку потерявшей события и будит ожидающего подписчика
+        (вызывается из event loop подписчика).
+        """
+        self.overflowed = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    def close(self):
+        """Отписывается от событий чата."""
+        self.backend.unsubscribe(self)
+
+
+class BaseBackend:
+    """Интерфейс бэкенда pub/sub."""
+
+    def subscribe(self, chat_id):
+        """Возвращает Subscription на события чата."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        """Удаляет подписку."""
+        raise NotImplementedError
+
+    def publish(self, chat_id, payload):
+        """Рассылает событие всем подписчикам чата."""
+        raise NotImplementedError
+
+    def has_subscribers(self, chat_id):
+        """Есть ли у чата подписчики (бэкенд может не знать и вернуть True)."""
+        return True
+
+    def close(self):
+        """Освобождает ресурсы бэкенда (соединения, потоки)."""
+
+
+class InMemoryBackend(BaseBackend):
+    """Доставка событий подписчикам внутри текущего процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, chat_id):
+        subscription = Subscription(self, chat_id, settings.CHAT_PUBSUB_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.setdefault(chat_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.chat_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.chat_id]
+
+    def publish(self, chat_id, payload):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(chat_id, ()))
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, payload)
+            except RuntimeError:
+                # Event loop подписчика уже закрыт
+                self.unsubscribe(subscription)
+
+    def has_subscribers(self, chat_id):
+        return chat_id in self._subscriptions
+
+    def resync_all(self):
+        """Сообщает всем подписчикам процесса, что часть событий потеряна."""
+        with self._lock:
+            subscriptions = [s for chat in self._subscriptions.values() for s in chat]
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.resync)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+
+class PostgresBackend(InMemoryBackend):
+    """
+    Доставка событий между процессами через LISTEN/NOTIFY PostgreSQL.
+
+    publish отправляет NOTIFY в канал CHANNEL через отдельное соединение в
+    режиме autocommit, поэтому не попадает в транзакции и бюджеты запросов.
+    Поток-слушатель процесса (запускается при первой подписке) держит свое
+    соединение с LISTEN и раздает полученные события подписчикам процесса,
+    как InMemoryBackend. Событие больше PAYLOAD_LIMIT байт (предел NOTIFY -
+    8000) передается только id сообщения, слушатель читает его из БД.
+
+    При разрыве соединения слушатель переподключается, а подписчики
+    получают resync: поток событий закрывается, и клиент продолжает с
+    Last-Event-ID без потерь.
+    """
+
+    CHANNEL = 'chat_messages'
+    PAYLOAD_LIMIT = 7900
+    # Как часто слушатель проверяет остановку (секунды)
+    POLL_INTERVAL = 1.0
+    MAX_RECONNECT_DELAY = 30.0
+
+    def __init__(self, alias=DEFAULT_DB_ALIAS):
+        super().__init__()
+        self._alias = alias
+        self._publish_lock = threading.Lock()
+        self._publish_connection = None
+        self._listener = None
+        self._listening = threading.Event()
+        self._stopped = threading.Event()
+
+    def _connect(self):
+        params = connections[self._alias].get_connection_params()
+        return psycopg.connect(**params, autocommit=True)
+
+    def subscribe(self, chat_id):
+        subscription = super().subscribe(chat_id)
+        self._start_listener()
+        return subscription
+
+    def has_subscribers(self, chat_id):
+        # Подписчики могут быть в других процессах
+        return True
+
+    def publish(self, chat_id, payload):
+        message = json.dumps({'chat': chat_id, 'message': payload}, ensure_ascii=False)
+        if len(message.encode()) > self.PAYLOAD_LIMIT:
+            message = json.dumps({'chat': chat_id, 'id': payload['id']})
+
+        with self._publish_lock:
+            # Соединение могло оборваться с прошлой публикации: одна повторная попытка
+            for attempt in range(2):
+                try:
+                    if self._publish_connection is None or self._publish_connection.closed:
+                        self._publish_connection = self._connect()
+                    self._publish_connection.execute(
+                        "SELECT pg_notify(%s, %s)", [self.CHANNEL, message]
+                    )
+                    return
+                except psycopg.OperationalError:
+                    self._close_publish_connection()
+                    if attempt:
+                        # Сообщение уже сохранено: ошибка доставки не ломает запрос
+                        logger.exception("Не удалось опубликовать событие чата %s", chat_id)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is not None or self._stopped.is_set():
+                return
+            self._listener = threading.Thread(
+                target=self._listen, name='chat-pubsub-listener', daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self):
+        delay = 1.0
+        reconnect = False
+        while not self._stopped.is_set():
+            try:
+                with self._connect() as conn:
+                    conn.execute(f"LISTEN {self.CHANNEL}")
+                    if reconnect:
+                        # Пока слушателя не было, события могли потеряться
+                        self.resync_all()
+                    delay = 1.0
+                    self._listening.set()
+                    while not self._stopped.is_set():
+                        for notify in conn.notifies(timeout=self.POLL_INTERVAL):
+                            try:
+                                self._dispatch(notify.payload)
+                            except Exception:
+                                logger.exception("Не удалось доставить событие pub/sub: %s", notify.payload)
+            except psycopg.Error:
+                reconnect = True
+                self._listening.clear()
+                if self._stopped.is_set():
+                    break
+                logger.exception("Слушатель pub/sub потерял соединение, повтор через %.0f с", delay)
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+        self._listening.clear()
+
+    def _dispatch(self, raw):
+        event = json.loads(raw)
+        chat_id = event['chat']
+        if not super().has_subscribers(chat_id):
+            return
+
+        payload = event.get('message')
+        if payload is None:
+            try:
+                payload = MessageSerializer(Message.objects.get(id=event['id'])).data
+            except Message.DoesNotExist:
+                return
+            finally:
+                db.release_connection(self._alias)
+        super().publish(chat_id, payload)
+
+    def wait_listening(self, timeout=None):
+        """Ждет, пока слушатель выполнит LISTEN. True, если дождался."""
+        return self._listening.wait(timeout)
+
+    def _close_publish_connection(self):
+        if self._publish_connection is not None:
+            self._publish_connection.close()
+            self._publish_connection = None
+
+    def close(self):
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.join()
+        with self._publish_lock:
+            self._close_publish_connection()
+
+
+_backend = None
+_backend_path = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Возвращает экземпляр бэкенда из настройки CHAT_PUBSUB_BACKEND."""
+    global _backend, _backend_path
+
+    path = settings.CHAT_PUBSUB_BACKEND
+    with _backend_lock:
+        if _backend is None or _backend_path != path:
+            if _backend is not None:
+                _backend.close()
+            _backend = import_string(path)()
+            _backend_path = path
+        return _backend
+
+
+def publish_messages(chat_id, messages):
+    """
+    Рассылает новые сообщения подписчикам чата.
+
+    Сообщения сериализуются MessageSerializer только если у чата есть
+    подписчики, поэтому без подписчиков публикация почти бесплатна.
+    """
+    backend = get_backend()
+    if not backend.has_subscribers(chat_id):
+        return
+
+    for payload in MessageSerializer(messages, many=True).data:
+        backend.publish(chat_id, payload)
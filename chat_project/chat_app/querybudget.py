@@ -0,0 +1,231 @@
+"""
+Бюджет SQL-запросов: максимальное количество запросов на вызов представления.
+
+    @query_budget(1)
+    def post(self, request, id):
+        ...
+
+Бюджет проверяется в режиме QUERY_BUDGET_MODE:
+- off - запросы не отслеживаются;
+- log - превышение записывается в лог с отчетом;
+- raise - превышение вызывает QueryBudgetExceeded (тесты).
+
+Отчет о превышении содержит все запросы вызова с местом в коде проекта, из
+которого они выполнены, и повторяющиеся запросы (одинаковый SQL с разными
+параметрами - признак N+1). Повторы от QUERY_BUDGET_DUPLICATE_THRESHOLD раз
+записываются в лог, даже если бюджет не превышен. Запросы, повторяющиеся по
+замыслу (пачки bulk_create), исключаются из этой проверки параметром repeats
+- началами их SQL.
+
+Тот же объект - контекстный менеджер для тестов:
+
+    with query_budget(2):
+        self.client.get(url)
+
+Запросы считаются execute wrapper'ом в состоянии текущего вызова
+(contextvar), поэтому учитываются и запросы из sync_to_async. SAVEPOINT и
+RELEASE SAVEPOINT не считаются: в тестах их добавляет транзакция TestCase.
+Запросы, количество которых по замыслу зависит от объема данных (например,
+удаление пачками), выполняются внутри unbudgeted().
+"""
+import contextvars
+import functools
+import logging
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Мест в коде проекта на запрос в отчете (от ближайшего к запросу)
+STACK_DEPTH = 3
+# Сколько кадров стека просматривается в поисках этих мест
+MAX_STACK_WALK = 100
+
+_active = contextvars.ContextVar('chat_query_budgets', default=())
+
+_SKIPPED_PREFIXES = ('SAVEPOINT ', 'RELEASE SAVEPOINT ', 'ROLLBACK TO SAVEPOINT ')
+_THIS_FILE = os.path.abspath(__file__)
+_project_code = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Вызов выполнил больше SQL-запросов, чем разрешает бюджет."""
+
+
+def _is_project_code(code):
+    """Код проекта (без Django, библиотек и execute wrapper'ов); результат кэшируется."""
+    try:
+        return _project_code[code]
+    except KeyError:
+        filename = code.co_filename
+        result = _project_code[code] = (
+            filename.startswith(str(settings.BASE_DIR))
+            and 'site-packages' not in filename
+            # Execute wrapper'ы (этот модуль, метрики) - не место вызова
+            and filename != _THIS_FILE
+            and code.co_name != '_db_wrapper'
+        )
+        return result
+
+
+def _location():
+    """
+    Места в коде проекта, откуда выполнен запрос: до STACK_DEPTH ближайших
+    к запросу кадров. Выполняется на каждом запросе, поэтому стек обходится
+    по f_back до первых STACK_DEPTH мест (не дальше MAX_STACK_WALK кадров)
+    без traceback.extract_stack(), а строки собираются только для отчета.
+    """
+    location = []
+    frame = sys._getframe(1)
+    for _ in range(MAX_STACK_WALK):
+        if frame is None or len(location) == STACK_DEPTH:
+            break
+        if _is_project_code(frame.f_code):
+            location.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    location.reverse()
+    return location
+
+
+def _format_location(location):
+    base = str(settings.BASE_DIR)
+    return [f"{os.path.relpath(code.co_filename, base)}:{lineno} in {code.co_name}" for code, lineno in location]
+
+
+class QueryBudget:
+    """
+    Бюджет запросов одного вызова. max_queries - число или функция без
+    аргументов (для бюджетов, зависящих от настроек). repeats - начала SQL
+    запросов, которые повторяются по замыслу и не считаются N+1.
+    """
+
+    def __init__(self, max_queries, name=None, mode=None, repeats=()):
+        self.max_queries = max_queries
+        self.name = name
+        self.mode = mode
+        self.repeats = tuple(repeats)
+        self.queries = []
+        self._token = None
+
+    @property
+    def limit(self):
+        return self.max_queries() if callable(self.max_queries) else self.max_queries
+
+    def __call__(self, func):
+        """Декоратор: новый бюджет на каждый вызов func (синхронной или async)."""
+        name = self.name or func.__qualname__
+
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with QueryBudget(self.max_queries, name, self.mode, self.repeats):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with QueryBudget(self.max_queries, name, self.mode, self.repeats):
+                    return func(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        self.mode = self.mode or settings.QUERY_BUDGET_MODE
+        if self.mode != 'off':
+            self.queries = []
+            self._token = _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is None:
+            return
+        _active.reset(self._token)
+        self._token = None
+        # Отчет об ошибке внутри вызова только помешал бы ее увидеть
+        if exc_type is None:
+            self.check()
+
+    def record(self, sql):
+        self.queries.append((sql, _location()))
+
+    def duplicates(self):
+        """Повторяющиеся запросы: [(SQL, количество, место первого вызова)] по убыванию количества."""
+        counts = Counter(sql for sql, location in self.queries if not sql.startswith(self.repeats))
+        first = {}
+        for sql, location in self.queries:
+            first.setdefault(sql, location)
+        return [
+            (sql, count, _format_location(first[sql]))
+            for sql, count in counts.most_common() if count > 1
+        ]
+
+    def report(self):
+        """Текстовый отчет: все запросы и повторы с местами в коде."""
+        lines = [f"{self.name or 'query_budget'}: {len(self.queries)} запросов при бюджете {self.limit}"]
+        for number, (sql, location) in enumerate(self.queries, 1):
+            lines.append(f"  {number}. {sql[:300]}")
+            lines.extend(f"       {frame}" for frame in _format_location(location))
+
+        duplicates = self.duplicates()
+        if duplicates:
+            lines.append("Повторяющиеся запросы (возможно, N+1):")
+            for sql, count, location in duplicates:
+                lines.append(f"  {count} x {sql[:300]}")
+                lines.extend(f"       {frame}" for frame in location)
+        return '\n'.join(lines)
+
+    def check(self):
+        if len(self.queries) > self.limit:
+            if self.mode == 'raise':
+                raise QueryBudgetExceeded(self.report())
+            logger.warning("Превышен бюджет запросов\n%s", self.report())
+            return
+
+        threshold = settings.QUERY_BUDGET_DUPLICATE_THRESHOLD
+        repeated = [item for item in self.duplicates() if item[1] >= threshold]
+        if repeated:
+            logger.warning(
+                "%s: повторяющиеся запросы\n%s",
+                self.name or 'query_budget',
+                '\n'.join(f"  {count} x {sql[:300]} ({', '.join(location)})" for sql, count, location in repeated)
+            )
+
+
+def query_budget(max_queries, name=None, mode=None, repeats=()):
+    """
+    Бюджет запросов: декоратор представления (метода) или контекстный
+    менеджер. mode по умолчанию берется из QUERY_BUDGET_MODE.
+    """
+    return QueryBudget(max_queries, name, mode, repeats)
+
+
+@contextmanager
+def unbudgeted():
+    """Запросы внутри блока не входят ни в один активный бюджет."""
+    token = _active.set(())
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    budgets = _active.get()
+    if budgets and not sql.startswith(_SKIPPED_PREFIXES):
+        for budget in budgets:
+            budget.record(sql)
+    return execute(sql, params, many, context)
+
+
+def _install_db_wrapper(sender, connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def install_db_instrumentation():
+    """Подключает учет бюджетов ко всем новым соединениям с БД."""
+    connection_created.connect(_install_db_wrapper, dispatch_uid='chat_app.querybudget')
@@ -0,0 +1,31 @@
+import msgpack
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import metrics
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer, время работы которого учитывается в метриках как этап render."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Ответ в формате MessagePack (application/msgpack): те же данные, что и
+    в JSON, в компактном двоичном виде. Даты, Decimal, UUID и прочие типы
+    приводятся так же, как в JSONRenderer.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with metrics.timed('render'):
+            return msgpack.packb(data, default=JSONEncoder().default)
@@ -0,0 +1,191 @@
+"""
+Срок хранения сообщений: удаление устаревших сообщений командой
+purge_messages (по расписанию или постоянно работающим процессом --loop).
+
+Политика чата - максимальный возраст сообщений в днях и максимальное
+количество сообщений: поля Chat.retention_days и retention_max_messages, а
+если они пусты - MESSAGE_RETENTION_DAYS и MESSAGE_RETENTION_MAX_MESSAGES
+(0 - без ограничения). Обе границы сводятся к одной: удаляются сообщения,
+которые в порядке (created_at, id) раньше более поздней из них.
+
+Сообщения удаляются пачками по MESSAGE_PURGE_BATCH_SIZE самых старых
+сообщений чата по индексу message_chat_created_idx; каждая пачка - один
+запрос в своей короткой транзакции с lock_timeout, между пачками - пауза
+MESSAGE_PURGE_PAUSE. Отправка сообщений удалению не мешает: новые
+сообщения не попадают в удаляемый диапазон, а строка чата блокируется
+только на время одного запроса. Чат, пачка которого не дождалась
+блокировки, откладывается до следующего прохода.
+
+При секционировании по месяцам старые месяцы целиком дешевле отсоединять
+командой partition_messages --detach-older-than.
+"""
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import cache
+from .models import Chat, Message
+from .querybudget import unbudgeted
+
+logger = logging.getLogger(__name__)
+
+# Чатов в одной выборке при обходе
+CHAT_CHUNK_SIZE = 1000
+
+# SQLSTATE lock_not_available: истек lock_timeout
+_LOCK_NOT_AVAILABLE = '55P03'
+
+
+class PurgeStats:
+    """Итоги прохода purge_messages."""
+
+    def __init__(self):
+        self.messages = 0
+        self.chats = 0
+        self.batches = 0
+        # Чаты, отложенные до следующего прохода из-за блокировок
+        self.skipped = 0
+        self.elapsed = 0.0
+
+
+def chat_policy(retention_days, retention_max_messages):
+    """Действующая политика чата: (дней, сообщений), 0 - без ограничения."""
+    if retention_days is None:
+        retention_days = settings.MESSAGE_RETENTION_DAYS
+    if retention_max_messages is None:
+        retention_max_messages = settings.MESSAGE_RETENTION_MAX_MESSAGES
+    return retention_days, retention_max_messages
+
+
+def _policy_filter():
+    """Чаты, в которых по политике и message_count может быть что удалять."""
+    by_age = Q(retention_days__gt=0)
+    if settings.MESSAGE_RETENTION_DAYS:
+        by_age |= Q(retention_days__isnull=True)
+
+    by_count = Q(retention_max_messages__gt=0, message_count__gt=F('retention_max_messages'))
+    if settings.MESSAGE_RETENTION_MAX_MESSAGES:
+        by_count |= Q(
+            retention_max_messages__isnull=True,
+            message_count__gt=settings.MESSAGE_RETENTION_MAX_MESSAGES,
+        )
+
+    return Q(message_count__gt=0) & (by_age | by_count)
+
+
+def purge_bound(chat_id, days, max_messages, message_count, now):
+    """
+    Граница удаления для политики (days, max_messages): (created_at, id),
+    удаляются сообщения раньше нее. None, если удалять нечего.
+    """
+    bounds = []
+    if days:
+        # id сообщений положительны: удаляется все, что старше now - days
+        bounds.append((now - datetime.timedelta(days=days), 0))
+
+    if max_messages and message_count > max_messages:
+        # Самое старое из max_messages последних сообщений остается
+        oldest_kept = list(
+            Message.objects
+            .filter(chat_id=chat_id)
+            .order_by('-created_at', '-id')
+            .values_list('created_at', 'id')[max_messages - 1:max_messages]
+        )
+        if oldest_kept:
+            bounds.append(oldest_kept[0])
+
+    return max(bounds) if bounds else None
+
+
+def _purge_batch(chat_id, bound, batch_size):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('lock_timeout', %s, true)",
+            [f"{settings.MESSAGE_PURGE_LOCK_TIMEOUT}ms"],
+        )
+        return Message.objects.purge_batch_for_chat(chat_id, bound, batch_size)
+
+
+def purge_chat(chat_id, bound, batch_size, pause, stats):
+    """
+    Удаляет сообщения чата раньше bound пачками по batch_size с паузой
+    pause секунд после каждой непустой пачки. Итоги добавляются в stats.
+    Возвращает количество удаленных сообщений.
+    """
+    total = 0
+    try:
+        while True:
+            deleted = _purge_batch(chat_id, bound, batch_size)
+            stats.batches += 1
+            total += deleted
+            if deleted and pause:
+                time.sleep(pause)
+            if deleted < batch_size:
+                break
+    except OperationalError as e:
+        if getattr(e.__cause__, 'sqlstate', None) != _LOCK_NOT_AVAILABLE:
+            raise
+        stats.skipped += 1
+        logger.warning(
+            "Удаление сообщений чата %s отложено: блокировка не получена за %s мс",
+            chat_id, settings.MESSAGE_PURGE_LOCK_TIMEOUT
+        )
+    finally:
+        if total:
+            stats.messages += total
+            stats.chats += 1
+            cache.invalidate_chat(chat_id)
+    return total
+
+
+def purge_messages(chat_ids=None, batch_size=None, pause=None, now=None, progress=None):
+    """
+    Один проход: удаляет устаревшие сообщения всех чатов (или только
+    chat_ids) по их политикам. progress(stats) вызывается после каждой
+    выборки из CHAT_CHUNK_SIZE чатов. Возвращает PurgeStats.
+    """
+    batch_size = batch_size or settings.MESSAGE_PURGE_BATCH_SIZE
+    if pause is None:
+        pause = settings.MESSAGE_PURGE_PAUSE
+    now = now or timezone.now()
+
+    chats = Chat.objects.alive().filter(_policy_filter()).order_by('id')
+    if chat_ids is not None:
+        chats = chats.filter(id__in=chat_ids)
+
+    stats = PurgeStats()
+    started = time.monotonic()
+    last_id = 0
+
+    # Количество запросов зависит от числа чатов и сообщений
+    with unbudgeted():
+        while True:
+            chunk = list(
+                chats
+                .filter(id__gt=last_id)
+                .values_list('id', 'retention_days', 'retention_max_messages', 'message_count')[:CHAT_CHUNK_SIZE]
+            )
+            if not chunk:
+                break
+
+            for chat_id, retention_days, retention_max_messages, message_count in chunk:
+                days, max_messages = chat_policy(retention_days, retention_max_messages)
+                bound = purge_bound(chat_id, days, max_messages, message_count, now)
+                if bound is not None:
+                    purge_chat(chat_id, bound, batch_size, pause, stats)
+
+            last_id = chunk[-1][0]
+            if progress:
+                progress(stats)
+
+    stats.elapsed = time.monotonic() - started
+    logger.info(
+        "Удалено устаревших сообщений: %s в %s чатах за %.2f с (пачек: %s, отложено чатов: %s)",
+        stats.messages, stats.chats, stats.elapsed, stats.batches, stats.skipped
+    )
+    return stats
@@ -17,6 +17,18 @@ class ChatSerializer(serializers.ModelSerializer):
         return value
 
 
+class ChatListSerializer(serializers.ModelSerializer):
+    """Сериализатор чата в списке: статистика сообщений без самих сообщений."""
+
+    class Meta:
+        model = Chat
+        fields = [
+            'id', 'title', 'created_at',
+            'message_count', 'last_message_at', 'last_message_preview',
+        ]
+        read_only_fields = fields
+
+
 class MessageSerializer(serializers.ModelSerializer):
     """Сериализатор для сообщения."""
 
@@ -32,6 +44,25 @@ class MessageSerializer(serializers.ModelSerializer):
         return value
 
 
+class MessageSearchResultSerializer(MessageSerializer):
+    """Сообщение в результатах поиска с оценкой релевантности."""
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ['rank']
+        read_only_fields = MessageSerializer.Meta.read_only_fields + ['rank']
+
+
+class MessageCreateSerializer(serializers.Serializer):
+    """
+    Сериализатор входных данных для отправки сообщения.
+
+    Проверяет только текст (те же правила, что и Message.clean) и не
+    обращается к БД: чат проверяется при вставке сообщения.
+    """
+    text = serializers.CharField(max_length=5000, trim_whitespace=True)
+
+
 class ChatDetailSerializer(serializers.ModelSerializer):
     """Сериализатор для детальной информации о чате с сообщениями."""
     messages = MessageSerializer(many=True, read_only=True)
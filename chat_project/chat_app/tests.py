@@ -1,11 +1,61 @@
+import asyncio
+import csv
 import json
-from django.test import TestCase
-from django.urls import reverse
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import threading
+import zlib
+from datetime import datetime
+from importlib import import_module
+from unittest import mock
+import brotli
+import msgpack
+import psycopg
+import zstandard
+from asgiref.sync import sync_to_async
+from io import BytesIO, StringIO
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Chat, Message
-from django.core.exceptions import ValidationError
+from . import cache as chat_cache, db, importer, partitioning, pubsub, retention
+from .compression import negotiate
+from .log import BoundedQueueHandler, JSONFormatter, install_queue_logging
+from .models import Chat, ImportCheckpoint, ImportedChat, Message, chat_activity
+from .pubsub import InMemoryBackend
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from .parsers import MessagePackParser, NDJSONParser
+from .renderers import JSONRenderer, MessagePackRenderer
+from .serializers import MessageSerializer
+from .urls import build_urlpatterns
+from .views import AsyncAPIResponse, ChatDetailView, ChatListView, MessageBulkCreateView, metrics_view
+from chat_project import settings as project_settings
 import time
+from django.test import override_settings
+from .querybudget import QueryBudgetExceeded, query_budget, unbudgeted
+
+# Каждый запрос к представлению в тестах проверяется по его бюджету запросов
+_query_budget_settings = override_settings(QUERY_BUDGET_MODE='raise')
+
+
+def setUpModule():
+    _query_budget_settings.enable()
+
+
+def tearDownModule():
+    _query_budget_settings.disable()
 
 
 class ChatModelTests(TestCase):
@@ -103,6 +153,40 @@ class MessageModelTests(TestCase):
             Message.objects.get(id=message_id)
 
 
+class MessageIndexTests(TestCase):
+    """Тесты для индекса последних сообщений чата."""
+
+    def setUp(self):
+        """Создаем чаты с сообщениями."""
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        other_chat = Chat.objects.create(title="Другой чат")
+
+        for i in range(50):
+            Message.objects.create(chat=self.chat, text=f"Сообщение {i}")
+            Message.objects.create(chat=other_chat, text=f"Сообщение {i}")
+
+    @override_settings(CHAT_CACHE_ALIAS='chat-disabled')
+    def test_latest_messages_use_index(self):
+        """Тест, что страница сообщений GET /chats/{id}/ читается из индекса без сортировки."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('chat-detail', args=[self.chat.id]) + '?limit=20')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        page_sql = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT "message".')]
+        self.assertEqual(len(page_sql), 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE message')
+            # На маленькой таблице планировщик предпочел бы seq scan и сортировку
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('EXPLAIN ' + page_sql[0])
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('message_chat_created_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+
 class ChatListViewTests(TestCase):
     """Тесты для ChatListView (создание чата)."""
 
@@ -159,10 +243,212 @@ class ChatListViewTests(TestCase):
 
     def test_wrong_http_method(self):
         """Тест использования неверного HTTP метода."""
-        response = self.client.get(self.url)
+        response = self.client.put(self.url)
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+class ChatListTests(TestCase):
+    """Тесты для списка чатов (GET /chats/)."""
+
+    def setUp(self):
+        """Создаем чаты с сообщениями."""
+        self.client = APIClient()
+        self.url = reverse('chat-list')
+
+        self.chats = [Chat.objects.create(title=f"Чат {i}") for i in range(5)]
+
+    def test_list_by_created(self):
+        """Тест списка по умолчанию: от новых чатов к старым."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [chat['id'] for chat in response.data['results']]
+        self.assertEqual(ids, [chat.id for chat in self.chats[::-1]])
+        self.assertIsNone(response.data['next'])
+
+    def test_list_by_activity(self):
+        """Тест сортировки по последней активности."""
+        Message.objects.create_for_chat(self.chats[1].id, "Сообщение")
+        Message.objects.create_for_chat(self.chats[3].id, "Сообщение")
+
+        response = self.client.get(self.url + '?order=activity')
+
+        ids = [chat['id'] for chat in response.data['results']]
+        expected = [self.chats[3].id, self.chats[1].id, self.chats[4].id, self.chats[2].id, self.chats[0].id]
+        self.assertEqual(ids, expected)
+
+    def test_message_stats(self):
+        """Тест количества, времени и превью последнего сообщения в списке."""
+        chat = self.chats[0]
+        Message.objects.create_for_chat(chat.id, "Первое")
+        message = Message.objects.create_for_chat(chat.id, "Второе " + "x" * 200)
+
+        response = self.client.get(self.url)
+
+        data = next(item for item in response.data['results'] if item['id'] == chat.id)
+        self.assertEqual(data['message_count'], 2)
+        self.assertEqual(data['last_message_preview'], message.text[:100])
+        self.assertIsNotNone(data['last_message_at'])
+
+        empty = next(item for item in response.data['results'] if item['id'] == self.chats[1].id)
+        self.assertEqual(empty['message_count'], 0)
+        self.assertIsNone(empty['last_message_at'])
+        self.assertEqual(empty['last_message_preview'], '')
+
+    def test_walk_list_with_cursor(self):
+        """Тест обхода списка по курсору без пропусков и повторов в обоих порядках."""
+        Message.objects.create_for_chat(self.chats[2].id, "Сообщение")
+
+        for order in ('created', 'activity'):
+            seen = []
+            url = self.url + f'?order={order}&limit=2'
+            while True:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                seen.extend(chat['id'] for chat in response.data['results'])
+                if response.data['next'] is None:
+                    break
+                url = self.url + f"?order={order}&limit=2&cursor={response.data['next']}"
+
+            self.assertCountEqual(seen, [chat.id for chat in self.chats])
+            self.assertEqual(len(seen), len(self.chats))
+
+    def test_list_hides_deleting_chats(self):
+        """Тест, что удаляемые чаты не попадают в список."""
+        Chat.objects.filter(id=self.chats[0].id).update(is_deleting=True)
+
+        response = self.client.get(self.url)
+
+        ids = [chat['id'] for chat in response.data['results']]
+        self.assertNotIn(self.chats[0].id, ids)
+
+    def test_list_single_query(self):
+        """Тест, что страница списка стоит одного запроса независимо от количества сообщений."""
+        for chat in self.chats:
+            Message.objects.bulk_create([Message(chat=chat, text="Сообщение") for _ in range(10)])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url + '?order=activity&limit=3')
+
+        self.assertEqual(response.data['results'][0]['message_count'], 10)
+
+    def test_list_uses_index(self):
+        """Тест, что страницы читаются из индексов без сортировки."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE chat')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+
+        plan = Chat.objects.alive().order_by('-created_at', '-id')[:20].explain()
+        self.assertIn('chat_created_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+        plan = (
+            Chat.objects.alive()
+            .annotate(activity=chat_activity())
+            .order_by('-activity', '-id')[:20]
+            .explain()
+        )
+        self.assertIn('chat_activity_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_invalid_order(self):
+        """Тест некорректного порядка."""
+        response = self.client.get(self.url + '?order=title')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_cursor(self):
+        """Тест некорректного курсора."""
+        response = self.client.get(self.url + '?cursor=bm90LWEtY3Vyc29y')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ChatMessageStatsTests(TestCase):
+    """Тесты согласованности денормализованной статистики сообщений чата."""
+
+    def setUp(self):
+        """Создаем чат."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+
+    def assertStatsMatchMessages(self):
+        self.chat.refresh_from_db()
+        messages = self.chat.messages.order_by('-created_at', '-id')
+        latest = messages.first()
+        self.assertEqual(self.chat.message_count, messages.count())
+        self.assertEqual(self.chat.last_message_at, latest.created_at if latest else None)
+        self.assertEqual(self.chat.last_message_preview, latest.text[:100] if latest else '')
+
+    def test_create_message_view(self):
+        """Тест обновления статистики при отправке сообщения."""
+        url = reverse('message-create', args=[self.chat.id])
+        self.client.post(url, {"text": "Первое"}, format='json')
+        self.client.post(url, {"text": "Второе"}, format='json')
+
+        self.assertStatsMatchMessages()
+        self.assertEqual(self.chat.last_message_preview, "Второе")
+
+    def test_bulk_create_view(self):
+        """Тест обновления статистики при массовой загрузке."""
+        url = reverse('message-bulk-create', args=[self.chat.id])
+        self.client.post(url, [{"text": "Первое"}, {"text": ""}, {"text": "Третье"}], format='json')
+
+        self.assertStatsMatchMessages()
+        self.assertEqual(self.chat.message_count, 2)
+
+    def test_delete_messages(self):
+        """Тест пересчета статистики при удалении сообщений."""
+        first = Message.objects.create(chat=self.chat, text="Первое")
+        last = Message.objects.create(chat=self.chat, text="Второе")
+
+        last.delete()
+        self.assertStatsMatchMessages()
+        self.assertEqual(self.chat.last_message_preview, "Первое")
+
+        Message.objects.filter(id=first.id).delete()
+        self.assertStatsMatchMessages()
+        self.assertEqual(self.chat.message_count, 0)
+
+    def test_update_message_text(self):
+        """Тест пересчета превью при изменении текста."""
+        message = Message.objects.create(chat=self.chat, text="Черновик")
+
+        Message.objects.filter(id=message.id).update(text="Исправлено")
+
+        self.assertStatsMatchMessages()
+        self.assertEqual(self.chat.last_message_preview, "Исправлено")
+
+    def test_save_and_delete_message_incremental(self):
+        """Тест, что save/delete сообщения обновляют статистику без пересчета COUNT."""
+        with CaptureQueriesContext(connection) as queries:
+            first = Message.objects.create(chat=self.chat, text="Первое")
+            last = Message.objects.create(chat=self.chat, text="Второе")
+            self.assertStatsMatchMessages()
+
+            # Изменение не последнего сообщения не трогает превью
+            first.text = "Первое исправлено"
+            first.save()
+            self.assertStatsMatchMessages()
+            self.assertEqual(self.chat.last_message_preview, "Второе")
+
+            last.text = "Второе исправлено"
+            last.save()
+            self.assertStatsMatchMessages()
+
+            first.delete()
+            self.assertStatsMatchMessages()
+            self.assertEqual(self.chat.last_message_preview, "Второе исправлено")
+
+            last.delete()
+            self.assertStatsMatchMessages()
+
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "chat"')]
+        self.assertEqual(len(updates), 6)
+        self.assertFalse(any('COUNT(' in sql for sql in updates))
+
+
 class ChatDetailViewTests(TestCase):
     """Тесты для ChatDetailView (получение и удаление чата)."""
 
@@ -254,80 +540,2474 @@ class ChatDetailViewTests(TestCase):
         self.assertEqual(response.data['detail'], "Чат не найден")
 
 
-class MessageCreateViewTests(TestCase):
-    """Тесты для MessageCreateView (отправка сообщений)."""
+class ChatDeletionTests(TestCase):
+    """Тесты пакетного и фонового удаления чатов."""
 
     def setUp(self):
-        """Создаем тестовые данные."""
+        """Создаем чат с сообщениями."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Большой чат")
+        Message.objects.bulk_create(
+            Message(chat=self.chat, text=f"Сообщение {i}") for i in range(5)
+        )
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+    def test_messages_deleted_in_batches(self):
+        """Сообщения удаляются пачками по CHAT_DELETE_BATCH_SIZE."""
+        with self.settings(CHAT_DELETE_BATCH_SIZE=2):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.delete(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Chat.objects.filter(id=self.chat.id).exists())
+        self.assertEqual(Message.objects.filter(chat_id=self.chat.id).count(), 0)
+
+        batches = [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith('DELETE FROM "message" WHERE id IN')
+        ]
+        # 2 + 2 + 1 и контрольная пачка перед удалением самого чата
+        self.assertEqual(len(batches), 4)
+
+    def test_async_delete_hides_chat_immediately(self):
+        """При CHAT_DELETE_ASYNC чат сразу недоступен, удаление идет после ответа."""
+        with self.settings(CHAT_DELETE_ASYNC=True):
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.delete(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(Chat.objects.filter(id=self.chat.id, is_deleting=True).exists())
+        # Фоновое удаление запускается только после фиксации транзакции
+        self.assertTrue(callbacks)
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post(
+            reverse('message-create', args=[self.chat.id]),
+            {'text': 'Поздно'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_pending_chats(self):
+        """Команда delete_pending_chats доудаляет помеченные чаты."""
+        other = Chat.objects.create(title="Другой чат")
+        Message.objects.create(chat=other, text="Остается")
+        Chat.objects.filter(id=self.chat.id).update(is_deleting=True)
+
+        out = StringIO()
+        call_command('delete_pending_chats', stdout=out)
+
+        self.assertIn("Удалено чатов: 1", out.getvalue())
+        self.assertFalse(Chat.objects.filter(id=self.chat.id).exists())
+        self.assertEqual(Message.objects.filter(chat_id=self.chat.id).count(), 0)
+        self.assertEqual(Message.objects.filter(chat=other).count(), 1)
+
+
+class ChatDetailFastJSONTests(TestCase):
+    """Тесты быстрого пути чтения GET /chats/{id}/ (values_list + orjson)."""
+
+    def setUp(self):
+        """Создаем чат с сообщениями, включая символы, требующие экранирования."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title='Чат "с кавычками" \\ 😀')
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+        texts = [
+            "Обычное сообщение",
+            'Кавычки " и обратный слеш \\',
+            "Переводы\nстрок\tи управляющий \x01 символ",
+            "Разделители строк \u2028 и абзацев \u2029",
+            "Эмодзи 😀 и </script>",
+        ]
+        for i in range(25):
+            Message.objects.create(chat=self.chat, text=texts[i % len(texts)])
+
+    def get_both(self, query=''):
+        """Ответы быстрого пути и пути через DRF-сериализаторы."""
+        cache.clear()
+        fast = self.client.get(self.url + query)
+        cache.clear()
+        with self.settings(CHAT_FAST_JSON=False):
+            slow = self.client.get(self.url + query)
+        return fast, slow
+
+    def test_byte_identical_output(self):
+        """Тест, что тело ответа побайтно совпадает с ответом DRF."""
+        for query in ('', '?limit=100', '?limit=3'):
+            fast, slow = self.get_both(query)
+
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, slow.content)
+            self.assertEqual(fast['Content-Type'], slow['Content-Type'])
+            self.assertIn(b'\\u2028', fast.content)
+
+    def test_byte_identical_pages(self):
+        """Тест совпадения страниц по курсорам."""
+        first, _ = self.get_both('?limit=10')
+        next_cursor = first.data['next']
+
+        fast, slow = self.get_both(f'?limit=10&before={next_cursor}')
+        self.assertEqual(fast.content, slow.content)
+
+        prev_cursor = fast.data['prev']
+        fast, slow = self.get_both(f'?limit=10&after={prev_cursor}')
+        self.assertEqual(fast.content, slow.content)
+
+    def test_byte_identical_in_utc(self):
+        """Тест совпадения дат при часовом поясе UTC (суффикс Z)."""
+        with self.settings(TIME_ZONE='UTC'):
+            fast, slow = self.get_both()
+
+        self.assertEqual(fast.content, slow.content)
+        self.assertIn(b'Z"', fast.content)
+
+    def test_cached_response_identical(self):
+        """Тест, что ответ из кэша совпадает с первым ответом."""
+        cache.clear()
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+
+    def test_fast_path_skips_serializers(self):
+        """Тест, что быстрый путь не вызывает DRF-сериализаторы."""
+        cache.clear()
+        with mock.patch('chat_app.views.MessageSerializer') as serializer:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        serializer.assert_not_called()
+
+    def test_indent_uses_renderer(self):
+        """Тест, что JSON с indent строится через рендерер DRF."""
+        cache.clear()
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json; indent=2')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'\n  "id"', response.content)
+
+    def test_not_found(self):
+        """Тест 404 для несуществующего чата."""
+        response = self.client.get(reverse('chat-detail', args=[999]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ChatExportTests(TestCase):
+    """Тесты для выгрузки истории чата (GET /chats/{id}/export/)."""
+
+    def setUp(self):
+        """Создаем чат с сообщениями, включая текст со спецсимволами CSV."""
         self.client = APIClient()
         self.chat = Chat.objects.create(title="Тестовый чат")
+        other_chat = Chat.objects.create(title="Другой чат")
+        self.messages = [
+            Message.objects.create(chat=self.chat, text=f'Сообщение {i}, "в кавычках"\nи с переводом строки')
+            for i in range(5)
+        ]
+        Message.objects.create(chat=other_chat, text="Чужое сообщение")
+        self.url = reverse('chat-export', args=[self.chat.id])
+
+    def expected_lines(self, messages):
+        return [
+            JSONRenderer().render(MessageSerializer(message).data)
+            for message in messages
+        ]
+
+    def test_export_ndjson(self):
+        """Тест выгрузки NDJSON: все сообщения чата по порядку, строки как в API."""
+        with self.settings(CHAT_EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(self.url)
 
-    def test_create_message_success(self):
-        """Тест успешной отправки сообщения."""
-        url = reverse('message-create', args=[self.chat.id])
-        data = {"text": "Тестовое сообщение"}
-        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn(f'chat-{self.chat.id}.ndjson', response['Content-Disposition'])
+
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(lines, self.expected_lines(self.messages))
+
+    def test_export_csv(self):
+        """Тест выгрузки CSV с заголовком и экранированием."""
+        with self.settings(CHAT_EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(self.url + '?format=csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ['id', 'chat', 'text', 'created_at'])
+        self.assertEqual(len(rows), len(self.messages) + 1)
+
+        data = MessageSerializer(self.messages[0]).data
+        self.assertEqual(rows[1], [str(data['id']), str(data['chat']), data['text'], data['created_at']])
+
+    def test_export_since(self):
+        """Тест инкрементальной выгрузки после since."""
+        response = self.client.get(self.url + f'?since={self.messages[2].id}')
+
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(lines, self.expected_lines(self.messages[3:]))
+
+    async def test_export_asgi_streams_async(self):
+        """Тест, что под ASGI поток асинхронный и не буферизуется целиком."""
+        response = await self.async_client.get(self.url)
+
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(content.splitlines(), await sync_to_async(self.expected_lines)(self.messages))
+
+    def test_since_uses_index(self):
+        """Тест, что выборка новее since читает индекс message_chat_id_idx."""
+        # Большинство новых сообщений - в другом чате
+        other_chat = Chat.objects.create(title="Активный чат")
+        Message.objects.bulk_create(Message(chat=other_chat, text="Сообщение") for _ in range(500))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE message')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+
+        plan = Message.objects.filter(chat=self.chat).since(self.messages[2].id).explain()
+
+        self.assertIn('message_chat_id_idx', plan)
+
+    def test_invalid_parameters(self):
+        """Тест некорректных format и since."""
+        self.assertEqual(self.client.get(self.url + '?format=xml').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url + '?since=abc').status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_nonexistent_chat(self):
+        """Тест выгрузки несуществующего чата."""
+        response = self.client.get(reverse('chat-export', args=[999]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ImportChatsTests(TestCase):
+    """Тесты команды import_chats."""
+
+    def write_file(self, content, suffix='.ndjson'):
+        """Временный файл для загрузки."""
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def ndjson(self, *records):
+        return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+    def import_chats(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_chats', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_ndjson(self):
+        """Чаты и сообщения из NDJSON загружаются со статистикой чатов."""
+        path = self.write_file(self.ndjson(
+            {'type': 'chat', 'id': 'c1', 'title': '  Первый  ', 'created_at': '2024-01-20T10:00:00Z'},
+            {'type': 'chat', 'id': 2, 'title': 'Второй'},
+            {'type': 'message', 'chat': 'c1', 'text': 'Раньше', 'created_at': '2024-01-20T10:05:00Z'},
+            {'type': 'message', 'chat': 'c1', 'text': 'Позже', 'created_at': '2024-01-20T10:10:00Z'},
+            {'type': 'message', 'chat': 2, 'text': 'Привет'},
+        ))
+
+        out, err = self.import_chats(path)
+
+        self.assertIn("Загружено чатов: 2, сообщений: 3", out)
+        self.assertEqual(err, '')
+
+        first = Chat.objects.get(title="Первый")
+        self.assertEqual(first.created_at.isoformat(), '2024-01-20T10:00:00+00:00')
+        self.assertEqual(first.message_count, 2)
+        self.assertEqual(first.last_message_preview, "Позже")
+        self.assertEqual(first.last_message_at.isoformat(), '2024-01-20T10:10:00+00:00')
+        self.assertEqual(
+            list(first.messages.order_by('created_at').values_list('text', flat=True)),
+            ["Раньше", "Позже"]
+        )
+
+        second = Chat.objects.get(title="Второй")
+        self.assertEqual(second.message_count, 1)
+        self.assertEqual(second.messages.get().text, "Привет")
+
+        checkpoint = ImportCheckpoint.objects.get(name=path)
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual((checkpoint.chats, checkpoint.messages, checkpoint.errors), (2, 3, 0))
+        # Соответствие ключей после завершения не хранится
+        self.assertFalse(ImportedChat.objects.exists())
+
+    def test_import_csv(self):
+        """CSV с заголовком, кавычками и переносами строк в тексте."""
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('type', 'id', 'chat', 'title', 'text', 'created_at'))
+        writer.writerow(('chat', 'c1', '', 'Чат из CSV', '', ''))
+        writer.writerow(('message', '', 'c1', '', 'Строка 1\nСтрока 2, "в кавычках"', '2024-01-20T10:00:00'))
+        path = self.write_file(buffer.getvalue(), suffix='.csv')
+
+        out, err = self.import_chats(path)
+
+        self.assertIn("Загружено чатов: 1, сообщений: 1", out)
+        message = Message.objects.get(chat__title="Чат из CSV")
+        self.assertEqual(message.text, 'Строка 1\nСтрока 2, "в кавычках"')
+        # Дата без часового пояса - в текущем поясе
+        self.assertEqual(message.created_at, timezone.make_aware(datetime(2024, 1, 20, 10, 0)))
+
+    def test_invalid_records_skipped(self):
+        """Некорректные записи пропускаются с номером записи, остальные загружаются."""
+        path = self.write_file(
+            self.ndjson(
+                {'type': 'chat', 'id': 'c1', 'title': 'Чат'},
+                {'type': 'chat', 'id': 'c2', 'title': '   '},
+                {'type': 'chat', 'id': 'c3', 'title': 'x' * 201},
+                {'type': 'chat', 'id': 'c1', 'title': 'Повтор'},
+                {'type': 'message', 'chat': 'c1', 'text': ''},
+                {'type': 'message', 'chat': 'c1', 'text': 'x' * 5001},
+                {'type': 'message', 'chat': 'c1', 'text': 42},
+                {'type': 'message', 'chat': 'нет', 'text': 'Куда?'},
+                {'type': 'message', 'chat': 'c1', 'text': 'Дата', 'created_at': 'вчера'},
+                {'type': 'user', 'id': 1},
+            ) + '{не json}\n[1, 2]\n\n' + self.ndjson(
+                {'type': 'message', 'chat': 'c1', 'text': 'Нормальное'},
+            )
+        )
+
+        out, err = self.import_chats(path)
+
+        self.assertIn("Загружено чатов: 1, сообщений: 1, пропущено записей: 11", out)
+        self.assertIn("Запись 2: Название чата не может быть пустым", err)
+        self.assertIn("Запись 5: Текст сообщения не может быть пустым", err)
+        self.assertIn("Запись 8: Чат нет не найден в файле", err)
+        self.assertIn("Запись 11: Некорректный JSON", err)
+        self.assertEqual(Chat.objects.get().messages.get().text, "Нормальное")
+        self.assertEqual(Chat.objects.get().message_count, 1)
+
+    def test_resume_after_interruption(self):
+        """Прерванная загрузка продолжается с контрольной точки без повторов."""
+        records = [{'type': 'chat', 'id': 'c1', 'title': 'Чат'}]
+        records += [{'type': 'message', 'chat': 'c1', 'text': f"Сообщение {i}"} for i in range(9)]
+        path = self.write_file(self.ndjson(*records))
+
+        class Interrupted(Exception):
+            pass
+
+        def interrupt(checkpoint):
+            raise Interrupted
+
+        # Первая пачка (4 записи) сохраняется, затем загрузка обрывается
+        with self.assertRaises(Interrupted):
+            importer.import_file(path, batch_size=4, progress=interrupt)
+
+        checkpoint = ImportCheckpoint.objects.get(name=path)
+        self.assertFalse(checkpoint.completed)
+        self.assertEqual((checkpoint.line, checkpoint.chats, checkpoint.messages), (4, 1, 3))
+
+        out, err = self.import_chats(path, '--batch-size', '4')
+
+        self.assertIn("Продолжение загрузки с записи 5", out)
+        self.assertIn("Загружено чатов: 1, сообщений: 9", out)
+        chat = Chat.objects.get()
+        self.assertEqual(chat.message_count, 9)
+        self.assertEqual(
+            sorted(chat.messages.values_list('text', flat=True)),
+            sorted(f"Сообщение {i}" for i in range(9))
+        )
+
+    def test_resume_csv(self):
+        """Продолжение CSV начинается после заголовка и загруженных строк."""
+        lines = ['type,id,chat,title,text,created_at', 'chat,c1,,Чат,,']
+        lines += [f'message,,c1,,"Сообщение\n{i}",' for i in range(5)]
+        path = self.write_file('\r\n'.join(lines) + '\r\n', suffix='.csv')
+
+        def interrupt(checkpoint):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            importer.import_file(path, batch_size=3, progress=interrupt)
+
+        self.import_chats(path)
+
+        chat = Chat.objects.get()
+        self.assertEqual(chat.message_count, 5)
+        self.assertEqual(
+            sorted(chat.messages.values_list('text', flat=True)),
+            [f"Сообщение\n{i}" for i in range(5)]
+        )
+
+    def test_completed_import_not_repeated(self):
+        """Повторная загрузка завершенного файла - только с --restart."""
+        path = self.write_file(self.ndjson(
+            {'type': 'chat', 'id': 'c1', 'title': 'Чат'},
+            {'type': 'message', 'chat': 'c1', 'text': 'Привет'},
+        ))
+        self.import_chats(path)
+
+        with self.assertRaisesMessage(CommandError, "Файл уже загружен"):
+            self.import_chats(path)
+        self.assertEqual(Chat.objects.count(), 1)
+
+        self.import_chats(path, '--restart')
+        self.assertEqual(Chat.objects.count(), 2)
+
+    def test_missing_file(self):
+        """Отсутствующий файл - ошибка команды."""
+        with self.assertRaisesMessage(CommandError, "Не удалось прочитать файл"):
+            self.import_chats('/nonexistent/chats.ndjson')
+
+
+class MessagePartitioningTests(TestCase):
+    """Тесты секционирования таблицы сообщений."""
+
+    def setUp(self):
+        """Чат с сообщением прошлого года и двумя текущего месяца."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Секционированный чат")
+        self.old = Message.objects.create(chat=self.chat, text="Старое")
+        Message.objects.filter(id=self.old.id).update(created_at=timezone.now() - timezone.timedelta(days=400))
+        for i in range(2):
+            Message.objects.create(chat=self.chat, text=f"Новое {i}")
+        Chat.objects.filter(id=self.chat.id).refresh_message_stats()
+
+        self.url = reverse('chat-detail', args=[self.chat.id])
+        self.current = partitioning.month_start(timezone.now())
+        self.old_month = partitioning.month_start(timezone.now() - timezone.timedelta(days=400))
+
+    def message_plans(self, url, analyze=False):
+        """
+        Ответ GET url и планы его запросов к таблице сообщений: {'page':
+        страница сообщений, 'validator': запрос валидатора}.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        plans = {}
+        with connection.cursor() as cursor:
+            # На таблицах в несколько строк планировщик выбрал бы полный просмотр
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            for query in queries.captured_queries:
+                if query['sql'].startswith('SELECT "message".'):
+                    kind = 'page'
+                elif 'FROM "message"' in query['sql']:
+                    kind = 'validator'
+                else:
+                    continue
+                cursor.execute(('EXPLAIN ANALYZE ' if analyze else 'EXPLAIN ') + query['sql'])
+                plans[kind] = '\n'.join(row[0] for row in cursor.fetchall())
+        return response, plans
+
+    def test_convert_month(self):
+        """Тест перевода на секции по месяцам: данные, id и API сохраняются."""
+        partitioning.convert('month', months_ahead=2)
+
+        self.assertEqual(partitioning.current_scheme(), 'month')
+        names = [name for name, bound, rows in partitioning.partitions()]
+        self.assertIn(partitioning.month_partition_name(self.old_month), names)
+        self.assertIn(partitioning.month_partition_name(partitioning.add_months(self.current, 2)), names)
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 3)
+
+        response = self.client.post(
+            reverse('message-create', args=[self.chat.id]), {'text': "После"}, format='json'
+        )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(response.data['text'], "Тестовое сообщение")
-        self.assertEqual(response.data['chat'], self.chat.id)
-        self.assertIn('id', response.data)
-        self.assertIn('created_at', response.data)
+        self.assertGreater(response.data['id'], Message.objects.exclude(text="После").latest('id').id)
 
-        # Проверяем, что сообщение создано в БД
-        message = Message.objects.get(id=response.data['id'])
-        self.assertEqual(message.text, "Тестовое сообщение")
-        self.assertEqual(message.chat.id, self.chat.id)
+        response = self.client.get(self.url)
+        self.assertEqual([m['text'] for m in response.data['messages']], ["После", "Новое 1", "Новое 0", "Старое"])
 
-    def test_create_message_with_spaces(self):
-        """Тест отправки сообщения с пробелами по краям."""
-        url = reverse('message-create', args=[self.chat.id])
-        data = {"text": "  Сообщение с пробелами  "}
-        response = self.client.post(url, data, format='json')
+    def test_month_first_page_reads_newest_partition(self):
+        """Тест, что первая страница не читает секции старых месяцев, а валидатор - сообщения."""
+        partitioning.convert('month', months_ahead=0)
+
+        response, plans = self.message_plans(self.url + '?limit=1', analyze=True)
+
+        self.assertEqual(response.data['messages'][0]['text'], "Новое 1")
+        self.assertEqual(plans.keys(), {'page'})
+        old_name = partitioning.month_partition_name(self.old_month)
+        for plan in plans.values():
+            old_scan = [line for line in plan.splitlines() if old_name in line]
+            self.assertTrue(old_scan, plan)
+            self.assertTrue(all('never executed' in line for line in old_scan), plan)
+
+    def test_month_cursor_page_pruned(self):
+        """Тест, что страница с курсором отсекает секции новее курсора при планировании."""
+        partitioning.convert('month', months_ahead=2)
+        cursor = self.client.get(self.url + '?limit=1').data['next']
+
+        response, plans = self.message_plans(self.url + f'?limit=1&before={cursor}')
+
+        self.assertEqual([m['text'] for m in response.data['messages']], ["Новое 0"])
+        self.assertIn(partitioning.month_partition_name(self.current), plans['page'])
+        for months in (1, 2):
+            future = partitioning.month_partition_name(partitioning.add_months(self.current, months))
+            self.assertNotIn(future, plans['page'])
+
+    def test_convert_hash(self):
+        """Тест секций по хэшу чата: запросы страницы читают одну секцию."""
+        partitioning.convert('hash', hash_partitions=4)
+
+        self.assertEqual(partitioning.current_scheme(), 'hash')
+        self.assertEqual(len(partitioning.partitions()), 4)
+
+        response, plans = self.message_plans(self.url)
+
+        self.assertEqual(len(response.data['messages']), 3)
+        for plan in plans.values():
+            scanned = {f'message_h{i}' for i in range(4) if f'message_h{i} ' in plan}
+            self.assertEqual(len(scanned), 1, plan)
+
+    def test_unpartition(self):
+        """Тест возврата к обычной таблице."""
+        partitioning.convert('hash', hash_partitions=2)
+
+        partitioning.unpartition()
+
+        self.assertIsNone(partitioning.current_scheme())
+        self.assertEqual(partitioning.partitions(), [])
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 3)
+
+    def test_migration_reverse_unpartitions(self):
+        """Тест отката миграции 0008: секционированная таблица становится обычной."""
+        migration = import_module('chat_app.migrations.0008_message_partitioning')
+        partitioning.convert('month')
+
+        with connection.schema_editor() as schema_editor:
+            migration.unpartition_messages(None, schema_editor)
+
+        self.assertIsNone(partitioning.current_scheme())
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 3)
+        message = Message.objects.create(chat=self.chat, text="После отката")
+        self.assertGreater(message.id, self.old.id)
+
+    def test_ensure_and_detach_partitions(self):
+        """Тест создания будущих секций и отсоединения старых с пересчетом статистики."""
+        partitioning.convert('month', months_ahead=0)
+
+        created = partitioning.ensure_partitions(months_ahead=2)
+        self.assertEqual(created, [
+            partitioning.month_partition_name(partitioning.add_months(self.current, 1)),
+            partitioning.month_partition_name(partitioning.add_months(self.current, 2)),
+        ])
+        self.assertEqual(partitioning.ensure_partitions(months_ahead=2), [])
+
+        old_name = partitioning.month_partition_name(self.old_month)
+        detached = partitioning.detach_partitions_before(self.current)
+
+        self.assertIn(old_name, detached)
+        self.assertFalse(Message.objects.filter(id=self.old.id).exists())
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.message_count, 2)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [old_name])
+            self.assertIsNotNone(cursor.fetchone()[0])
+
+    def test_drop_partitions(self):
+        """Тест удаления старых секций."""
+        partitioning.convert('month', months_ahead=0)
+        old_name = partitioning.month_partition_name(self.old_month)
+
+        partitioning.detach_partitions_before(self.current, drop=True)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [old_name])
+            self.assertIsNone(cursor.fetchone()[0])
+
+    def test_import_creates_month_partitions(self):
+        """Тест, что загрузка создает секции для месяцев загружаемых сообщений."""
+        partitioning.convert('month', months_ahead=0)
+        fd, path = tempfile.mkstemp(suffix='.ndjson')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write('{"type": "chat", "id": "c", "title": "Архив"}\n')
+            file.write('{"type": "message", "chat": "c", "text": "2019", "created_at": "2019-03-05T10:00:00Z"}\n')
+        self.addCleanup(os.remove, path)
+
+        importer.import_file(path)
+
+        self.assertIn(
+            partitioning.month_partition_name(datetime(2019, 3, 1)),
+            [name for name, bound, rows in partitioning.partitions()]
+        )
+        self.assertEqual(Message.objects.get(text="2019").chat.title, "Архив")
+
+    def test_command(self):
+        """Тест команды partition_messages."""
+        with self.assertRaises(CommandError):
+            call_command('partition_messages', stdout=StringIO())
+
+        out = StringIO()
+        call_command('partition_messages', convert='month', months_ahead=1, stdout=out)
+        self.assertIn("Схема: month", out.getvalue())
+
+        out = StringIO()
+        call_command('partition_messages', detach_older_than=1, drop=True, stdout=out)
+        self.assertIn(f"Удалены секции старше", out.getvalue())
+        self.assertIn(partitioning.month_partition_name(self.old_month), out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('partition_messages', convert='hash', stdout=StringIO())
+
+
+class MessagePartitionInsertTests(TransactionTestCase):
+    """
+    Тесты создания недостающей секции при отправке сообщения. Секция
+    создается только вне транзакции, поэтому тест не оборачивается в
+    транзакцию TestCase.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Секционированный чат")
+        self.url = reverse('chat-detail', args=[self.chat.id])
+        self.current = partitioning.month_start(timezone.now())
+
+        partitioning.convert('month', months_ahead=0)
+        self.addCleanup(self.unpartition)
+
+    def unpartition(self):
+        partitioning.unpartition()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {partitioning.month_partition_name(self.current)}")
 
+    def test_insert_creates_missing_partition(self):
+        """Тест, что отправка сообщения создает недостающую секцию текущего месяца."""
+        # Отсоединенная секция остается таблицей, поэтому новая получает другое имя
+        partitioning.detach_partitions_before(partitioning.add_months(self.current, 1))
+
+        response = self.client.post(
+            reverse('message-create', args=[self.chat.id]), {'text': "После"}, format='json'
+        )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(response.data['text'], "Сообщение с пробелами")
 
-    def test_create_message_empty_text(self):
-        """Тест отправки сообщения с пустым текстом."""
-        url = reverse('message-create', args=[self.chat.id])
-        data = {"text": ""}
-        response = self.client.post(url, data, format='json')
+        names = [name for name, bound, rows in partitioning.partitions()]
+        self.assertIn(partitioning.month_partition_name(self.current) + '_1', names)
+        self.assertNotIn(partitioning.month_partition_name(self.current), names)
 
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('text', response.data)
+        partitioning.detach_partitions_before(partitioning.add_months(self.current, 1), drop=True)
+        response = self.client.post(
+            reverse('message-bulk-create', args=[self.chat.id]), [{'text': "Пачка"}], format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([m['text'] for m in self.client.get(self.url).data['messages']], ["Пачка"])
 
-    def test_create_message_too_long_text(self):
-        """Тест отправки сообщения со слишком длинным текстом."""
-        url = reverse('message-create', args=[self.chat.id])
-        data = {"text": "A" * 5001}
-        response = self.client.post(url, data, format='json')
 
-        self.assertIn(response.status_code, [status.HTTP_400_BAD_REQUEST, status.HTTP_500_INTERNAL_SERVER_ERROR])
+@override_settings(MESSAGE_RETENTION_DAYS=0, MESSAGE_RETENTION_MAX_MESSAGES=0, MESSAGE_PURGE_PAUSE=0)
+class MessageRetentionTests(TestCase):
+    """Тесты срока хранения сообщений (purge_messages)."""
 
-    def test_create_message_missing_text(self):
-        """Тест отправки сообщения без поля text."""
-        url = reverse('message-create', args=[self.chat.id])
-        data = {}
-        response = self.client.post(url, data, format='json')
+    def setUp(self):
+        """Чат с тремя сообщениями 40-дневной давности и двумя сегодняшними."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Чат со сроком хранения")
+        self.old = []
+        for i in range(3):
+            message = Message.objects.create(chat=self.chat, text=f"Старое {i}")
+            Message.objects.filter(id=message.id).update(
+                created_at=timezone.now() - timezone.timedelta(days=40, minutes=10 - i)
+            )
+            self.old.append(message.id)
+        self.new = [Message.objects.create(chat=self.chat, text=f"Новое {i}").id for i in range(2)]
+        Chat.objects.filter(id=self.chat.id).refresh_message_stats()
 
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('text', response.data)
+    def remaining(self, chat=None):
+        return list(Message.objects.filter(chat=chat or self.chat).order_by('id').values_list('id', flat=True))
 
-    def test_create_message_in_nonexistent_chat(self):
-        """Тест отправки сообщения в несуществующий чат."""
-        url = reverse('message-create', args=[999])
-        data = {"text": "Сообщение"}
-        response = self.client.post(url, data, format='json')
+    def assertStatsConsistent(self, chat):
+        """Статистика после удаления совпадает с пересчитанной по сообщениям."""
+        chat.refresh_from_db()
+        stats = (chat.message_count, chat.last_message_at, chat.last_message_preview)
+        Chat.objects.filter(id=chat.id).refresh_message_stats()
+        chat.refresh_from_db()
+        self.assertEqual(stats, (chat.message_count, chat.last_message_at, chat.last_message_preview))
+
+    def test_no_policy(self):
+        """Без политики ничего не удаляется."""
+        stats = retention.purge_messages()
+        self.assertEqual(stats.messages, 0)
+        self.assertEqual(len(self.remaining()), 5)
+
+    def test_max_age(self):
+        """Глобальный срок в днях удаляет только более старые сообщения."""
+        with override_settings(MESSAGE_RETENTION_DAYS=30):
+            stats = retention.purge_messages()
+
+        self.assertEqual((stats.messages, stats.chats), (3, 1))
+        self.assertEqual(self.remaining(), self.new)
+        self.assertStatsConsistent(self.chat)
+        self.assertEqual(self.chat.message_count, 2)
+        self.assertEqual(self.chat.last_message_preview, "Новое 1")
+
+    def test_max_messages(self):
+        """Ограничение количества оставляет самые новые сообщения чата."""
+        with override_settings(MESSAGE_RETENTION_MAX_MESSAGES=3):
+            stats = retention.purge_messages()
+
+        self.assertEqual(stats.messages, 2)
+        self.assertEqual(self.remaining(), self.old[2:] + self.new)
+        self.assertStatsConsistent(self.chat)
+
+        # Чаты не больше лимита не затрагиваются
+        with override_settings(MESSAGE_RETENTION_MAX_MESSAGES=3):
+            self.assertEqual(retention.purge_messages().batches, 0)
+
+    def test_chat_policy(self):
+        """Политика чата заменяет глобальную, 0 отключает ограничение."""
+        other = Chat.objects.create(title="Без срока", retention_days=0)
+        Message.objects.create(chat=other, text="Старое")
+        Message.objects.filter(chat=other).update(created_at=timezone.now() - timezone.timedelta(days=400))
+        Chat.objects.filter(id=self.chat.id).update(retention_max_messages=1)
+
+        with override_settings(MESSAGE_RETENTION_DAYS=30):
+            retention.purge_messages()
+
+        self.assertEqual(self.remaining(), self.new[1:])
+        self.assertEqual(len(self.remaining(other)), 1)
+        self.assertStatsConsistent(self.chat)
+
+        Chat.objects.filter(id=other.id).update(retention_days=100)
+        retention.purge_messages()
+        self.assertEqual(self.remaining(other), [])
+
+    def test_all_messages_expired(self):
+        """Если удалены все сообщения чата, статистика и превью очищаются."""
+        Chat.objects.filter(id=self.chat.id).update(retention_days=30)
+        stats = retention.purge_messages(now=timezone.now() + timezone.timedelta(days=31))
+
+        self.assertEqual(stats.messages, 5)
+        self.chat.refresh_from_db()
+        self.assertEqual(
+            (self.chat.message_count, self.chat.last_message_at, self.chat.last_message_preview),
+            (0, None, '')
+        )
 
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
-        self.assertEqual(response.data['detail'], "Чат не найден")
+    def test_batches(self):
+        """Сообщения удаляются пачками batch_size от самых старых."""
+        Chat.objects.filter(id=self.chat.id).update(retention_max_messages=1)
+        with mock.patch.object(Message.objects, 'purge_batch_for_chat',
+                               wraps=Message.objects.purge_batch_for_chat) as purge_batch:
+            stats = retention.purge_messages(batch_size=2)
+
+        self.assertEqual(stats.messages, 4)
+        self.assertEqual(stats.batches, 3)
+        self.assertEqual([call.args[2] for call in purge_batch.call_args_list], [2, 2, 2])
+        self.assertEqual(self.remaining(), self.new[1:])
+        self.assertStatsConsistent(self.chat)
+
+    def test_index_scan(self):
+        """Пачка выбирается по индексу message_chat_created_idx."""
+        Chat.objects.filter(id=self.chat.id).update(retention_days=30)
+        with CaptureQueriesContext(connection) as queries:
+            retention.purge_messages()
+        purge_sql = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('WITH deleted AS')]
+        self.assertEqual(len(purge_sql), 1)
+
+        with connection.cursor() as cursor:
+            # На нескольких строках планировщику дешевле любой индекс с
+            # сортировкой; запрещаем ее, как на большой таблице
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+            cursor.execute("EXPLAIN " + purge_sql[0])
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('message_chat_created_idx', plan)
+
+    def test_cache_invalidated(self):
+        """После удаления кэш ответа чата сбрасывается."""
+        url = reverse('chat-detail', args=[self.chat.id])
+        self.assertEqual(len(self.client.get(url).data['messages']), 5)
 
-    def test_wrong_http_method(self):
-        """Тест использования неверного HTTP метода."""
-        url = reverse('message-create', args=[self.chat.id])
-        response = self.client.get(url)
-        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        Chat.objects.filter(id=self.chat.id).update(retention_days=30)
+        retention.purge_messages()
+
+        self.assertEqual(len(self.client.get(url).data['messages']), 2)
+
+    def test_lock_timeout(self):
+        """Чат, пачка которого не получила блокировку, откладывается."""
+        other = Chat.objects.create(title="Второй", retention_max_messages=1)
+        for i in range(2):
+            Message.objects.create(chat=other, text=f"Сообщение {i}")
+        Chat.objects.filter(id=self.chat.id).update(retention_days=30)
+
+        error = OperationalError("canceling statement due to lock timeout")
+        error.__cause__ = psycopg.errors.LockNotAvailable()
+        original = retention._purge_batch
+
+        def purge_batch(chat_id, bound, batch_size):
+            if chat_id == self.chat.id:
+                raise error
+            return original(chat_id, bound, batch_size)
+
+        with mock.patch.object(retention, '_purge_batch', side_effect=purge_batch):
+            with self.assertLogs('chat_app.retention', level='WARNING'):
+                stats = retention.purge_messages()
+
+        self.assertEqual((stats.messages, stats.chats, stats.skipped), (1, 1, 1))
+        self.assertEqual(len(self.remaining()), 5)
+        self.assertEqual(len(self.remaining(other)), 1)
+
+        # Другие ошибки не скрываются
+        with mock.patch.object(retention, '_purge_batch', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                retention.purge_messages()
+
+    def test_deleting_chat_skipped(self):
+        """Удаляемые чаты обрабатывает deletion, а не срок хранения."""
+        Chat.objects.filter(id=self.chat.id).update(retention_days=30, is_deleting=True)
+        self.assertEqual(retention.purge_messages().batches, 0)
+        self.assertEqual(len(self.remaining()), 5)
+
+    def test_partitioned(self):
+        """Удаление работает с таблицей, секционированной по месяцам."""
+        partitioning.convert('month', months_ahead=1)
+        Chat.objects.filter(id=self.chat.id).update(retention_days=30)
+
+        self.assertEqual(retention.purge_messages().messages, 3)
+        self.assertEqual(self.remaining(), self.new)
+        self.assertStatsConsistent(self.chat)
+
+    def test_command(self):
+        """Тест команды purge_messages."""
+        Chat.objects.filter(id=self.chat.id).update(retention_max_messages=2)
+
+        out = StringIO()
+        call_command('purge_messages', chat_ids=[self.chat.id], batch_size=2, stdout=out)
+        self.assertIn("Удалено сообщений: 3 в 1 чатах", out.getvalue())
+        self.assertIn("пачек: 2", out.getvalue())
+        self.assertEqual(self.remaining(), self.new)
+
+        with self.assertRaises(CommandError):
+            call_command('purge_messages', batch_size=0, stdout=StringIO())
+
+
+class ChatDetailCacheTests(TestCase):
+    """Тесты для кэша ответов ChatDetailView."""
+
+    def setUp(self):
+        """Создаем чат с сообщениями и очищаем кэш."""
+        cache.clear()
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        for i in range(3):
+            Message.objects.create(chat=self.chat, text=f"Сообщение {i}")
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+    def test_cache_alias_for_several_processes(self):
+        """Тест, что кэш в памяти процесса не используется для чатов при нескольких воркерах."""
+        self.assertEqual(project_settings._chat_cache_alias('default', 1), 'default')
+        self.assertEqual(project_settings._chat_cache_alias('default', 4), 'chat-disabled')
+
+        shared = {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}
+        with mock.patch.dict(project_settings.CACHES, {'shared': shared}):
+            self.assertEqual(project_settings._chat_cache_alias('shared', 4), 'shared')
+
+    @override_settings(CHAT_CACHE_ALIAS='chat-disabled')
+    def test_disabled_cache(self):
+        """Тест, что с отключенным кэшем ответы читаются из БД, а ETag работает."""
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        self.client.post(reverse('message-create', args=[self.chat.id]), {"text": "Новое"}, format='json')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['messages'][0]['text'], "Новое")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_second_read_is_served_from_cache(self):
+        """Тест, что повторное чтение не обращается к БД."""
+        stats = chat_cache.get_stats()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(chat_cache.get_stats()['hits'], stats['hits'] + 1)
+        self.assertEqual(chat_cache.get_stats()['misses'], stats['misses'] + 1)
+
+    def test_cache_is_keyed_by_limit(self):
+        """Тест, что разные limit кэшируются отдельно."""
+        self.client.get(self.url)
+        response = self.client.get(self.url + '?limit=1')
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['messages']), 1)
+
+    def test_new_message_invalidates_cache(self):
+        """Тест, что отправка сообщения сбрасывает кэш."""
+        self.client.get(self.url)
+        self.client.post(reverse('message-create', args=[self.chat.id]), {"text": "Новое"}, format='json')
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['messages'][0]['text'], "Новое")
+
+    def test_bulk_create_invalidates_cache(self):
+        """Тест, что массовая загрузка сбрасывает кэш."""
+        self.client.get(self.url)
+        self.client.post(reverse('message-bulk-create', args=[self.chat.id]), [{"text": "Новое"}], format='json')
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data['messages'][0]['text'], "Новое")
+
+    def test_delete_invalidates_cache(self):
+        """Тест, что удаление чата сбрасывает кэш."""
+        self.client.get(self.url)
+        self.client.delete(self.url)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalidation_after_commit(self):
+        """Тест, что кэш сбрасывается и после фиксации транзакции."""
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(chat=self.chat, text="Новое")
+            # Читатель между записью и фиксацией кэширует данные
+            self.client.get(self.url)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_cursor_pages_are_not_cached(self):
+        """Тест, что страницы по курсору не кэшируются."""
+        cursor = self.client.get(self.url + '?limit=1').data['next']
+
+        response = self.client.get(self.url + f'?limit=1&before={cursor}')
+
+        self.assertFalse(response.has_header('X-Cache'))
+
+
+class ChatDetailConditionalTests(TestCase):
+    """Тесты для ETag ответа ChatDetailView."""
+
+    def setUp(self):
+        """Создаем чат с сообщениями и очищаем кэш."""
+        cache.clear()
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        for i in range(3):
+            self.last_message = Message.objects.create(chat=self.chat, text=f"Сообщение {i}")
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+    def test_validators_in_response(self):
+        """Тест заголовка ETag; Last-Modified (точность - секунда) не отдается."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['ETag'].startswith(f'W/"{self.chat.id}-'))
+        self.assertNotIn('Last-Modified', response)
+
+    def test_message_in_same_second(self):
+        """Тест, что сообщение, отправленное в ту же секунду, не скрывается ответом 304."""
+        self.client.get(self.url)
+        self.client.post(reverse('message-create', args=[self.chat.id]), {"text": "Новое"}, format='json')
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['messages'][0]['text'], "Новое")
+
+    def test_edited_message_changes_etag(self):
+        """Тест, что изменение текста сообщения меняет ETag."""
+        etag = self.client.get(self.url)['ETag']
+        self.last_message.text = "Исправлено"
+        self.last_message.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['messages'][0]['text'], "Исправлено")
+
+    def test_etag_depends_on_format(self):
+        """Тест, что ETag ответа JSON не подтверждает ответ MessagePack и наоборот."""
+        with mock.patch.object(ChatDetailView, 'renderer_classes', [JSONRenderer, MessagePackRenderer]):
+            etag = self.client.get(self.url)['ETag']
+
+            response = self.client.get(self.url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            self.assertNotEqual(response['ETag'], etag)
+
+            response = self.client.get(self.url, HTTP_ACCEPT='application/json; indent=2', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_not_modified(self):
+        """Тест ответа 304 без обращений к БД при совпадении ETag."""
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_not_modified_cold_validator_costs_one_query(self):
+        """Тест, что без кэша валидатор считается одним запросом."""
+        etag = self.client.get(self.url)['ETag']
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_new_message_changes_etag(self):
+        """Тест, что новое сообщение меняет ETag."""
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('message-create', args=[self.chat.id]), {"text": "Новое"}, format='json')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_deleted_message_changes_etag(self):
+        """Тест, что удаление старого сообщения меняет ETag."""
+        etag = self.client.get(self.url)['ETag']
+        Message.objects.filter(chat=self.chat).order_by('id').first().delete()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_page(self):
+        """Тест, что разные limit дают разные ETag."""
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url + '?limit=1', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_nonexistent_chat(self):
+        """Тест, что для несуществующего чата условные заголовки не дают 304."""
+        url = reverse('chat-detail', args=[999])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MessagePaginationTests(TestCase):
+    """Тесты для курсорной пагинации истории сообщений."""
+
+    def setUp(self):
+        """Создаем чат с 25 сообщениями."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+        self.message_ids = [
+            Message.objects.create(chat=self.chat, text=f"Сообщение {i}").id
+            for i in range(25)
+        ]
+
+    def test_first_page_has_next_cursor(self):
+        """Тест первой страницы: есть курсор на более старые сообщения."""
+        response = self.client.get(self.url + '?limit=10')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [m['id'] for m in response.data['messages']]
+        self.assertEqual(ids, self.message_ids[::-1][:10])
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['prev'])
+
+    def test_walk_history_with_before(self):
+        """Тест обхода всей истории по курсору before без пропусков и повторов."""
+        seen = []
+        url = self.url + '?limit=10'
+
+        while True:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(m['id'] for m in response.data['messages'])
+            if response.data['next'] is None:
+                break
+            url = self.url + f"?limit=10&before={response.data['next']}"
+
+        self.assertEqual(seen, self.message_ids[::-1])
+
+    def test_after_returns_newer_messages(self):
+        """Тест курсора after: возвращаются только более новые сообщения."""
+        response = self.client.get(self.url + '?limit=10')
+        response = self.client.get(self.url + f"?limit=10&before={response.data['next']}")
+        prev_cursor = response.data['prev']
+
+        response = self.client.get(self.url + f"?limit=5&after={prev_cursor}")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [m['id'] for m in response.data['messages']]
+        self.assertEqual(ids, self.message_ids[::-1][5:10])
+        self.assertIsNotNone(response.data['prev'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_same_created_at_ordered_by_id(self):
+        """Тест сообщений с одинаковым временем: порядок задается id."""
+        Message.objects.filter(chat=self.chat).update(
+            created_at=Message.objects.filter(chat=self.chat).first().created_at
+        )
+
+        response = self.client.get(self.url + '?limit=20')
+        response = self.client.get(self.url + f"?limit=20&before={response.data['next']}")
+
+        ids = [m['id'] for m in response.data['messages']]
+        self.assertEqual(ids, self.message_ids[::-1][20:])
+
+    def test_invalid_cursor(self):
+        """Тест некорректного курсора."""
+        response = self.client.get(self.url + '?before=abc')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detail', response.data)
+
+    def test_before_and_after_together(self):
+        """Тест одновременной передачи before и after."""
+        response = self.client.get(self.url + '?limit=10')
+        cursor = response.data['next']
+
+        response = self.client.get(self.url + f"?before={cursor}&after={cursor}")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_before_page_uses_index(self):
+        """Тест, что страница по курсору читается из индекса без сортировки."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE message')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url + '?limit=10')
+            self.client.get(self.url + f"?limit=10&before={response.data['next']}")
+
+        page_sql = queries.captured_queries[-1]['sql']
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + page_sql)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('message_chat_created_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+
+class MessageSearchTests(TestCase):
+    """Тесты для полнотекстового поиска по сообщениям."""
+
+    # Слова в нижнем регистре: результат не зависит от локали кластера БД
+
+    def setUp(self):
+        """Создаем чаты с сообщениями."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        self.other_chat = Chat.objects.create(title="Другой чат")
+        self.url = reverse('message-search-chat', args=[self.chat.id])
+
+        self.both = Message.objects.create(chat=self.chat, text="отчет по проекту и отчет по бюджету")
+        self.one = Message.objects.create(chat=self.chat, text="новый отчет готов")
+        Message.objects.create(chat=self.chat, text="привет всем")
+        self.other = Message.objects.create(chat=self.other_chat, text="отчет в другом чате")
+
+    def test_search_in_chat(self):
+        """Тест поиска в чате: только совпадения этого чата, сначала более релевантные."""
+        response = self.client.get(self.url + '?q=отчет')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [m['id'] for m in response.data['results']]
+        self.assertEqual(ids, [self.both.id, self.one.id])
+        ranks = [m['rank'] for m in response.data['results']]
+        self.assertGreater(ranks[0], ranks[1])
+        self.assertIsNone(response.data['next'])
+
+    def test_search_uses_stemming(self):
+        """Тест, что находятся другие словоформы."""
+        message = Message.objects.create(chat=self.chat, text="пришло новое сообщение")
+
+        response = self.client.get(self.url + '?q=сообщениями')
+
+        ids = [m['id'] for m in response.data['results']]
+        self.assertEqual(ids, [message.id])
+
+    def test_search_websearch_syntax(self):
+        """Тест синтаксиса запроса: исключение слова."""
+        response = self.client.get(self.url + '?q=отчет -бюджет')
+
+        ids = [m['id'] for m in response.data['results']]
+        self.assertEqual(ids, [self.one.id])
+
+    def test_global_search(self):
+        """Тест поиска по всем чатам без удаляемых."""
+        response = self.client.get(reverse('message-search') + '?q=отчет')
+
+        ids = {m['id'] for m in response.data['results']}
+        self.assertEqual(ids, {self.both.id, self.one.id, self.other.id})
+
+        Chat.objects.filter(id=self.other_chat.id).update(is_deleting=True)
+        response = self.client.get(reverse('message-search') + '?q=отчет')
+
+        ids = {m['id'] for m in response.data['results']}
+        self.assertEqual(ids, {self.both.id, self.one.id})
+
+    def test_walk_results_with_cursor(self):
+        """Тест обхода результатов по курсору без пропусков и повторов."""
+        expected = [
+            Message.objects.create(chat=self.chat, text=f"заметка {i}").id
+            for i in range(7)
+        ]
+        seen = []
+        url = self.url + '?q=заметка&limit=3'
+
+        while True:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(m['id'] for m in response.data['results'])
+            if response.data['next'] is None:
+                break
+            url = self.url + f"?q=заметка&limit=3&cursor={response.data['next']}"
+
+        # Одинаковый rank - порядок от новых к старым
+        self.assertEqual(seen, expected[::-1])
+
+    def test_empty_query(self):
+        """Тест, что пустой запрос отклоняется."""
+        response = self.client.get(self.url + '?q=%20')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_cursor(self):
+        """Тест, что некорректный курсор отклоняется."""
+        response = self.client.get(self.url + '?q=отчет&cursor=bm90LWEtY3Vyc29y')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_nonexistent_chat(self):
+        """Тест поиска в несуществующем чате."""
+        response = self.client.get(reverse('message-search-chat', args=[999]) + '?q=отчет')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_uses_index(self):
+        """Тест, что поиск читает индекс message_text_search_idx."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE message')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        plan = Message.objects.search('отчет').explain()
+
+        self.assertIn('message_text_search_idx', plan)
+
+
+class MessageCreateViewTests(TestCase):
+    """Тесты для MessageCreateView (отправка сообщений)."""
+
+    def setUp(self):
+        """Создаем тестовые данные."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+
+    def test_create_message_success(self):
+        """Тест успешной отправки сообщения."""
+        url = reverse('message-create', args=[self.chat.id])
+        data = {"text": "Тестовое сообщение"}
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['text'], "Тестовое сообщение")
+        self.assertEqual(response.data['chat'], self.chat.id)
+        self.assertIn('id', response.data)
+        self.assertIn('created_at', response.data)
+
+        # Проверяем, что сообщение создано в БД
+        message = Message.objects.get(id=response.data['id'])
+        self.assertEqual(message.text, "Тестовое сообщение")
+        self.assertEqual(message.chat.id, self.chat.id)
+
+    def test_integrity_errors(self):
+        """Тест, что 404 дает только нарушение FK, прочие ошибки целостности - 500."""
+        url = reverse('message-create', args=[self.chat.id])
+        for cause, expected in (
+            (psycopg.errors.ForeignKeyViolation(), status.HTTP_404_NOT_FOUND),
+            (psycopg.errors.CheckViolation(), status.HTTP_500_INTERNAL_SERVER_ERROR),
+            (psycopg.errors.UniqueViolation(), status.HTTP_500_INTERNAL_SERVER_ERROR),
+        ):
+            error = IntegrityError()
+            error.__cause__ = cause
+            with mock.patch.object(Message.objects, 'create_for_chat', side_effect=error):
+                response = self.client.post(url, {"text": "Сообщение"}, format='json')
+            self.assertEqual(response.status_code, expected, type(cause).__name__)
+
+    def test_create_message_with_spaces(self):
+        """Тест отправки сообщения с пробелами по краям."""
+        url = reverse('message-create', args=[self.chat.id])
+        data = {"text": "  Сообщение с пробелами  "}
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['text'], "Сообщение с пробелами")
+
+    def test_create_message_empty_text(self):
+        """Тест отправки сообщения с пустым текстом."""
+        url = reverse('message-create', args=[self.chat.id])
+        data = {"text": ""}
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('text', response.data)
+
+    def test_create_message_too_long_text(self):
+        """Тест отправки сообщения со слишком длинным текстом."""
+        url = reverse('message-create', args=[self.chat.id])
+        data = {"text": "A" * 5001}
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('text', response.data)
+
+    def test_create_message_missing_text(self):
+        """Тест отправки сообщения без поля text."""
+        url = reverse('message-create', args=[self.chat.id])
+        data = {}
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('text', response.data)
+
+    def test_create_message_in_nonexistent_chat(self):
+        """Тест отправки сообщения в несуществующий чат."""
+        url = reverse('message-create', args=[999])
+        data = {"text": "Сообщение"}
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['detail'], "Чат не найден")
+
+    def test_create_message_single_query(self):
+        """Тест, что отправка сообщения стоит ровно одного запроса к БД."""
+        url = reverse('message-create', args=[self.chat.id])
+
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {"text": "Сообщение"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Message.objects.filter(id=response.data['id'], chat=self.chat).exists())
+
+    def test_create_message_in_nonexistent_chat_single_query(self):
+        """Тест, что 404 для несуществующего чата тоже стоит одного запроса."""
+        url = reverse('message-create', args=[999])
+
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {"text": "Сообщение"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_wrong_http_method(self):
+        """Тест использования неверного HTTP метода."""
+        url = reverse('message-create', args=[self.chat.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class MessageBulkCreateViewTests(TestCase):
+    """Тесты для MessageBulkCreateView (массовая загрузка сообщений)."""
+
+    def setUp(self):
+        """Создаем тестовые данные."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        self.url = reverse('message-bulk-create', args=[self.chat.id])
+
+    def test_bulk_create_success(self):
+        """Тест успешной массовой загрузки."""
+        data = [{"text": f"Сообщение {i}"} for i in range(10)]
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 10)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 10)
+
+        # Порядок сообщений в чате совпадает с порядком в запросе
+        texts = list(Message.objects.filter(chat=self.chat).values_list('text', flat=True))
+        self.assertEqual(texts, [f"Сообщение {i}" for i in range(10)])
+
+    def test_bulk_create_trims_and_reports_errors(self):
+        """Тест тримминга и ошибок по отдельным сообщениям."""
+        data = [
+            {"text": "  Первое  "},
+            {"text": "   "},
+            {"text": "A" * 5001},
+            {},
+            "не объект",
+            {"text": "Последнее"},
+        ]
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['index'] for item in response.data['created']], [0, 5])
+        self.assertEqual([item['index'] for item in response.data['errors']], [1, 2, 3, 4])
+        self.assertIn('text', response.data['errors'][0]['errors'])
+
+        message = Message.objects.get(id=response.data['created'][0]['id'])
+        self.assertEqual(message.text, "Первое")
+
+    def test_bulk_create_all_invalid(self):
+        """Тест загрузки, в которой нет ни одного корректного сообщения."""
+        response = self.client.post(self.url, [{"text": ""}], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data['errors']), 1)
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_bulk_create_ndjson(self):
+        """Тест загрузки в формате NDJSON."""
+        body = '\n'.join(json.dumps({"text": f"Сообщение {i}"}) for i in range(3)) + '\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 3)
+
+    def test_bulk_create_invalid_ndjson(self):
+        """Тест некорректного NDJSON."""
+        response = self.client.post(self.url, '{"text": "ok"}\n{oops', content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_not_a_list(self):
+        """Тест тела запроса, которое не является массивом."""
+        response = self.client.post(self.url, {"text": "Сообщение"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_too_many(self):
+        """Тест превышения максимального размера загрузки."""
+        data = [{"text": "Сообщение"}] * 3
+        with self.settings(CHAT_BULK_MAX_MESSAGES=2):
+            response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_bulk_create_body_too_large(self):
+        """Тест, что слишком большое тело отклоняется по Content-Length без разбора."""
+        data = [{"text": "Сообщение"}] * 100
+        with self.settings(CHAT_BULK_MAX_BODY_SIZE=1000):
+            with mock.patch.object(JSONParser, 'parse') as parse:
+                response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], "Тело запроса больше 1000 байт")
+        parse.assert_not_called()
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_bulk_create_ndjson_too_many(self):
+        """Тест, что NDJSON читается только до первого сообщения сверх лимита."""
+        # Строка после лимита некорректна: до нее разбор доходить не должен
+        body = '{"text": "1"}\n{"text": "2"}\n{"text": "3"}\n{oops\n'
+        with self.settings(CHAT_BULK_MAX_MESSAGES=2):
+            response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], "Можно загрузить не более 2 сообщений за запрос")
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_bulk_create_batches(self):
+        """Тест, что вставка идет пачками bulk_create."""
+        data = [{"text": f"Сообщение {i}"} for i in range(5)]
+        with self.settings(CHAT_BULK_BATCH_SIZE=2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_bulk_create_batches_not_reported_as_duplicates(self):
+        """Тест, что пачки INSERT не попадают в лог как повторяющиеся запросы (N+1)."""
+        data = [{"text": f"Сообщение {i}"} for i in range(5)]
+        with self.settings(CHAT_BULK_BATCH_SIZE=2, QUERY_BUDGET_DUPLICATE_THRESHOLD=2):
+            with self.assertNoLogs('chat_app.querybudget', 'WARNING'):
+                response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_create_in_nonexistent_chat(self):
+        """Тест загрузки в несуществующий чат."""
+        url = reverse('message-bulk-create', args=[999])
+        response = self.client.post(url, [{"text": "Сообщение"}], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['detail'], "Чат не найден")
+
+
+class PubSubTests(TestCase):
+    """Тесты для in-process pub/sub."""
+
+    async def test_publish_from_another_thread(self):
+        """Тест доставки события, опубликованного из другого потока."""
+        backend = InMemoryBackend()
+        subscription = backend.subscribe(1)
+
+        thread = threading.Thread(target=backend.publish, args=(1, {"id": 1}))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(await subscription.get(timeout=1), {"id": 1})
+        subscription.close()
+        self.assertFalse(backend.has_subscribers(1))
+
+    async def test_publish_only_to_chat_subscribers(self):
+        """Тест, что события получают только подписчики нужного чата."""
+        backend = InMemoryBackend()
+        subscription = backend.subscribe(1)
+
+        backend.publish(2, {"id": 1})
+        await asyncio.sleep(0)
+
+        self.assertTrue(subscription.queue.empty())
+        subscription.close()
+
+    async def test_overflow(self):
+        """Тест переполнения очереди медленного подписчика."""
+        backend = InMemoryBackend()
+        with self.settings(CHAT_PUBSUB_QUEUE_SIZE=1):
+            subscription = backend.subscribe(1)
+
+        backend.publish(1, {"id": 1})
+        backend.publish(1, {"id": 2})
+        await asyncio.sleep(0)
+
+        self.assertTrue(subscription.overflowed)
+        subscription.close()
+
+    def test_message_create_publishes(self):
+        """Тест, что отправка сообщения публикует его после фиксации транзакции."""
+        chat = Chat.objects.create(title="Тестовый чат")
+        url = reverse('message-create', args=[chat.id])
+
+        with mock.patch.object(pubsub, 'publish_messages') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = APIClient().post(url, {"text": "Сообщение"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        publish.assert_called_once()
+        chat_id, messages = publish.call_args.args
+        self.assertEqual(chat_id, chat.id)
+        self.assertEqual([m.id for m in messages], [response.data['id']])
+
+
+class PostgresPubSubTests(TransactionTestCase):
+    """Тесты для PostgresBackend (pub/sub между процессами через LISTEN/NOTIFY)."""
+
+    def backend(self):
+        backend = pubsub.PostgresBackend()
+        self.addCleanup(backend.close)
+        return backend
+
+    async def subscribe(self, chat_id):
+        """Подписка слушающего воркера; ждем, пока слушатель выполнит LISTEN."""
+        listener = self.backend()
+        subscription = listener.subscribe(chat_id)
+        self.addCleanup(subscription.close)
+        self.assertTrue(await sync_to_async(listener.wait_listening)(5))
+        return listener, subscription
+
+    async def test_publish_between_processes(self):
+        """Тест, что событие из одного бэкенда (воркера) доходит до подписчиков другого."""
+        listener, subscription = await self.subscribe(1)
+        publisher = self.backend()
+
+        self.assertTrue(publisher.has_subscribers(1))
+        await sync_to_async(publisher.publish)(2, {"id": 1, "text": "Другой чат"})
+        await sync_to_async(publisher.publish)(1, {"id": 2, "text": "Сообщение"})
+
+        self.assertEqual(await subscription.get(timeout=5), {"id": 2, "text": "Сообщение"})
+        self.assertTrue(subscription.queue.empty())
+
+    async def test_large_payload(self):
+        """Тест, что событие больше предела NOTIFY (8000 байт) передается по id и читается из БД."""
+        chat = await Chat.objects.acreate(title="Тестовый чат")
+        message = await Message.objects.acreate(chat=chat, text="Сообщение " * 450)
+        listener, subscription = await self.subscribe(chat.id)
+
+        payload = MessageSerializer(message).data
+        await sync_to_async(self.backend().publish)(chat.id, payload)
+
+        self.assertEqual(await subscription.get(timeout=5), payload)
+
+    async def test_resync(self):
+        """Тест, что после потери событий подписчики получают resync."""
+        listener, subscription = await self.subscribe(1)
+
+        listener.resync_all()
+
+        self.assertIsNone(await subscription.get(timeout=1))
+        self.assertTrue(subscription.overflowed)
+
+    def test_backend_for_several_processes(self):
+        """Тест выбора бэкенда pub/sub по числу воркеров."""
+        self.assertEqual(
+            project_settings._chat_pubsub_backend(None, 1), 'chat_app.pubsub.InMemoryBackend'
+        )
+        self.assertEqual(
+            project_settings._chat_pubsub_backend(None, 4), 'chat_app.pubsub.PostgresBackend'
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            project_settings._chat_pubsub_backend('chat_app.pubsub.InMemoryBackend', 4)
+
+
+class ChatEventsViewTests(TestCase):
+    """Тесты для ChatEventsView (поток событий чата)."""
+
+    def setUp(self):
+        """Создаем чат с сообщениями."""
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        self.messages = [
+            Message.objects.create(chat=self.chat, text=f"Сообщение {i}")
+            for i in range(3)
+        ]
+        self.url = reverse('chat-events', args=[self.chat.id])
+
+    async def test_resume_from_last_event_id(self):
+        """Тест продолжения потока с последнего полученного сообщения."""
+        response = await self.async_client.get(
+            self.url,
+            headers={'Last-Event-ID': str(self.messages[0].id)}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        events = [await anext(stream), await anext(stream)]
+
+        self.assertIn(f"id: {self.messages[1].id}".encode(), events[0])
+        self.assertIn("Сообщение 1".encode(), events[0])
+        self.assertIn(f"id: {self.messages[2].id}".encode(), events[1])
+
+    async def test_resume_in_chunks(self):
+        """Тест, что пропущенные сообщения читаются пачками и приходят по порядку."""
+        with self.settings(CHAT_EVENTS_REPLAY_CHUNK_SIZE=2):
+            response = await self.async_client.get(self.url + '?last_id=0')
+            stream = aiter(response.streaming_content)
+            events = [await anext(stream) for _ in self.messages]
+
+        for message, event in zip(self.messages, events):
+            self.assertIn(f"id: {message.id}".encode(), event)
+
+    async def test_replayed_message_not_repeated(self):
+        """Тест, что сообщение, уже отданное из БД, не повторяется из pub/sub."""
+        response = await self.async_client.get(
+            self.url,
+            headers={'Last-Event-ID': str(self.messages[0].id)}
+        )
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        await anext(stream)
+
+        message = await Message.objects.acreate(chat=self.chat, text="Новое")
+        await sync_to_async(pubsub.publish_messages)(self.chat.id, [self.messages[2], message])
+
+        event = await asyncio.wait_for(anext(stream), timeout=1)
+        self.assertIn(f"id: {message.id}".encode(), event)
+
+    async def test_live_message(self):
+        """Тест доставки нового сообщения подписчику."""
+        response = await self.async_client.get(self.url)
+        stream = aiter(response.streaming_content)
+        next_event = asyncio.ensure_future(anext(stream))
+
+        backend = pubsub.get_backend()
+        while not backend.has_subscribers(self.chat.id):
+            await asyncio.sleep(0.01)
+
+        message = await Message.objects.acreate(chat=self.chat, text="Новое")
+        await sync_to_async(pubsub.publish_messages)(self.chat.id, [message])
+
+        event = await asyncio.wait_for(next_event, timeout=1)
+        self.assertIn(f"id: {message.id}".encode(), event)
+        self.assertIn("Новое".encode(), event)
+
+    def test_wsgi_not_supported(self):
+        """Тест, что под WSGI поток событий не открывается (ответ 501)."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    async def test_nonexistent_chat(self):
+        """Тест подписки на несуществующий чат."""
+        response = await self.async_client.get(reverse('chat-events', args=[999]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_invalid_last_id(self):
+        """Тест некорректного last_id."""
+        response = await self.async_client.get(self.url + '?last_id=abc')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ChatLongPollTests(TestCase):
+    """Тесты для long polling новых сообщений (since/wait)."""
+
+    def setUp(self):
+        """Создаем чат с сообщениями."""
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        self.messages = [
+            Message.objects.create(chat=self.chat, text=f"Сообщение {i}")
+            for i in range(5)
+        ]
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+    async def test_since_returns_only_delta(self):
+        """Тест, что since возвращает только новые сообщения."""
+        response = await self.async_client.get(self.url + f"?since={self.messages[2].id}")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['title'], "Тестовый чат")
+        self.assertEqual(
+            [m['id'] for m in data['messages']],
+            [self.messages[4].id, self.messages[3].id]
+        )
+
+    async def test_since_respects_limit(self):
+        """Тест, что дельта ограничена limit и начинается с самых старых новых сообщений."""
+        response = await self.async_client.get(self.url + f"?since={self.messages[0].id}&limit=2")
+
+        self.assertEqual(
+            [m['id'] for m in response.json()['messages']],
+            [self.messages[2].id, self.messages[1].id]
+        )
+
+    async def test_wait_times_out_without_messages(self):
+        """Тест, что ожидание завершается пустым ответом по таймауту."""
+        response = await self.async_client.get(self.url + f"?since={self.messages[4].id}&wait=0.05")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['messages'], [])
+
+    async def test_wait_wakes_up_on_new_message(self):
+        """Тест, что ожидание прерывается публикацией нового сообщения."""
+        request = asyncio.ensure_future(
+            self.async_client.get(self.url + f"?since={self.messages[4].id}&wait=5")
+        )
+
+        backend = pubsub.get_backend()
+        while not backend.has_subscribers(self.chat.id):
+            await asyncio.sleep(0.01)
+
+        message = await Message.objects.acreate(chat=self.chat, text="Новое")
+        await sync_to_async(pubsub.publish_messages)(self.chat.id, [message])
+
+        response = await asyncio.wait_for(request, timeout=1)
+        self.assertEqual([m['id'] for m in response.json()['messages']], [message.id])
+
+    async def test_wait_releases_connection(self):
+        """Тест, что на время ожидания соединение с БД возвращается."""
+        with mock.patch.object(db, 'release_connection') as release:
+            await self.async_client.get(self.url + f"?since={self.messages[4].id}&wait=0.01")
+            self.assertEqual(release.call_count, 1)
+
+            # Без ожидания соединение не отпускается
+            await self.async_client.get(self.url + f"?since={self.messages[3].id}&wait=1")
+            self.assertEqual(release.call_count, 1)
+
+    async def test_invalid_params(self):
+        """Тест некорректных since/wait."""
+        for query in ('since=abc', 'since=-1', f'since={self.messages[0].id}&wait=abc'):
+            response = await self.async_client.get(self.url + '?' + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_nonexistent_chat(self):
+        """Тест long polling несуществующего чата."""
+        response = await self.async_client.get(reverse('chat-detail', args=[999]) + '?since=0')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json()['detail'], "Чат не найден")
+
+    def test_max_wait_for_sync_workers(self):
+        """Тест, что ожидание не доходит до таймаута синхронного воркера gunicorn."""
+        self.assertEqual(project_settings._long_poll_max_wait(60, 0), 60)
+        self.assertEqual(project_settings._long_poll_max_wait(60, 30), 15)
+        self.assertEqual(project_settings._long_poll_max_wait(10, 30), 10)
+
+    def test_since_under_wsgi(self):
+        """Тест long polling через синхронный (WSGI) обработчик."""
+        response = self.client.get(self.url + f"?since={self.messages[3].id}")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['id'] for m in response.json()['messages']], [self.messages[4].id])
+
+    @override_settings(ROOT_URLCONF='chat_project.urls')
+    def test_detail_view_is_sync(self):
+        """Тест, что без since запрос обслуживает синхронный ChatDetailView без обертки."""
+        match = resolve(self.url)
+
+        self.assertIs(match.func.view_class, ChatDetailView)
+        self.assertFalse(asyncio.iscoroutinefunction(match.func))
+        with mock.patch('chat_app.views._chat_messages_since') as long_poll:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        long_poll.assert_not_called()
+
+
+class HealthViewTests(TestCase):
+    """Тесты для HealthView и статистики пула соединений."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('health')
+
+    def test_health_ok(self):
+        """БД доступна: возвращаются настройки соединений и статистика пула."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'ok')
+        self.assertIn('conn_max_age', response.data['database'])
+        self.assertIn('pool', response.data['database'])
+
+    def test_pool_stats_without_pool(self):
+        """Без пула статистика пула - None."""
+        with mock.patch.object(type(connections['default']), 'pool', new_callable=mock.PropertyMock, return_value=None):
+            self.assertIsNone(db.pool_stats())
+
+    def test_release_connection_keeps_transaction(self):
+        """Внутри транзакции соединение не закрывается."""
+        with mock.patch.object(connections['default'], 'close') as close:
+            db.release_connection()
+        close.assert_not_called()
+
+    def test_health_database_unavailable(self):
+        """Если БД не отвечает, возвращается 503."""
+        with mock.patch.object(connection, 'cursor', side_effect=OperationalError):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data['status'], 'unavailable')
+
+    def test_pool_stats(self):
+        """Статистика пула: занятые, свободные соединения и время ожидания."""
+        pool = mock.Mock()
+        pool.get_stats.return_value = {
+            'pool_min': 2,
+            'pool_max': 10,
+            'pool_size': 4,
+            'pool_available': 1,
+            'requests_waiting': 0,
+            'requests_num': 8,
+            'requests_wait_ms': 20,
+        }
+
+        with mock.patch.object(type(connections['default']), 'pool', new_callable=mock.PropertyMock, return_value=pool):
+            stats = db.pool_stats()
+
+        self.assertEqual(stats['in_use'], 3)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['max_size'], 10)
+        self.assertEqual(stats['wait_ms_avg'], 2.5)
+        self.assertEqual(stats['timeouts'], 0)
+
+
+class APIFormatTests(TestCase):
+    """Тесты настраиваемых форматов API и MessagePack."""
+
+    def setUp(self):
+        """Создаем чат с сообщениями."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        for i in range(3):
+            Message.objects.create(chat=self.chat, text=f"Сообщение {i}")
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+    def test_api_classes_from_environment(self):
+        """Тест выбора классов по списку имен из переменной окружения."""
+        with mock.patch.dict('os.environ', {'API_RENDERERS': 'json, msgpack'}):
+            classes = project_settings._api_classes(
+                'API_RENDERERS', 'json', project_settings.API_RENDERER_CHOICES
+            )
+
+        self.assertEqual(classes, [
+            'chat_app.renderers.JSONRenderer',
+            'chat_app.renderers.MessagePackRenderer',
+        ])
+
+    def test_api_classes_unknown_name(self):
+        """Тест, что неизвестный формат - ошибка конфигурации."""
+        with mock.patch.dict('os.environ', {'API_RENDERERS': 'json,yaml'}):
+            with self.assertRaises(ImproperlyConfigured):
+                project_settings._api_classes(
+                    'API_RENDERERS', 'json', project_settings.API_RENDERER_CHOICES
+                )
+
+    def test_msgpack_round_trip(self):
+        """Тест, что парсер восстанавливает данные рендерера (даты - как в JSON)."""
+        message = Message.objects.first()
+        data = MessageSerializer(message).data
+
+        content = MessagePackRenderer().render({'messages': [data], 'next': None})
+        parsed = MessagePackParser().parse(BytesIO(content))
+
+        self.assertEqual(parsed, json.loads(JSONRenderer().render({'messages': [data], 'next': None})))
+
+    def test_msgpack_invalid_body(self):
+        """Тест ошибки разбора некорректного тела."""
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(BytesIO(b'\xc1'))
+
+    def test_get_chat_as_msgpack(self):
+        """Тест ответа GET /chats/{id}/ в MessagePack при включенном формате."""
+        json_response = self.client.get(self.url)
+
+        with mock.patch.object(ChatDetailView, 'renderer_classes', [JSONRenderer, MessagePackRenderer]):
+            response = self.client.get(self.url, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(json_response.content))
+        self.assertLess(len(response.content), len(json_response.content))
+
+    def test_bulk_upload_as_msgpack(self):
+        """Тест массовой загрузки в MessagePack при включенном формате."""
+        url = reverse('message-bulk-create', args=[self.chat.id])
+        body = msgpack.packb([{'text': "Первое"}, {'text': "Второе"}])
+
+        with mock.patch.object(MessageBulkCreateView, 'parser_classes', [JSONParser, NDJSONParser, MessagePackParser]):
+            response = self.client.post(url, body, content_type='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 2)
+
+    def test_msgpack_not_accepted_when_disabled(self):
+        """Тест, что без включения формата MessagePack не принимается."""
+        url = reverse('message-create', args=[self.chat.id])
+
+        response = self.client.post(url, msgpack.packb({'text': "Сообщение"}), content_type='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+
+class CompressionTests(TestCase):
+    """Тесты сжатия ответов."""
+
+    def setUp(self):
+        """Создаем чат с длинными сообщениями."""
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        for i in range(20):
+            Message.objects.create(chat=self.chat, text=f"Сообщение {i} " + "длинный текст " * 40)
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+    def test_negotiate(self):
+        """Тест выбора кодировки по Accept-Encoding."""
+        encodings = ['zstd', 'br', 'gzip']
+
+        self.assertEqual(negotiate('gzip, br, zstd', encodings), 'zstd')
+        self.assertEqual(negotiate('gzip, deflate, br', encodings), 'br')
+        self.assertEqual(negotiate('gzip;q=1.0, zstd;q=0.5', encodings), 'gzip')
+        self.assertEqual(negotiate('zstd;q=0, *', encodings), 'br')
+        self.assertEqual(negotiate('identity', encodings), None)
+        self.assertEqual(negotiate('', encodings), None)
+
+    def test_compressed_responses(self):
+        """Тест, что каждая кодировка дает то же тело после распаковки."""
+        plain = self.client.get(self.url).content
+        decompress = {
+            'gzip': lambda data: zlib.decompress(data, 31),
+            'br': brotli.decompress,
+            'zstd': zstandard.ZstdDecompressor().decompress,
+        }
+
+        for encoding, func in decompress.items():
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=encoding)
+
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertEqual(int(response['Content-Length']), len(response.content))
+            self.assertLess(len(response.content), len(plain))
+            self.assertEqual(func(response.content), plain)
+
+    def test_vary_without_accept_encoding(self):
+        """Тест, что несжатый большой ответ помечен Vary: Accept-Encoding."""
+        response = self.client.get(self.url)
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_small_response_not_compressed(self):
+        """Тест, что ответ меньше порога не сжимается."""
+        response = self.client.get(reverse('chat-list'), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertLess(len(response.content), 1024)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_min_size_setting(self):
+        """Тест настройки порога."""
+        with self.settings(COMPRESSION_MIN_SIZE=10):
+            response = self.client.get(reverse('chat-list'), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    async def test_event_stream_flushed_per_event(self):
+        """Тест, что каждое событие SSE распаковывается сразу, без конца потока."""
+        response = await self.async_client.get(
+            reverse('chat-events', args=[self.chat.id]) + '?last_id=0',
+            headers={'Accept-Encoding': 'gzip'}
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        decompressor = zlib.decompressobj(31)
+        stream = aiter(response.streaming_content)
+        first = decompressor.decompress(await anext(stream))
+
+        self.assertTrue(first.startswith(b'id: '))
+        self.assertTrue(first.endswith(b'\n\n'))
+
+
+class QueueLoggingTests(TestCase):
+    """Тесты для очереди логов и JSON-форматтера."""
+
+    def make_record(self, msg, *args, **extra):
+        record = logging.makeLogRecord({'name': 'chat_app.tests', 'levelno': logging.INFO,
+                                        'levelname': 'INFO', 'msg': msg, 'args': args})
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter(self):
+        """Запись форматируется в JSON с подставленными аргументами и полями extra."""
+        line = JSONFormatter().format(self.make_record("Получен чат %s", 7, chat_id=7))
+        data = json.loads(line)
+
+        self.assertEqual(data['message'], "Получен чат 7")
+        self.assertEqual(data['level'], 'INFO')
+        self.assertEqual(data['logger'], 'chat_app.tests')
+        self.assertEqual(data['chat_id'], 7)
+
+    def test_record_not_formatted_in_caller(self):
+        """Сообщение не форматируется при постановке в очередь."""
+        handler = BoundedQueueHandler(queue.Queue(10))
+        handler.handle(self.make_record("Чат %s", 1))
+
+        record = handler.queue.get_nowait()
+        self.assertEqual(record.msg, "Чат %s")
+        self.assertEqual(record.args, (1,))
+
+    def test_drop_new_on_overflow(self):
+        """При переполнении новые записи отбрасываются, потеря попадает в лог."""
+        handler = BoundedQueueHandler(queue.Queue(2), overflow='drop_new')
+        for i in range(4):
+            handler.handle(self.make_record("Запись %s", i))
+
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual([handler.queue.get_nowait().args for _ in range(2)], [(0,), (1,)])
+
+        handler.handle(self.make_record("Запись %s", 4))
+        report = handler.queue.get_nowait()
+        self.assertEqual(report.levelno, logging.WARNING)
+        self.assertEqual(report.getMessage(), "Очередь логов переполнена, потеряно записей: 2")
+        self.assertEqual(handler.queue.get_nowait().args, (4,))
+
+    def test_drop_oldest_on_overflow(self):
+        """При политике drop_oldest в очереди остаются самые новые записи."""
+        handler = BoundedQueueHandler(queue.Queue(2), overflow='drop_oldest')
+        for i in range(4):
+            handler.handle(self.make_record("Запись %s", i))
+
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual([handler.queue.get_nowait().args for _ in range(2)], [(2,), (3,)])
+
+    def test_listener_writes_records(self):
+        """Фоновый поток передает записи исходным обработчикам."""
+        logger = logging.getLogger('chat_app.tests.queue')
+        target = logging.handlers.BufferingHandler(10)
+        logger.addHandler(target)
+        logger.propagate = False
+        self.addCleanup(logger.removeHandler, target)
+
+        install_queue_logging(['chat_app.tests.queue'], 10)
+        queue_handler = logger.handlers[0]
+        self.addCleanup(logger.removeHandler, queue_handler)
+
+        logger.info("Сообщение %s", 1)
+        # Ждем, пока listener обработает очередь
+        queue_handler.queue.join()
+
+        self.assertIsInstance(queue_handler, BoundedQueueHandler)
+        self.assertEqual([record.getMessage() for record in target.buffer], ["Сообщение 1"])
+
+
+class QueryBudgetTests(TestCase):
+    """Тесты бюджета SQL-запросов."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Бюджет")
+
+    def test_exceeded_budget_raises_with_report(self):
+        """Превышение в режиме raise - исключение с запросами и местами в коде."""
+        with self.assertRaises(QueryBudgetExceeded) as ctx:
+            with query_budget(1, name='проверка'):
+                Chat.objects.filter(id=self.chat.id).exists()
+                Message.objects.filter(chat=self.chat).count()
+
+        report = str(ctx.exception)
+        self.assertIn("проверка: 2 запросов при бюджете 1", report)
+        self.assertIn('FROM "message"', report)
+        self.assertIn("chat_app/tests.py:", report)
+        self.assertIn("in test_exceeded_budget_raises_with_report", report)
+
+    def test_duplicates_reported(self):
+        """Одинаковые запросы с разными параметрами отмечаются как N+1."""
+        chats = [Chat.objects.create(title=f"Чат {i}") for i in range(3)]
+
+        with self.assertRaises(QueryBudgetExceeded) as ctx:
+            with query_budget(2) as budget:
+                for chat in chats:
+                    Message.objects.filter(chat=chat).count()
+
+        (sql, count, location), = budget.duplicates()
+        self.assertEqual(count, 3)
+        self.assertIn('FROM "message"', sql)
+        self.assertIn("Повторяющиеся запросы (возможно, N+1):\n  3 x", str(ctx.exception))
+
+    def test_log_mode(self):
+        """В режиме log превышение и частые повторы пишутся в лог без исключения."""
+        with self.assertLogs('chat_app.querybudget', 'WARNING') as logs:
+            with query_budget(0, mode='log'):
+                Chat.objects.count()
+        self.assertIn("Превышен бюджет запросов", logs.output[0])
+
+        with self.settings(QUERY_BUDGET_DUPLICATE_THRESHOLD=2):
+            with self.assertLogs('chat_app.querybudget', 'WARNING') as logs:
+                with query_budget(5, name='повторы', mode='log'):
+                    Chat.objects.filter(id=1).exists()
+                    Chat.objects.filter(id=2).exists()
+        self.assertIn("повторы: повторяющиеся запросы", logs.output[0])
+
+    def test_off_mode(self):
+        """В режиме off запросы не отслеживаются."""
+        with query_budget(0, mode='off') as budget:
+            Chat.objects.count()
+        self.assertEqual(budget.queries, [])
+
+    def test_unbudgeted_and_savepoints_not_counted(self):
+        """Запросы в unbudgeted() и SAVEPOINT транзакций не входят в бюджет."""
+        with query_budget(1) as budget:
+            with transaction.atomic():
+                Chat.objects.create(title="Новый")
+            with unbudgeted():
+                Chat.objects.count()
+        self.assertEqual(len(budget.queries), 1)
+
+    def test_decorator(self):
+        """Декоратор создает новый бюджет на каждый вызов."""
+        @query_budget(1)
+        def count_chats():
+            return Chat.objects.count()
+
+        self.assertEqual(count_chats(), 1)
+        self.assertEqual(count_chats(), 1)
+
+        @query_budget(lambda: 1)
+        def two_queries():
+            Chat.objects.count()
+            Chat.objects.count()
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, "two_queries: 2 запросов при бюджете 1"):
+            two_queries()
+
+    async def test_async_decorator(self):
+        """Декоратор async-функции учитывает запросы из sync_to_async."""
+        @query_budget(1)
+        async def chat_exists(chat_id):
+            return await Chat.objects.filter(id=chat_id).aexists()
+
+        @query_budget(1)
+        async def two_queries(chat_id):
+            await Chat.objects.filter(id=chat_id).aexists()
+            return await Chat.objects.acount()
+
+        self.assertTrue(await chat_exists(self.chat.id))
+        with self.assertRaises(QueryBudgetExceeded):
+            await two_queries(self.chat.id)
+
+    def test_endpoint_budgets(self):
+        """Запросы основных представлений укладываются в объявленные бюджеты."""
+        detail = reverse('chat-detail', args=[self.chat.id])
+
+        with query_budget(1) as budget:
+            response = self.client.post(reverse('chat-list'), {'title': "Еще чат"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(budget.queries), 1)
+
+        with query_budget(1) as budget:
+            response = self.client.post(
+                reverse('message-create', args=[self.chat.id]), {'text': "Привет"}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(budget.queries), 1)
+
+        with query_budget(3) as budget:
+            response = self.client.get(detail)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(budget.queries), 3)
+
+        # Закэшированный ответ и его валидатор - без запросов
+        with query_budget(0):
+            response = self.client.get(detail)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        with query_budget(6):
+            response = self.client.delete(detail)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_bulk_budget_follows_settings(self):
+        """Бюджет массовой загрузки растет с числом пачек INSERT."""
+        items = [{'text': f"Сообщение {i}"} for i in range(10)]
+        with self.settings(CHAT_BULK_MAX_MESSAGES=10, CHAT_BULK_BATCH_SIZE=3):
+            response = self.client.post(
+                reverse('message-bulk-create', args=[self.chat.id]), items, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Chat.objects.get(id=self.chat.id).message_count, 10)
+
+
+class MetricsTests(TestCase):
+    """Тесты для MetricsMiddleware и GET /metrics."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        Message.objects.create(chat=self.chat, text="Сообщение")
+
+    def test_metrics_endpoint(self):
+        """Запросы попадают в счетчики и гистограммы /metrics."""
+        self.client.get(reverse('chat-detail', args=[self.chat.id]))
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('chat_http_requests_total{view="chat-detail",method="GET",status="200"}', body)
+        self.assertIn('chat_http_request_duration_seconds_bucket{view="chat-detail",method="GET",le="+Inf"}', body)
+        self.assertIn('chat_db_queries_per_request_count{view="chat-detail",method="GET"}', body)
+        self.assertIn('chat_request_phase_duration_seconds_count{view="chat-detail",method="GET",phase="serialize"}', body)
+        self.assertIn('chat_http_response_size_bytes_count{view="chat-detail",method="GET"}', body)
+        self.assertIn('chat_cache_hits_total', body)
+
+    def test_server_timing_disabled_by_default(self):
+        """Без METRICS_SERVER_TIMING заголовок не добавляется."""
+        response = self.client.get(reverse('chat-detail', args=[self.chat.id]))
+
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing_counts_queries(self):
+        """Server-Timing содержит количество и время SQL-запросов запроса."""
+        with self.settings(METRICS_SERVER_TIMING=True):
+            response = self.client.post(
+                reverse('message-create', args=[self.chat.id]),
+                {'text': 'Новое'},
+                format='json'
+            )
+
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    async def test_async_view_queries_counted(self):
+        """Запросы к БД асинхронного представления тоже учитываются."""
+        with self.settings(METRICS_SERVER_TIMING=True):
+            response = await self.async_client.get(
+                reverse('chat-detail', args=[self.chat.id]) + '?since=0'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_unknown_method_label(self):
+        """Нестандартные методы не создают новые серии метрик."""
+        self.client.generic('BREW', reverse('chat-list'))
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertNotIn('method="BREW"', body)
+        self.assertIn('chat_http_requests_total{view="chat-list",method="other",status="405"}', body)
+
+
+class AsyncViewsURLConf:
+    """URLconf проекта с асинхронными представлениями (CHAT_ASYNC_VIEWS)."""
+    urlpatterns = [
+        path('api/', include(build_urlpatterns(async_views=True))),
+        path('metrics', metrics_view, name='metrics'),
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncChatListViewTests(ChatListViewTests):
+    """Тесты создания чата асинхронным представлением."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncChatListTests(ChatListTests):
+    """Тесты списка чатов асинхронным представлением."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncChatDetailViewTests(ChatDetailViewTests):
+    """Тесты получения и удаления чата асинхронным представлением."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncChatDeletionTests(ChatDeletionTests):
+    """Тесты удаления чата асинхронным представлением."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncChatDetailFastJSONTests(ChatDetailFastJSONTests):
+    """Тесты быстрого пути JSON асинхронного представления."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncChatDetailCacheTests(ChatDetailCacheTests):
+    """Тесты кэша ответов асинхронного представления."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncChatDetailConditionalTests(ChatDetailConditionalTests):
+    """Тесты условных запросов к асинхронному представлению."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncMessagePaginationTests(MessagePaginationTests):
+    """Тесты пагинации сообщений асинхронного представления."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncMessageCreateViewTests(MessageCreateViewTests):
+    """Тесты отправки сообщения асинхронным представлением."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncChatLongPollTests(ChatLongPollTests):
+    """Тесты long polling через асинхронную точку входа чата."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncAPIFormatTests(APIFormatTests):
+    """Тесты форматов API асинхронных представлений."""
+
+
+@override_settings(ROOT_URLCONF=AsyncViewsURLConf)
+class AsyncViewsTests(TestCase):
+    """Тесты совпадения ответов асинхронных и синхронных представлений."""
+
+    HEADERS = ('Content-Type', 'Vary', 'Allow', 'ETag', 'X-Cache')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.chat = Chat.objects.create(title="Тестовый чат")
+        for i in range(3):
+            Message.objects.create(chat=self.chat, text=f"Сообщение {i}")
+        self.url = reverse('chat-detail', args=[self.chat.id])
+
+    def assertSameResponse(self, method, url, **kwargs):
+        """Ответы синхронного и асинхронного представлений совпадают."""
+        async_response = getattr(self.client, method)(url, **kwargs)
+        # Второй ответ не должен браться из кэша первого
+        cache.clear()
+        with override_settings(ROOT_URLCONF=project_settings.ROOT_URLCONF):
+            sync_response = getattr(self.client, method)(url, **kwargs)
+
+        self.assertIsInstance(async_response, AsyncAPIResponse)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        for header in self.HEADERS:
+            self.assertEqual(async_response.get(header), sync_response.get(header), header)
+        return async_response
+
+    def test_chat_list(self):
+        """Тест списка чатов."""
+        self.assertSameResponse('get', reverse('chat-list') + '?order=activity&limit=1')
+
+    def test_chat_detail(self):
+        """Тест получения чата: тело и ETag."""
+        response = self.assertSameResponse('get', self.url + '?limit=2')
+
+        self.assertEqual(len(response.data['messages']), 2)
+        self.assertIn('ETag', response)
+
+    def test_chat_detail_without_fast_json(self):
+        """Тест получения чата через сериализаторы DRF."""
+        with override_settings(CHAT_FAST_JSON=False):
+            self.assertSameResponse('get', self.url)
+
+    def test_chat_detail_indent(self):
+        """Тест JSON с отступами из параметра Accept."""
+        response = self.assertSameResponse('get', self.url, HTTP_ACCEPT='application/json; indent=2')
+
+        self.assertIn(b'\n  "id"', response.content)
+
+    def test_errors(self):
+        """Тест ответов на некорректный курсор и несуществующий чат."""
+        self.assertSameResponse('get', self.url + '?before=invalid')
+        self.assertSameResponse('get', reverse('chat-detail', args=[999999]))
+
+    def test_create_chat_validation_error(self):
+        """Тест ошибки валидации при создании чата."""
+        self.assertSameResponse('post', reverse('chat-list'), data={'title': ''}, format='json')
+
+    def test_invalid_body(self):
+        """Тест некорректного тела и неподдерживаемого формата (400 и 415)."""
+        url = reverse('message-create', args=[self.chat.id])
+
+        self.assertSameResponse('post', url, data='{', content_type='application/json')
+        self.assertSameResponse('post', url, data='text', content_type='text/plain')
+
+    def test_not_modified(self):
+        """Тест ответа 304 на условный запрос."""
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['Allow'], 'GET, DELETE, HEAD, OPTIONS')
+
+    def test_sync_fallback(self):
+        """Тест, что браузерный API, 406, 405 и OPTIONS обслуживает синхронное представление."""
+        with mock.patch.object(ChatListView, 'renderer_classes', [JSONRenderer, BrowsableAPIRenderer]):
+            response = self.client.get(reverse('chat-list'), HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('text/html', response['Content-Type'])
+
+        response = self.client.get(self.url, HTTP_ACCEPT='application/xml')
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+        response = self.client.put(reverse('chat-list'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(response['Allow'], 'GET, POST, HEAD, OPTIONS')
+
+        response = self.client.options(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Chat Detail')
+
+    def test_route_names(self):
+        """Тест, что асинхронные маршруты совпадают с синхронными."""
+        names = [pattern.name for pattern in build_urlpatterns(async_views=True)]
+
+        self.assertEqual(names, [pattern.name for pattern in build_urlpatterns()])
 
 
 class IntegrationTests(TestCase):
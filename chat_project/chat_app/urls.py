@@ -1,13 +1,62 @@
+from django.conf import settings
 from django.urls import path
-from .views import ChatListView, ChatDetailView, MessageCreateView
+from .views import (
+    ChatDetailView,
+    ChatListView,
+    chat_detail_async,
+    chat_list_async,
+    ChatEventsView,
+    ChatExportView,
+    MessageCreateView,
+    message_create_async,
+    MessageBulkCreateView,
+    MessageSearchView,
+    HealthView,
+)
 
-urlpatterns = [
-    # Создание чата
-    path('chats/', ChatListView.as_view(), name='chat-list'),
 
-    # Получение и удаление чата
-    path('chats/<int:id>/', ChatDetailView.as_view(), name='chat-detail'),
+def build_urlpatterns(async_views=False):
+    """
+    Маршруты API. async_views - асинхронные реализации создания и списка
+    чатов, получения и удаления чата и отправки сообщения (CHAT_ASYNC_VIEWS);
+    адреса и имена маршрутов те же.
+    """
+    if async_views:
+        chat_list, chat, message_create = chat_list_async, chat_detail_async, message_create_async
+    else:
+        chat_list, chat, message_create = (
+            ChatListView.as_view(), ChatDetailView.as_view(), MessageCreateView.as_view()
+        )
 
-    # Отправка сообщения в чат
-    path('chats/<int:id>/messages/', MessageCreateView.as_view(), name='message-create'),
-]
\ No newline at end of file
+    return [
+        # Создание чата
+        path('chats/', chat_list, name='chat-list'),
+
+        # Получение и удаление чата, long polling новых сообщений
+        # (без CHAT_ASYNC_VIEWS long polling направляет ChatLongPollMiddleware)
+        path('chats/<int:id>/', chat, name='chat-detail'),
+
+        # Поток новых сообщений чата (Server-Sent Events)
+        path('chats/<int:id>/events/', ChatEventsView.as_view(), name='chat-events'),
+
+        # Выгрузка всей истории чата (NDJSON или CSV)
+        path('chats/<int:id>/export/', ChatExportView.as_view(), name='chat-export'),
+
+        # Отправка сообщения в чат
+        path('chats/<int:id>/messages/', message_create, name='message-create'),
+
+        # Массовая загрузка сообщений в чат
+        path('chats/<int:id>/messages/bulk/', MessageBulkCreateView.as_view(), name='message-bulk-create'),
+
+        # Полнотекстовый поиск по сообщениям чата
+        path('chats/<int:id>/messages/search/', MessageSearchView.as_view(), name='message-search-chat'),
+
+        # Полнотекстовый поиск по всем чатам
+        path('messages/search/', MessageSearchView.as_view(), name='message-search'),
+
+        # Состояние БД и пула соединений
+        path('health/', HealthView.as_view(), name='health'),
+    ]
+
+
+urlpatterns = build_urlpatterns(settings.CHAT_ASYNC_VIEWS)
@@ -1,25 +1,317 @@
 from rest_framework import status
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.exceptions import NotFound, ValidationError
-from django.db import transaction
+from rest_framework.exceptions import APIException, NotAcceptable, NotFound, ValidationError
+from rest_framework.request import Request
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.core.exceptions import ObjectDoesNotExist
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+import collections
+import json
 import logging
+import math
+import zlib
+import orjson
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import Chat, Message
-from .serializers import ChatSerializer, MessageSerializer, ChatDetailSerializer
+from . import cache as chat_cache, db, deletion, export, fastjson, metrics, partitioning, pubsub
+from .models import Chat, Message, chat_activity
+from .pagination import (
+    InvalidCursor,
+    apaginate_chats,
+    apaginate_messages,
+    paginate_by_rank,
+    paginate_chats,
+    paginate_messages,
+)
+from .parsers import NDJSONParser
+from .querybudget import query_budget
+from .renderers import JSONRenderer
+from .serializers import (
+    ChatSerializer,
+    ChatListSerializer,
+    MessageSerializer,
+    MessageCreateSerializer,
+    MessageSearchResultSerializer,
+    ChatDetailSerializer,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def _parse_limit(value):
+    """Параметр limit: по умолчанию 20, больше 100 - 100, некорректный - 20."""
+    try:
+        limit = int(value if value is not None else 20)
+    except ValueError:
+        return 20
+
+    if limit < 1:
+        return 20
+    return min(limit, 100)
+
+
+def _bulk_query_budget():
+    """Бюджет массовой загрузки: проверка чата, пачки INSERT и статистика чата."""
+    return 2 + math.ceil(settings.CHAT_BULK_MAX_MESSAGES / settings.CHAT_BULK_BATCH_SIZE)
+
+
+def _detail_validator(request, id):
+    """
+    ETag ответа GET /chats/{id}/ или None, если чата нет. request - Request
+    DRF с уже выбранным рендерером.
+
+    Считается без сериализации ответа: состояние чата (название и версия
+    сообщений) берется из кэша или одним запросом по первичному ключу чата.
+    Результат запоминается на запросе.
+    """
+    if hasattr(request, '_chat_validator'):
+        return request._chat_validator
+
+    key = chat_cache.validator_key(id)
+    state = chat_cache.get_cached(key, stat_prefix='validator_')
+    if state is None:
+        state = _validator_state(id).first()
+        if state is not None:
+            chat_cache.set_cached(key, state)
+
+    request._chat_validator = _validator_from_state(
+        request, id, state, request.accepted_renderer, request.accepted_media_type
+    )
+    return request._chat_validator
+
+
+async def _adetail_validator(request, id, renderer, media_type):
+    """
+    Асинхронный _detail_validator: состояние чата читается через асинхронный
+    ORM, формат ответа передается явно. Результат запоминается на запросе,
+    поэтому condition() после него запросов не выполняет.
+    """
+    if hasattr(request, '_chat_validator'):
+        return request._chat_validator
+
+    key = chat_cache.validator_key(id)
+    state = chat_cache.get_cached(key, stat_prefix='validator_')
+    if state is None:
+        state = await _validator_state(id).afirst()
+        if state is not None:
+            chat_cache.set_cached(key, state)
+
+    request._chat_validator = _validator_from_state(request, id, state, renderer, media_type)
+    return request._chat_validator
+
+
+def _validator_state(id):
+    """QuerySet состояния чата для валидатора (одна строка или ни одной)."""
+    # version меняется в том же запросе, что и сообщения чата, поэтому
+    # читать таблицу сообщений не нужно
+    return Chat.objects.alive().filter(id=id).values_list('title', 'version')
+
+
+def _validator_from_state(request, id, state, renderer, media_type):
+    if state is None:
+        return None
+
+    title, version = state
+    # Тело ответа зависит от параметров страницы и формата (JSON с indent,
+    # MessagePack и т. д.)
+    variant = '|'.join((
+        title,
+        media_type,
+        str(_parse_limit(request.GET.get('limit'))),
+        request.GET.get('before', ''),
+        request.GET.get('after', ''),
+    ))
+    # Last-Modified не отдается: его точность - секунда, и сообщение,
+    # отправленное в ту же секунду, что и предыдущий GET, было бы скрыто
+    return f'W/"{id}-{version}-{renderer.format}-{zlib.crc32(variant.encode()):08x}"'
+
+
+def _detail_etag(request, id):
+    return _detail_validator(request, id)
+
+
+def _chat_list_queryset(order):
+    """Живые чаты и ключ пагинации для порядка списка order."""
+    chats = Chat.objects.alive()
+    if order == 'activity':
+        return chats.annotate(activity=chat_activity()), 'activity'
+    return chats, 'created_at'
+
+
+def _chat_detail_payload(fast, chat, messages, next_cursor, prev_cursor):
+    """
+    Тело ответа GET /chats/{id}/: готовый JSON в байтах для быстрого пути
+    или данные для сериализации рендерером.
+    """
+    if fast:
+        with metrics.timed('serialize'):
+            chat_data = fastjson.chat_detail(chat, messages, next_cursor, prev_cursor)
+        with metrics.timed('render'):
+            return fastjson.dumps(chat_data)
+
+    with metrics.timed('serialize'):
+        chat_data = ChatSerializer(chat).data
+        chat_data['messages'] = MessageSerializer(
+            messages,
+            many=True
+        ).data
+    chat_data['next'] = next_cursor
+    chat_data['prev'] = prev_cursor
+    return chat_data
+
+
+def _delete_chat(id):
+    """
+    Удаление чата для DELETE /chats/{id}/. Возвращает статус ответа: 404,
+    если чата нет, 202 при удалении в фоне (CHAT_DELETE_ASYNC), иначе 204.
+    """
+    # Пометка скрывает чат из API сразу, до удаления сообщений
+    if not deletion.mark_chat_deleting(id):
+        logger.warning("Попытка удалить несуществующий чат: %s", id)
+        return status.HTTP_404_NOT_FOUND
+
+    if settings.CHAT_DELETE_ASYNC:
+        transaction.on_commit(lambda: deletion.delete_chat_in_background(id))
+        logger.info("Чат %s помечен на удаление", id)
+        return status.HTTP_202_ACCEPTED
+
+    deletion.delete_chat(id)
+
+    logger.info("Удален чат: %s", id)
+    return status.HTTP_204_NO_CONTENT
+
+
+def _create_message(id, text):
+    """
+    Создает провалидированное сообщение и публикует его подписчикам после
+    фиксации транзакции. Возвращает None, если чата нет.
+    """
+    # Единственный запрос: INSERT с проверкой существования чата.
+    # Нарушение FK возможно, если чат удален конкурентно (FK проверяется
+    # при фиксации транзакции); прочие ошибки целостности - ошибки сервера
+    try:
+        message = partitioning.insert_with_partition(lambda: Message.objects.create_for_chat(id, text))
+    except IntegrityError as e:
+        if db.sqlstate(e) != db.FOREIGN_KEY_VIOLATION:
+            raise
+        return None
+
+    if message is not None:
+        logger.info("Отправлено сообщение %s в чат %s", message.id, id)
+        transaction.on_commit(lambda: pubsub.publish_messages(id, [message]))
+    return message
+
+
 class ChatListView(APIView):
     """
-    API endpoint для создания нового чата.
+    API endpoint для списка чатов и создания нового чата.
+    GET /chats/ - список чатов
     POST /chats/ - создать чат
     """
 
+    # Порядок списка: параметр order -> ключ пагинации
+    ORDERS = ('created', 'activity')
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Список чатов с количеством сообщений, временем и превью последнего "
+            "сообщения. Каждая страница - один запрос к индексу, независимо от "
+            "количества сообщений"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'order',
+                openapi.IN_QUERY,
+                description=(
+                    "Порядок: created - от новых чатов к старым (по умолчанию), "
+                    "activity - по времени последнего сообщения (чат без сообщений - "
+                    "по времени создания)"
+                ),
+                type=openapi.TYPE_STRING,
+                enum=list(ORDERS),
+                default='created'
+            ),
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description="Количество чатов на странице (по умолчанию 20, максимум 100)",
+                type=openapi.TYPE_INTEGER,
+                default=20,
+                minimum=1,
+                maximum=100
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Курсор следующей страницы (значение next из ответа)",
+                type=openapi.TYPE_STRING
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Страница списка чатов",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'results': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT)
+                        ),
+                        'next': openapi.Schema(type=openapi.TYPE_STRING, x_nullable=True)
+                    }
+                )
+            ),
+            400: openapi.Response(
+                description="Некорректный порядок или курсор",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'detail': openapi.Schema(type=openapi.TYPE_STRING)
+                    }
+                )
+            )
+        }
+    )
+    @query_budget(1)
+    def get(self, request):
+        """Список чатов."""
+        order = request.query_params.get('order', 'created')
+        if order not in self.ORDERS:
+            return Response(
+                {"detail": f"Параметр order должен быть одним из: {', '.join(self.ORDERS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        limit = _parse_limit(request.query_params.get('limit'))
+        cursor = request.query_params.get('cursor')
+
+        chats, key = _chat_list_queryset(order)
+
+        try:
+            page, next_cursor = paginate_chats(chats, limit, key=key, cursor=cursor)
+        except InvalidCursor as e:
+            logger.warning("Некорректный курсор списка чатов: %s", e)
+            return Response(
+                {"detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with metrics.timed('serialize'):
+            results = ChatListSerializer(page, many=True).data
+
+        return Response({'results': results, 'next': next_cursor})
+
     @swagger_auto_schema(
         operation_description="Создание нового чата",
         request_body=openapi.Schema(
@@ -52,28 +344,36 @@ class ChatListView(APIView):
             )
         }
     )
+    @query_budget(1)
     def post(self, request):
         """Создание нового чата."""
+        # Ошибки разбора тела и неподдерживаемый формат (ParseError,
+        # UnsupportedMediaType) DRF превращает в ответы 400 и 415
+        data = request.data
+
         try:
-            serializer = ChatSerializer(data=request.data)
+            serializer = ChatSerializer(data=data)
 
             if not serializer.is_valid():
-                logger.error(f"Ошибка валидации при создании чата: {serializer.errors}")
+                logger.error("Ошибка валидации при создании чата: %s", serializer.errors)
                 return Response(
                     serializer.errors,
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
             chat = serializer.save()
-            logger.info(f"Создан новый чат: {chat.id} - {chat.title}")
+            logger.info("Создан новый чат: %s - %s", chat.id, chat.title)
+
+            with metrics.timed('serialize'):
+                chat_data = ChatSerializer(chat).data
 
             return Response(
-                ChatSerializer(chat).data,
+                chat_data,
                 status=status.HTTP_201_CREATED
             )
 
         except Exception as e:
-            logger.error(f"Неожиданная ошибка при создании чата: {e}")
+            logger.error("Неожиданная ошибка при создании чата: %s", e)
             return Response(
                 {"error": "Внутренняя ошибка сервера"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -98,6 +398,38 @@ class ChatDetailView(APIView):
                 default=20,
                 minimum=1,
                 maximum=100
+            ),
+            openapi.Parameter(
+                'before',
+                openapi.IN_QUERY,
+                description="Курсор: вернуть сообщения старше указанной позиции (значение next из ответа)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'after',
+                openapi.IN_QUERY,
+                description="Курсор: вернуть сообщения новее указанной позиции (значение prev из ответа)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'since',
+                openapi.IN_QUERY,
+                description=(
+                    "Id последнего полученного сообщения. Если передан, возвращаются "
+                    "только сообщения новее него (не более limit), курсоры не возвращаются"
+                ),
+                type=openapi.TYPE_INTEGER,
+                minimum=0
+            ),
+            openapi.Parameter(
+                'wait',
+                openapi.IN_QUERY,
+                description=(
+                    "Long polling вместе с since: сколько секунд ждать новых сообщений, "
+                    "если их еще нет (по умолчанию 0, максимум CHAT_LONG_POLL_MAX_WAIT)"
+                ),
+                type=openapi.TYPE_NUMBER,
+                minimum=0
             )
         ],
         responses={
@@ -105,6 +437,18 @@ class ChatDetailView(APIView):
                 description="Чат найден",
                 schema=ChatDetailSerializer
             ),
+            304: openapi.Response(
+                description="Не изменился с момента запроса (If-None-Match)"
+            ),
+            400: openapi.Response(
+                description="Некорректный курсор",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'detail': openapi.Schema(type=openapi.TYPE_STRING)
+                    }
+                )
+            ),
             404: openapi.Response(
                 description="Чат не найден",
                 schema=openapi.Schema(
@@ -116,54 +460,94 @@ class ChatDetailView(APIView):
             )
         }
     )
+    # Валидатор условного запроса, чат и страница сообщений
+    @query_budget(3)
+    @method_decorator(condition(etag_func=_detail_etag))
     def get(self, request, id):
         """Получение чата с последними сообщениями."""
         try:
-            # Получаем чат
-            chat = Chat.objects.get(id=id)
-
             # Получаем параметр limit
-            limit = request.query_params.get('limit', 20)
-            try:
-                limit = int(limit)
-                if limit < 1:
-                    limit = 20
-                elif limit > 100:
-                    limit = 100
-            except ValueError:
-                limit = 20
+            limit = _parse_limit(request.query_params.get('limit'))
+            before = request.query_params.get('before')
+            after = request.query_params.get('after')
 
-            # Получаем последние сообщения
-            messages = chat.messages.order_by('-created_at')[:limit]
+            # Обычный JSON-ответ собирается без DRF-сериализаторов и кодируется
+            # сразу в байты (тот же вывод); прочие форматы и JSON с indent
+            # проходят через сериализаторы и рендерер
+            fast = (
+                settings.CHAT_FAST_JSON
+                and request.accepted_media_type == JSONRenderer.media_type
+            )
 
-            # Подготавливаем данные
-            chat_data = ChatSerializer(chat).data
-            chat_data['messages'] = MessageSerializer(
-                messages,
-                many=True
-            ).data
+            # Кэшируется только окно последних сообщений (без курсоров)
+            cache_key = None
+            if not before and not after:
+                cache_key = chat_cache.detail_key(id, limit, encoded=fast)
+                cached = chat_cache.get_cached(cache_key)
+                if cached is not None:
+                    logger.info("Получен чат %s из кэша", id)
+                    response = fastjson.EncodedResponse(cached) if fast else Response(cached)
+                    response['X-Cache'] = 'HIT'
+                    return response
 
-            logger.info(f"Получен чат {id} с {len(messages)} сообщениями")
+            # Получаем чат (удаляемые чаты уже недоступны)
+            if fast:
+                chat = fastjson.chat_row(id)
+                messages = fastjson.message_rows(id)
+            else:
+                chat = Chat.objects.alive().get(id=id)
+                messages = chat.messages.all()
 
-            return Response(chat_data)
+            # Получаем страницу сообщений. Порядок совпадает с индексом
+            # message_chat_created_idx, поэтому Postgres читает ровно limit
+            # строк из индекса без сортировки всех сообщений чата
+            try:
+                messages, next_cursor, prev_cursor = paginate_messages(
+                    messages,
+                    limit,
+                    before=before,
+                    after=after,
+                )
+            except InvalidCursor as e:
+                logger.warning("Некорректный курсор для чата %s: %s", id, e)
+                return Response(
+                    {"detail": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            payload = _chat_detail_payload(fast, chat, messages, next_cursor, prev_cursor)
+
+            logger.info("Получен чат %s с %s сообщениями", id, len(messages))
+
+            response = fastjson.EncodedResponse(payload) if fast else Response(payload)
+            if cache_key is not None:
+                chat_cache.set_cached(cache_key, payload)
+                response['X-Cache'] = 'MISS'
+            return response
 
         except Chat.DoesNotExist:
-            logger.warning(f"Попытка получить несуществующий чат: {id}")
+            logger.warning("Попытка получить несуществующий чат: %s", id)
             return Response(
                 {"detail": "Чат не найден"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
         except Exception as e:
-            logger.error(f"Ошибка при получении чата {id}: {e}")
+            logger.error("Ошибка при получении чата %s: %s", id, e)
             return Response(
                 {"error": "Внутренняя ошибка сервера"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
     @swagger_auto_schema(
-        operation_description="Удаление чата со всеми сообщениями",
+        operation_description=(
+            "Удаление чата со всеми сообщениями. Сообщения удаляются пачками; "
+            "при CHAT_DELETE_ASYNC удаление выполняется в фоне и возвращается 202"
+        ),
         responses={
+            202: openapi.Response(
+                description="Чат помечен на удаление, сообщения удаляются в фоне"
+            ),
             204: openapi.Response(
                 description="Чат успешно удален"
             ),
@@ -178,32 +562,26 @@ class ChatDetailView(APIView):
             )
         }
     )
+    # Пометка, контрольная пачка и удаление чата (пачки сообщений вне бюджета)
+    @query_budget(6)
     def delete(self, request, id):
         """Удаление чата со всеми сообщениями."""
         try:
-            chat = Chat.objects.get(id=id)
-
-            with transaction.atomic():
-                chat.delete()
-
-            logger.info(f"Удален чат: {id}")
-
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        except Chat.DoesNotExist:
-            logger.warning(f"Попытка удалить несуществующий чат: {id}")
-            return Response(
-                {"detail": "Чат не найден"},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
+            status_code = _delete_chat(id)
         except Exception as e:
-            logger.error(f"Ошибка при удалении чата {id}: {e}")
+            logger.error("Ошибка при удалении чата %s: %s", id, e)
             return Response(
                 {"error": "Внутренняя ошибка сервера"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        if status_code == status.HTTP_404_NOT_FOUND:
+            return Response(
+                {"detail": "Чат не найден"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(status=status_code)
+
 
 class MessageCreateView(APIView):
     """
@@ -252,43 +630,986 @@ class MessageCreateView(APIView):
             )
         }
     )
+    @query_budget(1)
     def post(self, request, id):
         """Отправка сообщения в чат."""
-        try:
-            # Проверяем существование чата
-            chat = Chat.objects.get(id=id)
+        # Ошибки разбора тела и неподдерживаемый формат (ParseError,
+        # UnsupportedMediaType) DRF превращает в ответы 400 и 415
+        data = request.data
 
-            # Подготавливаем данные для сериализатора
-            data = request.data.copy()
-            data['chat'] = chat.id
-
-            serializer = MessageSerializer(data=data)
+        try:
+            # Валидируем текст без обращений к БД
+            serializer = MessageCreateSerializer(data=data)
 
             if not serializer.is_valid():
-                logger.error(f"Ошибка валидации при отправке сообщения в чат {id}: {serializer.errors}")
+                logger.error("Ошибка валидации при отправке сообщения в чат %s: %s", id, serializer.errors)
                 return Response(
                     serializer.errors,
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            message = serializer.save()
-            logger.info(f"Отправлено сообщение {message.id} в чат {id}")
+            message = _create_message(id, serializer.validated_data['text'])
+            if message is None:
+                logger.warning("Попытка отправить сообщение в несуществующий чат: %s", id)
+                return Response(
+                    {"detail": "Чат не найден"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            with metrics.timed('serialize'):
+                message_data = MessageSerializer(message).data
 
             return Response(
-                MessageSerializer(message).data,
+                message_data,
                 status=status.HTTP_201_CREATED
             )
 
-        except Chat.DoesNotExist:
-            logger.warning(f"Попытка отправить сообщение в несуществующий чат: {id}")
+        except Exception as e:
+            logger.error("Неожиданная ошибка при отправке сообщения в чат %s: %s", id, e)
             return Response(
-                {"detail": "Чат не найден"},
-                status=status.HTTP_404_NOT_FOUND
+                {"error": "Внутренняя ошибка сервера"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class MessageBulkCreateView(APIView):
+    """
+    API endpoint для массовой загрузки сообщений в чат.
+    POST /chats/{id}/messages/bulk/ - отправить массив сообщений
+
+    Размер тела ограничен CHAT_BULK_MAX_BODY_SIZE и проверяется по
+    Content-Length до чтения тела; NDJSON читается построчно и прерывается
+    на сообщении сверх CHAT_BULK_MAX_MESSAGES. Слишком большая загрузка
+    получает 400, не попадая в память целиком.
+    """
+    # Форматы из API_PARSERS и NDJSON
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser]
+
+    def get_parser_context(self, http_request):
+        context = super().get_parser_context(http_request)
+        # Для NDJSONParser: прекратить чтение на сообщении сверх лимита
+        context['max_items'] = settings.CHAT_BULK_MAX_MESSAGES
+        return context
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Массовая загрузка сообщений в чат. Принимает JSON-массив объектов "
+            "{\"text\": ...}, NDJSON (application/x-ndjson) или MessagePack, если он включен в API_PARSERS. Корректные сообщения "
+            "сохраняются в одной транзакции, для некорректных возвращаются ошибки по индексу."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                required=['text'],
+                properties={
+                    'text': openapi.Schema(
+                        type=openapi.TYPE_STRING,
+                        description='Текст сообщения (1-5000 символов)',
+                        maxLength=5000
+                    )
+                }
+            )
+        ),
+        responses={
+            201: openapi.Response(
+                description="Сообщения сохранены (возможно, частично)",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'created': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'index': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'id': openapi.Schema(type=openapi.TYPE_INTEGER)
+                                }
+                            )
+                        ),
+                        'errors': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'index': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'errors': openapi.Schema(type=openapi.TYPE_OBJECT)
+                                }
+                            )
+                        )
+                    }
+                )
+            ),
+            400: openapi.Response(
+                description="Ни одно сообщение не прошло валидацию или некорректный формат запроса"
+            ),
+            404: openapi.Response(
+                description="Чат не найден",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'detail': openapi.Schema(type=openapi.TYPE_STRING)
+                    }
+                )
+            )
+        }
+    )
+    # Пачки INSERT повторяются по замыслу и уже учтены в бюджете
+    @query_budget(_bulk_query_budget, repeats=(f'INSERT INTO "{Message._meta.db_table}"',))
+    def post(self, request, id):
+        """Массовая загрузка сообщений в чат."""
+        max_size = settings.CHAT_BULK_MAX_BODY_SIZE
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > max_size:
+            return Response(
+                {"detail": f"Тело запроса больше {max_size} байт"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Ошибки разбора тела (ParseError) DRF превращает в ответ 400
+        items = request.data
+
+        try:
+            max_messages = settings.CHAT_BULK_MAX_MESSAGES
+
+            if not isinstance(items, list) or not items:
+                return Response(
+                    {"detail": "Ожидается непустой массив сообщений"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if len(items) > max_messages:
+                return Response(
+                    {"detail": f"Можно загрузить не более {max_messages} сообщений за запрос"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if not Chat.objects.alive().filter(id=id).exists():
+                logger.warning("Попытка загрузить сообщения в несуществующий чат: %s", id)
+                return Response(
+                    {"detail": "Чат не найден"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            # Валидируем каждое сообщение теми же правилами, что и одиночную отправку
+            indexes, messages, errors = [], [], []
+            for index, item in enumerate(items):
+                serializer = MessageCreateSerializer(data=item)
+                if serializer.is_valid():
+                    indexes.append(index)
+                    messages.append(Message(chat_id=id, text=serializer.validated_data['text']))
+                else:
+                    errors.append({'index': index, 'errors': serializer.errors})
+
+            if not messages:
+                logger.error("Ни одно сообщение не прошло валидацию при загрузке в чат %s", id)
+                return Response(
+                    {'created': [], 'errors': errors},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            def insert():
+                with transaction.atomic():
+                    Message.objects.bulk_create(
+                        messages,
+                        batch_size=settings.CHAT_BULK_BATCH_SIZE
+                    )
+
+            try:
+                partitioning.insert_with_partition(insert)
+            except IntegrityError as e:
+                if db.sqlstate(e) != db.FOREIGN_KEY_VIOLATION:
+                    raise
+                # Чат удален конкурентно между проверкой и фиксацией транзакции
+                logger.warning("Чат %s удален во время загрузки сообщений", id)
+                return Response(
+                    {"detail": "Чат не найден"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            logger.info("Загружено %s сообщений в чат %s, ошибок: %s", len(messages), id, len(errors))
+
+            transaction.on_commit(lambda: pubsub.publish_messages(id, messages))
+
+            return Response(
+                {
+                    'created': [
+                        {'index': index, 'id': message.id}
+                        for index, message in zip(indexes, messages)
+                    ],
+                    'errors': errors,
+                },
+                status=status.HTTP_201_CREATED
             )
 
         except Exception as e:
-            logger.error(f"Неожиданная ошибка при отправке сообщения в чат {id}: {e}")
+            logger.error("Неожиданная ошибка при загрузке сообщений в чат %s: %s", id, e)
             return Response(
                 {"error": "Внутренняя ошибка сервера"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class MessageSearchView(APIView):
+    """
+    Полнотекстовый поиск по сообщениям.
+    GET /chats/{id}/messages/search/?q=... - поиск в чате
+    GET /messages/search/?q=... - поиск по всем чатам
+    """
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Полнотекстовый поиск по тексту сообщений (морфология русского языка, "
+            "синтаксис websearch: \"фраза\", or, -исключение). Результаты "
+            "упорядочены по релевантности (rank), при равной релевантности - "
+            "от новых к старым"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'q',
+                openapi.IN_QUERY,
+                description="Поисковый запрос",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description="Количество результатов (по умолчанию 20, максимум 100)",
+                type=openapi.TYPE_INTEGER,
+                default=20,
+                minimum=1,
+                maximum=100
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Курсор следующей страницы (значение next из ответа)",
+                type=openapi.TYPE_STRING
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Результаты поиска",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'results': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_OBJECT)
+                        ),
+                        'next': openapi.Schema(type=openapi.TYPE_STRING, x_nullable=True)
+                    }
+                )
+            ),
+            400: openapi.Response(
+                description="Пустой запрос или некорректный курсор",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'detail': openapi.Schema(type=openapi.TYPE_STRING)
+                    }
+                )
+            ),
+            404: openapi.Response(
+                description="Чат не найден",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'detail': openapi.Schema(type=openapi.TYPE_STRING)
+                    }
+                )
+            )
+        }
+    )
+    @query_budget(2)
+    def get(self, request, id=None):
+        """Поиск сообщений по тексту."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"detail": "Параметр q обязателен."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        limit = _parse_limit(request.query_params.get('limit'))
+        cursor = request.query_params.get('cursor')
+
+        if id is not None:
+            if not Chat.objects.alive().filter(id=id).exists():
+                logger.warning("Поиск в несуществующем чате: %s", id)
+                return Response(
+                    {"detail": "Чат не найден"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            messages = Message.objects.filter(chat_id=id)
+        else:
+            messages = Message.objects.filter(chat__is_deleting=False)
+
+        # Условие поиска совпадает с выражением индекса message_text_search_idx
+        try:
+            page, next_cursor = paginate_by_rank(messages.search(query), limit, cursor)
+        except InvalidCursor as e:
+            logger.warning("Некорректный курсор поиска: %s", e)
+            return Response(
+                {"detail": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with metrics.timed('serialize'):
+            results = MessageSearchResultSerializer(page, many=True).data
+
+        logger.info("Поиск сообщений (чат %s): найдено на странице %s", id, len(page))
+
+        return Response({'results': results, 'next': next_cursor})
+
+
+class HealthView(APIView):
+    """
+    Проверка состояния сервиса.
+    GET /health/ - доступность БД и статистика пула соединений воркера
+    """
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Проверка доступности БД (SELECT 1), настройки постоянных соединений "
+            "и статистика пула соединений текущего процесса (null, если пул выключен)"
+        ),
+        responses={
+            200: openapi.Response(description="БД доступна"),
+            503: openapi.Response(description="БД недоступна")
+        }
+    )
+    @query_budget(1)
+    def get(self, request):
+        """Состояние БД и пула соединений."""
+        available, database = db.database_status()
+
+        if not available:
+            logger.error("Проверка состояния: БД недоступна")
+
+        return Response(
+            {
+                'status': 'ok' if available else 'unavailable',
+                'database': database,
+            },
+            status=status.HTTP_200_OK if available else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+
+@query_budget(0)
+def metrics_view(request):
+    """
+    GET /metrics - метрики процесса в текстовом формате Prometheus.
+    """
+    return HttpResponse(
+        metrics.render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def _format_event(payload):
+    """Форматирует сообщение как событие Server-Sent Events."""
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {payload['id']}\nevent: message\ndata: {data}\n\n"
+
+
+async def _chat_event_stream(chat_id, last_id):
+    """
+    Поток событий чата: сначала пропущенные сообщения с id > last_id,
+    затем новые сообщения по мере их публикации.
+    """
+    # Подписываемся до чтения пропущенных сообщений, чтобы не потерять
+    # сообщения, созданные между запросом к БД и подпиской
+    subscription = pubsub.get_backend().subscribe(chat_id)
+    try:
+        # Повторно прийти через pub/sub могут только сообщения, опубликованные
+        # после подписки, а их не больше размера очереди подписки (иначе она
+        # переполнится и поток закроется): помним столько последних id
+        recent = collections.deque(maxlen=settings.CHAT_PUBSUB_QUEUE_SIZE)
+
+        if last_id is not None:
+            # Пропущенные сообщения читаются пачками по id, а не одним
+            # запросом: их может быть сколько угодно
+            messages = Message.objects.filter(chat_id=chat_id)
+            chunk_size = settings.CHAT_EVENTS_REPLAY_CHUNK_SIZE
+            while True:
+                chunk = [message async for message in messages.since(last_id)[:chunk_size]]
+                for message in chunk:
+                    payload = MessageSerializer(message).data
+                    recent.append(payload['id'])
+                    yield _format_event(payload)
+                if len(chunk) < chunk_size:
+                    break
+                last_id = chunk[-1].id
+
+        delivered = set(recent)
+        # Сообщения старше запомненных отданы при чтении пропущенных
+        delivered_floor = recent[0] if recent else None
+
+        # Дальше поток только ждет событий pub/sub и БД не нужна
+        await sync_to_async(db.release_connection)()
+
+        while True:
+            try:
+                payload = await subscription.get(timeout=settings.CHAT_EVENTS_HEARTBEAT)
+            except TimeoutError:
+                # Очередь пуста: все повторы уже пришли, и id больше не нужны
+                delivered.clear()
+                delivered_floor = None
+                # Комментарий keep-alive не дает прокси закрыть соединение
+                yield ": keep-alive\n\n"
+                continue
+
+            if subscription.overflowed:
+                # Часть событий потеряна: клиент переподключится с Last-Event-ID
+                logger.warning("Подписчик чата %s не успевает получать события", chat_id)
+                break
+
+            if payload['id'] in delivered or (delivered_floor is not None and payload['id'] < delivered_floor):
+                continue
+
+            yield _format_event(payload)
+
+    finally:
+        subscription.close()
+
+
+class ChatEventsView(View):
+    """
+    Поток новых сообщений чата в формате Server-Sent Events.
+    GET /chats/{id}/events/ - подписаться на новые сообщения
+
+    Требует ASGI-сервера: под WSGI бесконечный поток не может быть отдан и
+    занял бы воркер до его перезапуска по таймауту, поэтому там ответ 501.
+    Для продолжения с последнего полученного сообщения клиент передает
+    заголовок Last-Event-ID (браузерный EventSource делает это сам при
+    переподключении) или параметр last_id.
+    """
+
+    # Проверка чата; пропущенные сообщения читаются уже при отдаче потока
+    @query_budget(1)
+    async def get(self, request, id):
+        """Подписка на новые сообщения чата."""
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {"detail": "Поток событий доступен только под ASGI-сервером"},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+                json_dumps_params={'ensure_ascii': False}
+            )
+
+        last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+        if last_id is not None:
+            try:
+                last_id = int(last_id)
+            except ValueError:
+                return JsonResponse(
+                    {"detail": "Некорректный last_id"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                    json_dumps_params={'ensure_ascii': False}
+                )
+
+        if not await Chat.objects.alive().filter(id=id).aexists():
+            logger.warning("Попытка подписаться на несуществующий чат: %s", id)
+            return JsonResponse(
+                {"detail": "Чат не найден"},
+                status=status.HTTP_404_NOT_FOUND,
+                json_dumps_params={'ensure_ascii': False}
+            )
+
+        logger.info("Подписка на события чата %s (last_id=%s)", id, last_id)
+
+        response = StreamingHttpResponse(
+            _chat_event_stream(id, last_id),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Отключаем буферизацию ответа в nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class ChatExportView(View):
+    """
+    Выгрузка всей истории чата.
+    GET /chats/{id}/export/?format=ndjson|csv&since=<message_id>
+
+    Сообщения отдаются потоком в порядке id, читаются серверным курсором
+    пачками по CHAT_EXPORT_CHUNK_SIZE, поэтому память не растет с размером
+    чата. since - id последнего уже выгруженного сообщения.
+    """
+
+    @query_budget(1)
+    def get(self, request, id):
+        """Выгрузка сообщений чата."""
+        fmt = request.GET.get('format', 'ndjson')
+        if fmt not in export.FORMATS:
+            return JsonResponse(
+                {"detail": f"Параметр format должен быть одним из: {', '.join(export.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+                json_dumps_params={'ensure_ascii': False}
+            )
+
+        since = request.GET.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return JsonResponse(
+                    {"detail": "Некорректный since"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                    json_dumps_params={'ensure_ascii': False}
+                )
+
+        if not Chat.objects.alive().filter(id=id).exists():
+            logger.warning("Попытка выгрузить несуществующий чат: %s", id)
+            return JsonResponse(
+                {"detail": "Чат не найден"},
+                status=status.HTTP_404_NOT_FOUND,
+                json_dumps_params={'ensure_ascii': False}
+            )
+
+        logger.info("Выгрузка чата %s (format=%s, since=%s)", id, fmt, since)
+
+        messages = export.messages_for_export(id, since)
+        # Поток формируется после возврата из представления
+        tz = timezone.get_current_timezone()
+        chunk_size = settings.CHAT_EXPORT_CHUNK_SIZE
+        if isinstance(request, ASGIRequest):
+            content = export.aiter_export(messages, fmt, tz, chunk_size)
+        else:
+            content = export.iter_export(messages, fmt, tz, chunk_size)
+
+        content_type, extension = export.FORMATS[fmt]
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="chat-{id}.{extension}"'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+def _render_json(data, status_code=status.HTTP_200_OK):
+    """Ответ JSON в том же виде, что и у APIView с JSONRenderer."""
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json'
+    )
+
+
+# Чат и до двух чтений новых сообщений (до и после ожидания)
+@query_budget(3)
+async def _chat_messages_since(request, id):
+    """
+    GET /chats/{id}/?since=<message_id>&wait=<seconds>
+
+    Возвращает только сообщения новее since. Если их нет и передан wait,
+    ждет уведомления о новом сообщении через pub/sub (без повторных
+    запросов к БД) не дольше wait секунд. Выполняется в event loop и
+    не занимает рабочий поток на время ожидания.
+    """
+    try:
+        since = int(request.GET['since'])
+        wait = float(request.GET.get('wait', 0))
+        if since < 0 or not 0 <= wait < float('inf'):
+            raise ValueError
+    except ValueError:
+        return _render_json(
+            {"detail": "Некорректные параметры since/wait"},
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    wait = min(wait, settings.CHAT_LONG_POLL_MAX_WAIT)
+    limit = _parse_limit(request.GET.get('limit'))
+
+    try:
+        chat = await Chat.objects.alive().aget(id=id)
+    except Chat.DoesNotExist:
+        logger.warning("Попытка получить несуществующий чат: %s", id)
+        return _render_json({"detail": "Чат не найден"}, status.HTTP_404_NOT_FOUND)
+
+    delta = chat.messages.since(since)
+
+    # Подписываемся до первой проверки, чтобы не пропустить сообщение,
+    # созданное между запросом к БД и началом ожидания
+    subscription = pubsub.get_backend().subscribe(id)
+    try:
+        messages = [message async for message in delta[:limit]]
+
+        if not messages and wait > 0:
+            # Соединение с БД не держится на время ожидания
+            await sync_to_async(db.release_connection)()
+            try:
+                await subscription.get(timeout=wait)
+            except TimeoutError:
+                pass
+            else:
+                messages = [message async for message in delta[:limit]]
+    finally:
+        subscription.close()
+
+    with metrics.timed('serialize'):
+        chat_data = ChatSerializer(chat).data
+        chat_data['messages'] = MessageSerializer(messages[::-1], many=True).data
+
+    logger.info("Получено %s новых сообщений чата %s после %s", len(messages), id, since)
+
+    return _render_json(chat_data)
+
+
+# Асинхронные реализации ChatListView, ChatDetailView и MessageCreateView
+# (CHAT_ASYNC_VIEWS). Ответы те же, но чтение идет через асинхронный ORM в
+# event loop, без рабочего потока на запрос. Записи с транзакциями и
+# on_commit выполняются теми же синхронными функциями через sync_to_async.
+
+class AsyncAPIResponse(HttpResponse):
+    """
+    Ответ асинхронного представления, уже отрисованный рендерером DRF.
+    data - данные ответа, как у Response DRF (тесты, отладка); если они не
+    переданы, разбираются из JSON-тела при обращении.
+    """
+
+    def __init__(self, content=b'', data=None, **kwargs):
+        super().__init__(content, **kwargs)
+        self._data = data
+
+    @property
+    def data(self):
+        if self._data is None and self.content:
+            self._data = orjson.loads(self.content)
+        return self._data
+
+
+class _AsyncAPI:
+    """
+    Разбор тела и выбор формата ответа без APIView: парсеры, рендереры,
+    согласование и заголовки Allow / Vary те же, что у view_class.
+    """
+
+    def __init__(self, request, view_class):
+        self.request = Request(
+            request,
+            parsers=[parser() for parser in view_class.parser_classes],
+            negotiator=view_class.content_negotiation_class(),
+        )
+        renderers = [renderer() for renderer in view_class.renderer_classes]
+        self.vary = len(renderers) > 1
+        # Как allowed_methods APIView: HEAD есть у всех представлений с GET
+        self.allow = ', '.join(
+            method.upper() for method in view_class.http_method_names
+            if hasattr(view_class, method) or (method == 'head' and hasattr(view_class, 'get'))
+        )
+
+        try:
+            self.renderer, self.media_type = self.request.negotiator.select_renderer(self.request, renderers)
+        except NotAcceptable:
+            self.renderer = self.media_type = None
+        else:
+            self.request.accepted_renderer = self.renderer
+            self.request.accepted_media_type = self.media_type
+
+    @property
+    def supported(self):
+        """
+        Ответ может отрисовать асинхронное представление. Браузерный API
+        (text/html) и ответ 406 остаются синхронному представлению.
+        """
+        return self.renderer is not None and self.renderer.format != 'api'
+
+    def respond(self, data, status_code=status.HTTP_200_OK):
+        """Ответ с данными, отрисованными выбранным рендерером."""
+        content = self.renderer.render(data, self.media_type, {'request': self.request})
+        content_type = self.renderer.media_type
+        if self.renderer.charset:
+            content_type = f"{content_type}; charset={self.renderer.charset}"
+
+        response = AsyncAPIResponse(content, data, status=status_code, content_type=content_type)
+        if not content:
+            # Как у Response DRF: у пустого тела нет Content-Type
+            del response['Content-Type']
+        return response
+
+    def encoded(self, content, status_code=status.HTTP_200_OK):
+        """Ответ с уже закодированным JSON (быстрый путь, fastjson)."""
+        return AsyncAPIResponse(content, status=status_code, content_type=JSONRenderer.media_type)
+
+    def error(self, exc):
+        """Ответ на APIException (ошибка разбора тела и т. п.), как у exception_handler DRF."""
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        return self.respond(data, exc.status_code)
+
+    def finalize(self, response):
+        response['Allow'] = self.allow
+        if self.vary:
+            response['Vary'] = 'Accept'
+        return response
+
+
+def _async_api_view(view_class, handlers):
+    """
+    Асинхронное представление с ответами view_class. handlers - методы
+    HTTP и async-функции handler(api, **kwargs), выполняемые в event loop;
+    остальные методы и форматы обслуживает синхронный view_class.
+    """
+    sync_view = sync_to_async(view_class.as_view())
+
+    @csrf_exempt
+    async def view(request, **kwargs):
+        api = _AsyncAPI(request, view_class)
+        handler = handlers.get(request.method)
+        if handler is None or not api.supported:
+            return await sync_view(request, **kwargs)
+
+        try:
+            response = await handler(api, **kwargs)
+        except APIException as exc:
+            response = api.error(exc)
+        return api.finalize(response)
+
+    # Для drf-yasg: эндпоинт описывается схемой view_class
+    view.cls = view_class
+    view.initkwargs = {}
+    return view
+
+
+@query_budget(1)
+async def _alist_chats(api):
+    """Асинхронный ChatListView.get."""
+    params = api.request.query_params
+    order = params.get('order', 'created')
+    if order not in ChatListView.ORDERS:
+        return api.respond(
+            {"detail": f"Параметр order должен быть одним из: {', '.join(ChatListView.ORDERS)}."},
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    chats, key = _chat_list_queryset(order)
+
+    try:
+        page, next_cursor = await apaginate_chats(
+            chats,
+            _parse_limit(params.get('limit')),
+            key=key,
+            cursor=params.get('cursor'),
+        )
+    except InvalidCursor as e:
+        logger.warning("Некорректный курсор списка чатов: %s", e)
+        return api.respond({"detail": str(e)}, status.HTTP_400_BAD_REQUEST)
+
+    with metrics.timed('serialize'):
+        results = ChatListSerializer(page, many=True).data
+
+    return api.respond({'results': results, 'next': next_cursor})
+
+
+@query_budget(1)
+async def _acreate_chat(api):
+    """Асинхронный ChatListView.post."""
+    data = api.request.data
+
+    try:
+        serializer = ChatSerializer(data=data)
+
+        if not serializer.is_valid():
+            logger.error("Ошибка валидации при создании чата: %s", serializer.errors)
+            return api.respond(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        chat = await Chat.objects.acreate(**serializer.validated_data)
+        logger.info("Создан новый чат: %s - %s", chat.id, chat.title)
+
+        with metrics.timed('serialize'):
+            chat_data = ChatSerializer(chat).data
+
+        return api.respond(chat_data, status.HTTP_201_CREATED)
+
+    except Exception as e:
+        logger.error("Неожиданная ошибка при создании чата: %s", e)
+        return api.respond({"error": "Внутренняя ошибка сервера"}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+_detail_condition = condition(etag_func=_detail_etag)
+
+
+# Валидатор условного запроса, чат и страница сообщений
+@query_budget(3)
+async def _aget_chat(api, id):
+    """Асинхронный ChatDetailView.get."""
+    request = api.request._request
+    # Синхронные функции condition() возьмут готовый валидатор с запроса
+    await _adetail_validator(request, id, api.renderer, api.media_type)
+
+    async def get(request, id):
+        return await _achat_detail(api, id)
+
+    return await _detail_condition(get)(request, id)
+
+
+async def _achat_detail(api, id):
+    try:
+        params = api.request.query_params
+        limit = _parse_limit(params.get('limit'))
+        before = params.get('before')
+        after = params.get('after')
+        fast = settings.CHAT_FAST_JSON and api.media_type == JSONRenderer.media_type
+
+        cache_key = None
+        if not before and not after:
+            cache_key = chat_cache.detail_key(id, limit, encoded=fast)
+            cached = chat_cache.get_cached(cache_key)
+            if cached is not None:
+                logger.info("Получен чат %s из кэша", id)
+                response = api.encoded(cached) if fast else api.respond(cached)
+                response['X-Cache'] = 'HIT'
+                return response
+
+        if fast:
+            chat = await fastjson.achat_row(id)
+            messages = fastjson.message_rows(id)
+        else:
+            chat = await Chat.objects.alive().aget(id=id)
+            messages = chat.messages.all()
+
+        try:
+            messages, next_cursor, prev_cursor = await apaginate_messages(
+                messages,
+                limit,
+                before=before,
+                after=after,
+            )
+        except InvalidCursor as e:
+            logger.warning("Некорректный курсор для чата %s: %s", id, e)
+            return api.respond({"detail": str(e)}, status.HTTP_400_BAD_REQUEST)
+
+        payload = _chat_detail_payload(fast, chat, messages, next_cursor, prev_cursor)
+
+        logger.info("Получен чат %s с %s сообщениями", id, len(messages))
+
+        response = api.encoded(payload) if fast else api.respond(payload)
+        if cache_key is not None:
+            chat_cache.set_cached(cache_key, payload)
+            response['X-Cache'] = 'MISS'
+        return response
+
+    except Chat.DoesNotExist:
+        logger.warning("Попытка получить несуществующий чат: %s", id)
+        return api.respond({"detail": "Чат не найден"}, status.HTTP_404_NOT_FOUND)
+
+    except Exception as e:
+        logger.error("Ошибка при получении чата %s: %s", id, e)
+        return api.respond({"error": "Внутренняя ошибка сервера"}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Пометка, контрольная пачка и удаление чата (пачки сообщений вне бюджета)
+@query_budget(6)
+async def _adelete_chat(api, id):
+    """Асинхронный ChatDetailView.delete: удаление - транзакции, поэтому в sync_to_async."""
+    try:
+        status_code = await sync_to_async(_delete_chat)(id)
+    except Exception as e:
+        logger.error("Ошибка при удалении чата %s: %s", id, e)
+        return api.respond({"error": "Внутренняя ошибка сервера"}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    if status_code == status.HTTP_404_NOT_FOUND:
+        return api.respond({"detail": "Чат не найден"}, status.HTTP_404_NOT_FOUND)
+    return api.respond(None, status_code)
+
+
+@query_budget(1)
+async def _acreate_message(api, id):
+    """Асинхронный MessageCreateView.post."""
+    data = api.request.data
+
+    try:
+        serializer = MessageCreateSerializer(data=data)
+
+        if not serializer.is_valid():
+            logger.error("Ошибка валидации при отправке сообщения в чат %s: %s", id, serializer.errors)
+            return api.respond(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        # Публикация - в on_commit, поэтому запрос и публикация в одном вызове
+        message = await sync_to_async(_create_message)(id, serializer.validated_data['text'])
+        if message is None:
+            logger.warning("Попытка отправить сообщение в несуществующий чат: %s", id)
+            return api.respond({"detail": "Чат не найден"}, status.HTTP_404_NOT_FOUND)
+
+        with metrics.timed('serialize'):
+            message_data = MessageSerializer(message).data
+
+        return api.respond(message_data, status.HTTP_201_CREATED)
+
+    except Exception as e:
+        logger.error("Неожиданная ошибка при отправке сообщения в чат %s: %s", id, e)
+        return api.respond({"error": "Внутренняя ошибка сервера"}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+chat_list_async = _async_api_view(
+    ChatListView,
+    {'GET': _alist_chats, 'HEAD': _alist_chats, 'POST': _acreate_chat},
+)
+message_create_async = _async_api_view(MessageCreateView, {'POST': _acreate_message})
+_chat_detail_async_view = _async_api_view(
+    ChatDetailView,
+    {'GET': _aget_chat, 'HEAD': _aget_chat, 'DELETE': _adelete_chat},
+)
+
+
+class ChatLongPollMiddleware:
+    """
+    Направляет long polling GET /chats/{id}/?since=... в асинхронный
+    _chat_messages_since. Остальные запросы к чату обслуживает синхронный
+    ChatDetailView напрямую, без асинхронной обертки и sync_to_async.
+
+    Под ASGI ожидание идет в event loop, под WSGI (async_to_sync) занимает
+    поток, как и любое синхронное представление.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    @staticmethod
+    def _is_long_poll(request, view_func):
+        return (
+            getattr(view_func, 'view_class', None) is ChatDetailView
+            and request.method == 'GET'
+            and 'since' in request.GET
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self._is_long_poll(request, view_func):
+            return async_to_sync(_chat_messages_since)(request, *view_args, **view_kwargs)
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if self._is_long_poll(request, view_func):
+            return await _chat_messages_since(request, *view_args, **view_kwargs)
+        return None
+
+
+@csrf_exempt
+async def chat_detail_async(request, id):
+    """
+    Точка входа /chats/{id}/ при CHAT_ASYNC_VIEWS: long polling, получение
+    и удаление чата выполняются в event loop.
+    """
+    if request.method == 'GET' and 'since' in request.GET:
+        return await _chat_messages_since(request, id)
+    return await _chat_detail_async_view(request, id=id)
+
+
+chat_detail_async.cls = ChatDetailView
+chat_detail_async.initkwargs = {}
@@ -3,6 +3,7 @@ Django settings for chat_project project.
 """
 import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -22,12 +23,17 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'drf_yasg',
     'chat_app',
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы учитывать время всех остальных middleware
+    'chat_app.metrics.MetricsMiddleware',
+    # Сразу после метрик: размер ответа в метриках - размер сжатого тела
+    'chat_app.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -35,6 +41,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Последним: подменяет представление только для long polling чата
+    'chat_app.views.ChatLongPollMiddleware',
 ]
 
 ROOT_URLCONF = 'chat_project.urls'
@@ -74,9 +82,32 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', '123'),
         'HOST': POSTGRES_HOST,
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        # Постоянные соединения (только при DB_POOL=False): соединение живет
+        # CONN_MAX_AGE секунд и переиспользуется следующими запросами того же потока
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', '60')),
+        # Перед переиспользованием соединение проверяется, разорванное
+        # (перезапуск PostgreSQL, таймаут на балансировщике) открывается заново
+        'CONN_HEALTH_CHECKS': os.getenv('CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# Пул соединений psycopg, по одному на процесс-воркер; max_size ограничивает
+# число соединений воркера. Под ASGI каждый запрос обслуживается своим потоком
+# и постоянные соединения не переиспользуются, поэтому пул включен по умолчанию.
+# Проверку соединений при выдаче из пула включает тот же CONN_HEALTH_CHECKS
+if os.getenv('DB_POOL', 'True') == 'True':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            # Сколько секунд запрос ждет свободное соединение, затем ошибка
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            # Неиспользуемые соединения сверх min_size закрываются
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+        },
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,17 +136,105 @@ STATIC_URL = 'static/'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Количество процессов-воркеров, обслуживающих API. gunicorn.conf.py
+# передает воркерам итоговое значение, в том числе вычисленное по умолчанию
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Cache
+# По умолчанию кэш в памяти процесса. При нескольких процессах нужен общий
+# бэкенд (например django.core.cache.backends.redis.RedisCache), иначе
+# инвалидация в одном процессе не дойдет до остальных: с кэшем в памяти
+# процесса кэш чатов при WEB_CONCURRENCY > 1 отключается (см. CHAT_CACHE_ALIAS)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'chat-cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+        },
+    },
+    # Заглушка вместо кэша чатов, который нельзя разделить между процессами
+    'chat-disabled': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+
+
+def _chat_cache_alias(alias, processes):
+    """
+    Алиас кэша чатов: alias или заглушка 'chat-disabled', если процессов
+    несколько, а кэш alias - в памяти процесса. Иначе запись в одном воркере
+    сбрасывала бы версию чата только в его кэше, а остальные отдавали бы
+    устаревшие ответы и 304 до истечения CHAT_CACHE_TIMEOUT.
+    """
+    backend = CACHES.get(alias, {}).get('BACKEND', '')
+    if processes > 1 and backend.endswith('LocMemCache'):
+        return 'chat-disabled'
+    return alias
+
+
+def _long_poll_max_wait(wait, worker_timeout):
+    """
+    Максимальное ожидание long polling: wait, но не больше половины таймаута
+    синхронного воркера. Ожидание занимает такой воркер, и запрос дольше
+    таймаута gunicorn считает зависанием и перезапускает воркер.
+    """
+    if worker_timeout > 0:
+        return min(wait, worker_timeout / 2)
+    return wait
+
+
+def _chat_pubsub_backend(path, processes):
+    """
+    Бэкенд pub/sub: path или, если он не задан, InMemoryBackend для одного
+    процесса и PostgresBackend для нескольких. InMemoryBackend при нескольких
+    процессах - ошибка: подписчики одного воркера не получали бы сообщения,
+    отправленные через другие, и SSE и long polling молча теряли бы события.
+    """
+    in_memory = 'chat_app.pubsub.InMemoryBackend'
+    if not path:
+        return in_memory if processes < 2 else 'chat_app.pubsub.PostgresBackend'
+    if processes > 1 and path == in_memory:
+        raise ImproperlyConfigured(
+            "CHAT_PUBSUB_BACKEND=InMemoryBackend не работает при WEB_CONCURRENCY > 1"
+        )
+    return path
+
+
+# Форматы ответов и тел запросов API
+API_RENDERER_CHOICES = {
+    'json': 'chat_app.renderers.JSONRenderer',
+    'browsable': 'rest_framework.renderers.BrowsableAPIRenderer',
+    'msgpack': 'chat_app.renderers.MessagePackRenderer',
+}
+API_PARSER_CHOICES = {
+    'json': 'rest_framework.parsers.JSONParser',
+    'form': 'rest_framework.parsers.FormParser',
+    'multipart': 'rest_framework.parsers.MultiPartParser',
+    'msgpack': 'chat_app.parsers.MessagePackParser',
+}
+
+
+def _api_classes(variable, default, choices):
+    """Классы из списка имен через запятую в переменной окружения."""
+    names = [name.strip() for name in os.getenv(variable, default).split(',') if name.strip()]
+    unknown = [name for name in names if name not in choices]
+    if unknown or not names:
+        raise ImproperlyConfigured(
+            f"{variable}: неизвестные форматы {unknown}, допустимые: {', '.join(choices)}"
+        )
+    return [choices[name] for name in names]
+
+
+# Первый формат - формат по умолчанию. HTML-интерфейс DRF и формы включены
+# только в режиме отладки, в production - только JSON; msgpack включается явно
+API_RENDERERS = _api_classes('API_RENDERERS', 'json,browsable' if DEBUG else 'json', API_RENDERER_CHOICES)
+API_PARSERS = _api_classes('API_PARSERS', 'json,form,multipart' if DEBUG else 'json', API_PARSER_CHOICES)
+
 # REST Framework
 REST_FRAMEWORK = {
-    'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
-    ],
-    'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
-        'rest_framework.parsers.FormParser',
-        'rest_framework.parsers.MultiPartParser',
-    ],
+    'DEFAULT_RENDERER_CLASSES': API_RENDERERS,
+    'DEFAULT_PARSER_CLASSES': API_PARSERS,
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -123,7 +242,102 @@ REST_FRAMEWORK = {
     'DEFAULT_CHARSET': 'utf-8',
 }
 
+# Chat API
+# Максимальное количество сообщений в одном запросе массовой загрузки
+CHAT_BULK_MAX_MESSAGES = int(os.getenv('CHAT_BULK_MAX_MESSAGES', '1000'))
+# Максимальный размер тела запроса массовой загрузки (байты): JSON и
+# MessagePack разбираются целиком, поэтому тело ограничивается до чтения
+CHAT_BULK_MAX_BODY_SIZE = int(os.getenv('CHAT_BULK_MAX_BODY_SIZE', str(16 * 1024 * 1024)))
+# Размер пачки для bulk_create при массовой загрузке
+CHAT_BULK_BATCH_SIZE = int(os.getenv('CHAT_BULK_BATCH_SIZE', '500'))
+
+# Бэкенд pub/sub для доставки новых сообщений в реальном времени
+CHAT_PUBSUB_BACKEND = _chat_pubsub_backend(os.getenv('CHAT_PUBSUB_BACKEND'), WEB_CONCURRENCY)
+# Размер очереди событий одного подписчика
+CHAT_PUBSUB_QUEUE_SIZE = int(os.getenv('CHAT_PUBSUB_QUEUE_SIZE', '1000'))
+# Интервал keep-alive комментариев в потоке событий (секунды)
+CHAT_EVENTS_HEARTBEAT = float(os.getenv('CHAT_EVENTS_HEARTBEAT', '15'))
+# Сообщений в одном запросе при отдаче пропущенных сообщений потока событий
+CHAT_EVENTS_REPLAY_CHUNK_SIZE = int(os.getenv('CHAT_EVENTS_REPLAY_CHUNK_SIZE', '500'))
+# Таймаут синхронного воркера (sync, gthread), который передает gunicorn.conf.py
+# (0 - ограничения нет, ASGI), и максимальное время ожидания long polling
+# новых сообщений (секунды)
+CHAT_WORKER_TIMEOUT = float(os.getenv('CHAT_WORKER_TIMEOUT', '0'))
+CHAT_LONG_POLL_MAX_WAIT = _long_poll_max_wait(
+    float(os.getenv('CHAT_LONG_POLL_MAX_WAIT', '60')), CHAT_WORKER_TIMEOUT
+)
+# Кэш ответов GET /chats/{id}/: алиас из CACHES и время жизни записей (секунды)
+CHAT_CACHE_ALIAS = _chat_cache_alias(os.getenv('CHAT_CACHE_ALIAS', 'default'), WEB_CONCURRENCY)
+CHAT_CACHE_TIMEOUT = int(os.getenv('CHAT_CACHE_TIMEOUT', '60'))
+# Удаление чатов: размер пачки удаляемых сообщений и удаление в фоне (ответ 202)
+CHAT_DELETE_BATCH_SIZE = int(os.getenv('CHAT_DELETE_BATCH_SIZE', '1000'))
+CHAT_DELETE_ASYNC = os.getenv('CHAT_DELETE_ASYNC', 'False') == 'True'
+# Выгрузка истории чата: строк в одной пачке серверного курсора и потока ответа
+CHAT_EXPORT_CHUNK_SIZE = int(os.getenv('CHAT_EXPORT_CHUNK_SIZE', '2000'))
+# Быстрый путь чтения GET /chats/{id}/: values_list + orjson вместо DRF-сериализаторов
+CHAT_FAST_JSON = os.getenv('CHAT_FAST_JSON', 'True') == 'True'
+# Секционирование таблицы сообщений (chat_app.partitioning, включается
+# командой partition_messages --convert): число хэш-секций и на сколько
+# месяцев вперед создаются секции схемы month
+MESSAGE_HASH_PARTITIONS = int(os.getenv('MESSAGE_HASH_PARTITIONS', '16'))
+MESSAGE_PARTITION_MONTHS_AHEAD = int(os.getenv('MESSAGE_PARTITION_MONTHS_AHEAD', '3'))
+# Срок хранения сообщений (команда purge_messages): максимальный возраст в
+# днях и максимальное количество сообщений в чате, 0 - без ограничения; у
+# чата могут быть свои значения (Chat.retention_days, retention_max_messages)
+MESSAGE_RETENTION_DAYS = int(os.getenv('MESSAGE_RETENTION_DAYS', '0'))
+MESSAGE_RETENTION_MAX_MESSAGES = int(os.getenv('MESSAGE_RETENTION_MAX_MESSAGES', '0'))
+# Удаление устаревших сообщений: строк в пачке, пауза между пачками
+# (секунды) и lock_timeout пачки (мс) - пачка, не получившая блокировку,
+# откладывается до следующего прохода, а не ждет
+MESSAGE_PURGE_BATCH_SIZE = int(os.getenv('MESSAGE_PURGE_BATCH_SIZE', '1000'))
+MESSAGE_PURGE_PAUSE = float(os.getenv('MESSAGE_PURGE_PAUSE', '0.05'))
+MESSAGE_PURGE_LOCK_TIMEOUT = int(os.getenv('MESSAGE_PURGE_LOCK_TIMEOUT', '1000'))
+# Асинхронные представления списка чатов, чата и отправки сообщения
+# (асинхронный ORM в event loop); имеет смысл только под ASGI (воркер uvicorn)
+CHAT_ASYNC_VIEWS = os.getenv('CHAT_ASYNC_VIEWS', 'False') == 'True'
+
+# Сжатие ответов по Accept-Encoding: кодировки в порядке предпочтения (zstd, br,
+# gzip), минимальный размер тела в байтах, уровни сжатия и сжимаемые типы
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True') == 'True'
+COMPRESSION_ENCODINGS = [
+    name.strip() for name in os.getenv('COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',') if name.strip()
+]
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_LEVEL = int(os.getenv('COMPRESSION_BROTLI_LEVEL', '5'))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv('COMPRESSION_ZSTD_LEVEL', '3'))
+COMPRESSION_CONTENT_TYPES = [
+    'text/',
+    'application/json',
+    'application/x-ndjson',
+    'application/msgpack',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+]
+
+# Метрики запросов (GET /metrics) и заголовок Server-Timing в ответах
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'False') == 'True'
+
+# Бюджет SQL-запросов представлений (chat_app.querybudget): off, log или raise.
+# В режиме отладки превышения пишутся в лог, тесты выполняются с raise
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'log' if DEBUG else 'off')
+if QUERY_BUDGET_MODE not in ('off', 'log', 'raise'):
+    raise ImproperlyConfigured(f"QUERY_BUDGET_MODE: {QUERY_BUDGET_MODE}, допустимые: off, log, raise")
+# С какого числа повторов одинаковый запрос попадает в лог и в пределах бюджета
+QUERY_BUDGET_DUPLICATE_THRESHOLD = int(os.getenv('QUERY_BUDGET_DUPLICATE_THRESHOLD', '3'))
+
 # Logging
+# Формат логов в файле и консоли: text или json (одна JSON-запись на строку)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+# Запись логов фоновым потоком через ограниченную очередь (chat_app.log)
+LOG_QUEUE = os.getenv('LOG_QUEUE', 'True') == 'True'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# Политика при переполнении очереди: drop_new или drop_oldest
+LOG_QUEUE_OVERFLOW = os.getenv('LOG_QUEUE_OVERFLOW', 'drop_new')
+LOG_QUEUE_LOGGERS = ['chat_app', 'django']
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -136,18 +350,21 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'chat_app.log.JSONFormatter',
+        },
     },
     'handlers': {
         'file': {
             'level': 'DEBUG',
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'chat_api.log',
-            'formatter': 'verbose',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'verbose',
         },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'simple',
         },
     },
     'loggers': {
@@ -1,9 +1,12 @@
 from django.contrib import admin
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from chat_app.views import metrics_view
+
 # Настройка Swagger документации
 schema_view = get_schema_view(
     openapi.Info(
@@ -24,6 +27,9 @@ urlpatterns = [
     
     # API endpoints
     path('api/', include('chat_app.urls')),
+
+    # Метрики Prometheus
+    path('metrics', metrics_view, name='metrics'),
     
     # Swagger документация
     path(
@@ -36,4 +42,7 @@ urlpatterns = [
         schema_view.with_ui('redoc', cache_timeout=0),
         name='schema-redoc'
     ),
-]
\ No newline at end of file
+]
+
+# Статика Swagger UI и админки при DEBUG (gunicorn, в отличие от runserver, ее не раздает)
+urlpatterns += staticfiles_urlpatterns()
@@ -0,0 +1,106 @@
+"""
+Конфигурация gunicorn для production-запуска (вместо manage.py runserver).
+
+Запуск из каталога chat_project:
+
+    gunicorn -c gunicorn.conf.py
+
+Все параметры задаются переменными окружения:
+
+    GUNICORN_WORKER_CLASS      uvicorn (ASGI, по умолчанию), gthread или sync (WSGI)
+    WEB_CONCURRENCY            количество процессов-воркеров
+    GUNICORN_THREADS           потоков в воркере (для gthread)
+    GUNICORN_BIND              адрес, по умолчанию 0.0.0.0:8000
+    GUNICORN_KEEPALIVE         сколько секунд держать keep-alive соединение
+    GUNICORN_TIMEOUT           таймаут зависшего воркера (секунды)
+    GUNICORN_GRACEFUL_TIMEOUT  время на завершение запросов при перезапуске
+    GUNICORN_MAX_REQUESTS      перезапуск воркера после N запросов (0 - выключено)
+    GUNICORN_LOG_LEVEL         уровень логов gunicorn
+
+Воркер uvicorn обслуживает chat_project.asgi: поток событий (SSE) и
+long polling ждут в event loop и не занимают процесс. Воркеры sync и
+gthread обслуживают chat_project.wsgi; под ними каждое ожидающее
+соединение занимает поток, а запрос дольше GUNICORN_TIMEOUT приводит к
+перезапуску воркера. Поэтому под ними:
+
+    - поток событий GET /chats/{id}/events/ отвечает 501;
+    - ожидание long polling (?since=&wait=) ограничено половиной
+      GUNICORN_TIMEOUT: when_ready передает таймаут воркерам в
+      CHAT_WORKER_TIMEOUT, и settings уменьшает CHAT_LONG_POLL_MAX_WAIT.
+"""
+import multiprocessing
+import os
+
+_WORKER_CLASSES = {
+    'uvicorn': 'uvicorn_worker.UvicornWorker',
+    'gthread': 'gthread',
+    'sync': 'sync',
+}
+
+_worker = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn')
+worker_class = _WORKER_CLASSES.get(_worker, _worker)
+_is_asgi = 'uvicorn' in worker_class.lower()
+
+wsgi_app = 'chat_project.asgi:application' if _is_asgi else 'chat_project.wsgi:application'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Асинхронному воркеру достаточно процесса на ядро, синхронным -
+# классические 2 * ядра + 1
+_default_workers = multiprocessing.cpu_count()
+if not _is_asgi:
+    _default_workers = _default_workers * 2 + 1
+workers = int(os.getenv('WEB_CONCURRENCY', _default_workers))
+threads = int(os.getenv('GUNICORN_THREADS', '4' if worker_class == 'gthread' else '1'))
+
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+# Периодический перезапуск воркеров ограничивает рост памяти;
+# jitter не дает всем воркерам перезапуститься одновременно
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', str(max_requests // 10)))
+
+# Heartbeat-файлы воркеров в памяти, а не на диске контейнера
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def when_ready(server):
+    """
+    Передает воркерам итоговое число процессов и таймаут синхронных
+    воркеров и предупреждает о настройках, которые работают только в одном
+    процессе или только под ASGI.
+    """
+    # Настройки Django зависят от числа процессов (кэш в памяти процесса не
+    # разделяется между воркерами). Значение по умолчанию или из командной
+    # строки (-w) попадает к воркерам через окружение: они запускаются позже
+    os.environ['WEB_CONCURRENCY'] = str(server.cfg.workers)
+    if 'uvicorn' not in server.cfg.worker_class_str.lower() and server.cfg.timeout > 0:
+        os.environ['CHAT_WORKER_TIMEOUT'] = str(server.cfg.timeout)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chat_project.settings')
+    from django.conf import settings
+
+    if settings.CHAT_WORKER_TIMEOUT:
+        server.log.warning(
+            "Воркер %s (WSGI): поток событий SSE недоступен (501), ожидание long polling "
+            "ограничено %.0f с (половина GUNICORN_TIMEOUT); для них используйте воркер uvicorn",
+            server.cfg.worker_class_str, settings.CHAT_LONG_POLL_MAX_WAIT
+        )
+    if server.cfg.workers < 2:
+        return
+
+    if settings.CHAT_CACHE_ALIAS == 'chat-disabled':
+        server.log.warning(
+            "WEB_CONCURRENCY > 1 с LocMemCache: кэш чатов отключен, "
+            "для кэширования задайте общий CACHE_BACKEND"
+        )
+    # InMemoryBackend при нескольких воркерах - ошибка настроек
+    # (ImproperlyConfigured) еще при импорте settings, до запуска воркеров
+    server.log.info("Бэкенд pub/sub: %s", settings.CHAT_PUBSUB_BACKEND)